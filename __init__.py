@@ -1,6 +1,7 @@
 from bpy.props import (
     BoolProperty,
     FloatProperty,
+    IntProperty,
     StringProperty,
     EnumProperty,
     CollectionProperty,
@@ -68,8 +69,24 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         default="*.cgf;*.caf",
         options={'HIDDEN'},
     )  # type: ignore
-    # directory = StringProperty(options={'HIDDEN'})
-    #  files = CollectionProperty(name="File Path", type=bpy.types.OperatorFileListElement)
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )  # type: ignore
+    files: CollectionProperty(
+        name="File Path", type=bpy.types.OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )  # type: ignore
+
+    batch_glob: StringProperty(
+        default="", name="Batch Glob",
+        description="Import every CGF file of the directory matching this pattern (e.g. **/*.cgf), instead of the selected files"
+    )  # type: ignore
+
+    batch_workers: IntProperty(
+        default=0, min=0, name="Workers",
+        description="Number of processes reading the files of a batch import, 0 for one per CPU"
+    )  # type: ignore
 
     flip_x_axis: BoolProperty(
         default=False, name="Invert X axis",
@@ -91,14 +108,35 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         description="Import animations by searching the cal"
     )  # type: ignore
 
+    resample_animations: BoolProperty(
+        default=False, name="Resample Animations",
+        description="Resample the animation keys to whole frames of the CAF frame rate"
+    )  # type: ignore
+
+    reduce_keyframes: BoolProperty(
+        default=False, name="Reduce Keyframes",
+        description="Remove the animation keys that linear interpolation reproduces within the tolerances"
+    )  # type: ignore
+
+    keyframe_position_tolerance: FloatProperty(
+        default=0.001, min=0.0, name="Position Tolerance",
+        description="Maximum location error of removed keys", unit='LENGTH'
+    )  # type: ignore
+
+    keyframe_rotation_tolerance: FloatProperty(
+        default=0.00872665, min=0.0, name="Rotation Tolerance",
+        description="Maximum rotation error of removed keys", subtype='ANGLE'
+    )  # type: ignore
+
     convert_dds_to_png: BoolProperty(
         default=False, name="Convert DDS to PNG",
-        description="Convert all the texture images to PNG and save external."
+        description="Convert all the texture images to PNG and save external. "
+                    "Textures unchanged since their last conversion are not converted again"
     ) # type: ignore
 
     reuse_materials: BoolProperty(
         default=True, name="ReUse Materials",
-        description="Re-Use the existing materials via name matching."
+        description="Re-Use the existing materials via name matching, or with the same settings."
     ) # type: ignore
 
     reuse_images: BoolProperty(
@@ -106,16 +144,55 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         description="Re-Use the existing images via name matching."
     ) # type: ignore
 
-    def execute(self, context: bpy.types.Context):
-        #  fnames = [f.name for f in self.files]
-        #  if len(fnames) == 0 or not os.path.isfile(os.path.join(self.directory, fnames[0])):
-        #  self.report({'ERROR'}, 'No file is selected for import')
-        #  return {'FINISHED'}
+    reuse_meshes: BoolProperty(
+        default=True, name="ReUse Meshes",
+        description="Re-Use the meshes of identical geometry imported before, as linked duplicates."
+    ) # type: ignore
+
+    defer_images: BoolProperty(
+        default=False, name="Load Images Later",
+        description="Create the images without reading them, and load them in the background after the import."
+    ) # type: ignore
+
+    run_in_background: BoolProperty(
+        default=False, name="Import in Background",
+        description="Read the files in background processes and build the scene a little at a time, "
+                    "keeping the interface responsive. Press Esc to cancel"
+    ) # type: ignore
+
+    profile: BoolProperty(
+        default=False, name="Profile Import",
+        description="Record the time and memory of each phase of the import, "
+                    "and write them as a JSON report to the temporary directory"
+    ) # type: ignore
 
+    def get_batch_filepaths(self):
+        """
+        Returns the CGF files of a batch import: the files of the directory
+        matching the batch glob if it is set, or else the selected files if
+        there are several.
+        """
+        directory = self.directory or os.path.dirname(self.filepath)
+        if self.batch_glob:
+            filepaths = glob.glob(os.path.join(glob.escape(directory), self.batch_glob),
+                                  recursive=True)
+        else:
+            filepaths = [os.path.join(directory, f.name) for f in self.files if f.name]
+            if len(filepaths) < 2:
+                return []
+        return sorted(filepath for filepath in filepaths
+                      if filepath.lower().endswith('.cgf') and os.path.isfile(filepath))
+
+    def execute(self, context: bpy.types.Context):
         keywords = self.as_keywords(ignore=("axis_forward",
                                             "axis_up",
                                             "filter_glob",
                                             "flip_x_axis",
+                                            "directory",
+                                            "files",
+                                            "batch_glob",
+                                            "batch_workers",
+                                            "run_in_background",
                                             ))
 
         global_matrix = axis_conversion(
@@ -129,12 +206,82 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         if bpy.data.is_saved and context.user_preferences.filepaths.use_relative_paths:
             keywords['relpath'] = os.path.dirname(bpy.data.filepath)
 
-        self.report({'INFO'}, "Call import_cgf.load(context, **keywords)")
+        from .import_cgf import ImportCGF, ImportJob
+
+        filepaths = self.get_batch_filepaths()
+        if self.run_in_background and context.window is not None:
+            if not filepaths and not self.batch_glob:
+                filepaths = [self.filepath]
+            # animation files are still imported at once
+            if filepaths and not any(filepath.lower().endswith('.caf') for filepath in filepaths):
+                del keywords['filepath']
+                del keywords['profile']
+                if self.profile:
+                    self.report({'WARNING'}, "Profile Import is not supported with Import in Background")
+                self._job = ImportJob(filepaths, max_workers=self.batch_workers or None, **keywords)
+                self._job.start(context)
+                self._timer = context.window_manager.event_timer_add(0.05, window=context.window)
+                context.window_manager.modal_handler_add(self)
+                return {'RUNNING_MODAL'}
+
+        if filepaths:
+            if self.profile:
+                self.report({'WARNING'}, "Profile Import is not supported for several files")
+            self.report({'INFO'}, "Call import_cgf.load_batch(context, filepaths, ...)")
+            return ImportCGF.load_batch(context, filepaths,
+                                        skeleton_auto_connect=self.skeleton_auto_connect,
+                                        import_animations=self.import_animations,
+                                        resample_animations=self.resample_animations,
+                                        reduce_keyframes=self.reduce_keyframes,
+                                        keyframe_position_tolerance=self.keyframe_position_tolerance,
+                                        keyframe_rotation_tolerance=self.keyframe_rotation_tolerance,
+                                        max_workers=self.batch_workers or None,
+                                        import_skeleton=self.import_skeleton,
+                                        convert_dds_to_png=self.convert_dds_to_png,
+                                        reuse_materials=self.reuse_materials,
+                                        reuse_images=self.reuse_images,
+                                        reuse_meshes=self.reuse_meshes,
+                                        defer_images=self.defer_images,
+                                        global_matrix=global_matrix)
+        if self.batch_glob:
+            self.report({'ERROR'}, 'No CGF file matches %r' % self.batch_glob)
+            return {'CANCELLED'}
 
-        from .import_cgf import ImportCGF
+        self.report({'INFO'}, "Call import_cgf.load(context, **keywords)")
 
         importer = ImportCGF()
-        return importer.load(context, **keywords)
+        result = importer.load(context, **keywords)
+        if importer.profile is not None:
+            summary = importer.profile.get_summary()
+            if importer.profile.report_path is not None:
+                summary += " (report: %s)" % importer.profile.report_path
+            self.report({'INFO'}, summary)
+        return result
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._job.cancel()
+            context.window_manager.event_timer_remove(self._timer)
+            self.report({'WARNING'}, "Import cancelled")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            done = self._job.step(context)
+        except Exception as e:
+            self._job.cancel()
+            context.window_manager.event_timer_remove(self._timer)
+            self.report({'ERROR'}, "Import failed: %s" % e)
+            return {'CANCELLED'}
+
+        if done:
+            context.window_manager.event_timer_remove(self._timer)
+            self.report({'INFO'}, "Imported %i CGF files" % (self._job.num_done - self._job.num_failed))
+            return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
 
     def draw(self, context):
         layout = self.layout
@@ -153,9 +300,21 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         if self.import_skeleton == True:
             row.prop(self, "skeleton_auto_connect")
 
-        row = layout.row(align=True)
+        box = layout.box()
+        row = box.row()
         row.prop(self, "import_animations")
 
+        if self.import_animations:
+            row = box.row()
+            row.prop(self, "resample_animations")
+            row = box.row()
+            row.prop(self, "reduce_keyframes")
+            if self.reduce_keyframes:
+                row = box.row()
+                row.prop(self, "keyframe_position_tolerance")
+                row = box.row()
+                row.prop(self, "keyframe_rotation_tolerance")
+
         row = layout.row(align=True)
         row.prop(self, "convert_dds_to_png")
 
@@ -165,6 +324,24 @@ class AionImporter(bpy.types.Operator, ImportHelper):
         row = layout.row(align=True)
         row.prop(self, "reuse_images")
 
+        row = layout.row(align=True)
+        row.prop(self, "reuse_meshes")
+
+        row = layout.row(align=True)
+        row.prop(self, "defer_images")
+
+        box = layout.box()
+        row = box.row()
+        row.prop(self, "batch_glob")
+        row = box.row()
+        row.prop(self, "batch_workers")
+
+        row = layout.row(align=True)
+        row.prop(self, "run_in_background")
+
+        row = layout.row(align=True)
+        row.prop(self, "profile")
+
 def menu_func_import(self, context):
     self.layout.operator(AionImporter.bl_idname,
                          text="CryTek(AION) (.cgf, .caf)")
@@ -190,6 +367,9 @@ def register():
 
 
 def unregister():
+    from .import_cgf import cancel_deferred_images
+    cancel_deferred_images()
+
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
 
     for cls in classes:
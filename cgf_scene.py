@@ -0,0 +1,1365 @@
+"""
+Conversion of CGF/CAF data into plain python and numpy structures.
+
+Nothing in here depends on bpy, so these functions can run in worker
+processes (see parse_animations), or outside Blender altogether.
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import posixpath
+import sys
+import tempfile
+import time
+import tracemalloc
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+
+import numpy as np
+
+
+def locate_dependencies():
+    # worker processes do not run the addon __init__, so make sure the
+    # bundled pyffi can be imported
+    _dependencies_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dependencies")
+    if _dependencies_path not in sys.path:
+        sys.path.append(_dependencies_path)
+
+
+locate_dependencies()
+
+if not hasattr(time, 'clock'):
+    time.clock = time.perf_counter
+
+from pyffi.formats.cgf import CgfFormat
+from pyffi.formats.dds import DdsFormat
+
+# texture slots of a standard material, in the order they are applied
+TEXTURE_SLOTS = ('tex_o', 'tex_d', 'tex_a', 'tex_s', 'tex_b', 'tex_g',
+                 'tex_f', 'tex_c', 'tex_r', 'tex_subsurf', 'tex_detail')
+
+# bumped whenever the layout of the stored texture indices changes
+TEXTURE_INDEX_VERSION = 1
+
+# bumped whenever the layout of the texture conversion manifest, or the
+# conversion itself, changes
+TEXTURE_MANIFEST_VERSION = 1
+
+# bumped whenever the layout of the profile reports changes
+PROFILE_REPORT_VERSION = 1
+
+# vertex weights are quantised to this many steps, so that vertices sharing
+# a bone and a weight can be added to the vertex group in a single call
+WEIGHT_STEPS = 4096
+
+
+def to_str(bytes_val) -> str:
+    try:
+        return bytes_val.decode('utf-8', "replace")
+    except:
+        return str(bytes_val)
+
+
+def get_global_scale(cgf_data, scale_factor=1.0):
+    scale = scale_factor
+    if cgf_data.game == 'Crysis':
+        scale /= 100.0
+    elif cgf_data.game == 'Aion':
+        scale *= 100.0
+    return scale
+
+
+class ImportProfile:
+    """
+    Wall time and memory allocations of the phases of an import (see
+    PHASES), and the sizes of the meshes created. The time of a phase
+    excludes the phases nested in it, so that the phases add up to the
+    total. Allocations are traced with tracemalloc, so only count memory
+    allocated through Python (numpy arrays included), not by Blender
+    itself: 'allocated' is the memory still held at the end of the phase,
+    'peak' the most memory held at any time during it, both relative to
+    the start of the import.
+    """
+
+    __slots__ = ['filepath', 'phases', 'meshes', 'stack', 'start_time', 'started',
+                 'total_time', 'base_memory', 'trace_started', 'report_path']
+
+    PHASES = ('inspect', 'read', 'apply_scale', 'convert', 'materials', 'images',
+              'meshes', 'weights', 'armature', 'animations', 'cleanup')
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.phases = {}
+        self.meshes = []
+        self.stack = []
+        self.start_time = None
+        self.started = None
+        self.total_time = None
+        self.base_memory = 0
+        self.trace_started = False
+        self.report_path = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.trace_started = True
+        self.base_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        self.total_time = time.perf_counter() - self.start_time
+        if self.trace_started:
+            tracemalloc.stop()
+            self.trace_started = False
+
+    def charge(self):
+        # charges the time and memory since the last call to the current phase
+        now = time.perf_counter()
+        memory, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        if self.stack:
+            name, since = self.stack[-1]
+            phase = self.phases[name]
+            phase['time'] += now - since
+            phase['allocated'] = memory - self.base_memory
+            phase['peak'] = max(phase['peak'], peak - self.base_memory)
+            self.stack[-1] = (name, now)
+        return now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        assert name in self.PHASES
+        phase = self.phases.setdefault(name, {'time': 0.0, 'calls': 0, 'allocated': 0, 'peak': 0})
+        phase['calls'] += 1
+        self.stack.append((name, self.charge()))
+        try:
+            yield
+        finally:
+            self.charge()
+            self.stack.pop()
+            if self.stack:
+                # resume the outer phase
+                self.stack[-1] = (self.stack[-1][0], time.perf_counter())
+
+    def add_mesh(self, name, num_vertices, num_loops, num_polygons, reused=False):
+        self.meshes.append({
+            'name': name,
+            'vertices': num_vertices,
+            'loops': num_loops,
+            'polygons': num_polygons,
+            'reused': reused,
+        })
+
+    def as_dict(self):
+        phases = dict((name, self.phases[name]) for name in self.PHASES if name in self.phases)
+        return {
+            'version': PROFILE_REPORT_VERSION,
+            'filepath': self.filepath,
+            'started': self.started,
+            'total_time': self.total_time,
+            'unaccounted_time': self.total_time - sum(phase['time'] for phase in phases.values()),
+            'phases': phases,
+            'meshes': self.meshes,
+            'num_vertices': sum(mesh['vertices'] for mesh in self.meshes if not mesh['reused']),
+            'num_loops': sum(mesh['loops'] for mesh in self.meshes if not mesh['reused']),
+        }
+
+    def write(self, filepath):
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        self.report_path = filepath
+
+    def get_summary(self, max_phases=4):
+        """
+        Returns a one line summary: the total time and the slowest phases.
+        """
+        phases = sorted(self.phases.items(), key=lambda item: item[1]['time'], reverse=True)
+        return '%s imported in %.2f s: %s' % (
+            os.path.basename(self.filepath), self.total_time,
+            ', '.join('%s %.2f s' % (name, phase['time']) for name, phase in phases[:max_phases]))
+
+
+def get_profile_report_path(filepath, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'io_scene_cgf')
+    return os.path.join(cache_dir, 'profiles', '%s-%s.json' % (
+        os.path.splitext(os.path.basename(filepath))[0],
+        datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+
+
+def profile_phase(profile, name):
+    """
+    Returns the context of the phase of the profile (see ImportProfile),
+    doing nothing if there is no profile.
+    """
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+
+def read_cgf(filepath, profile=None):
+    with open(filepath, 'rb') as f:
+        data = CgfFormat.Data()
+        with profile_phase(profile, 'inspect'):
+            try:
+                data.inspect_version_only(f)
+            except ValueError as e:
+                print(e)
+        with profile_phase(profile, 'read'):
+            data.read(f)
+    return data
+
+
+def vec_roll_to_mat3_arrays(vecs):
+    """
+    Vectorised vec_roll_to_mat3 of blender, with zero roll: returns the
+    (n, 3, 3) rest matrices of bones pointing along the (n, 3) vectors.
+    """
+    THETA_THRESHOLD_NEGY = 1.0e-09
+    THETA_THRESHOLD_NEGY_CLOSE = 1.0e-05
+
+    lengths = np.linalg.norm(vecs, axis=1)
+    nor = vecs / np.where(lengths > 0, lengths, 1.0)[:, None]
+    x, y, z = nor[:, 0], nor[:, 1], nor[:, 2]
+    theta = 1.0 + y
+
+    far = theta > THETA_THRESHOLD_NEGY_CLOSE
+    near = ~far & ((x != 0) | (z != 0)) & (theta > THETA_THRESHOLD_NEGY)
+    general = far | near
+
+    # If nor is -Y, simple symmetry by Z axis
+    mats = np.tile(np.diag((-1.0, -1.0, 1.0)), (len(nor), 1, 1))
+    mats[general, 1, 0] = -x[general]
+    mats[general, 0, 1] = x[general]
+    mats[general, 1, 1] = y[general]
+    mats[general, 2, 1] = z[general]
+    mats[general, 1, 2] = -z[general]
+    # If nor is far enough from -Y, apply the general case.
+    t = theta[far]
+    mats[far, 0, 0] = 1 - x[far] * x[far] / t
+    mats[far, 2, 2] = 1 - z[far] * z[far] / t
+    mats[far, 0, 2] = mats[far, 2, 0] = -x[far] * z[far] / t
+    # If nor is too close to -Y, apply the special case
+    t = x[near] * x[near] + z[near] * z[near]
+    mats[near, 0, 0] = (x[near] + z[near]) * (x[near] - z[near]) / -t
+    mats[near, 2, 2] = -mats[near, 0, 0]
+    mats[near, 0, 2] = mats[near, 2, 0] = 2.0 * x[near] * z[near] / t
+    return mats
+
+
+def mat3_to_roll_arrays(mats):
+    """
+    Vectorised mat3_to_vec_roll of blender: returns the bone roll of each
+    of the (n, 3, 3) rotation matrices.
+    """
+    vecmats = vec_roll_to_mat3_arrays(mats[:, :, 1])
+    rollmats = np.matmul(np.transpose(vecmats, (0, 2, 1)), mats)
+    return np.arctan2(rollmats[:, 0, 2], rollmats[:, 2, 2])
+
+
+def quat_to_mat3_arrays(quats):
+    """
+    Returns the (n, 3, 3) rotation matrices of the (n, 4) quaternions,
+    stored as (w, x, y, z).
+    """
+    quats = quats / np.linalg.norm(quats, axis=1)[:, None]
+    w, x, y, z = quats.T
+    return np.stack((
+        np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)), axis=1),
+        np.stack((2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)), axis=1),
+        np.stack((2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)), axis=1),
+    ), axis=1)
+
+
+def mat3_to_quat_arrays(mats):
+    """
+    Returns the (n, 4) quaternions, as (w, x, y, z), of the (n, 3, 3)
+    rotation matrices. Consecutive quaternions are kept in the same
+    hemisphere, so that interpolating between them takes the short way.
+    """
+    m = mats
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    quats = np.empty((len(m), 4))
+    diagonal = np.stack((m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]), axis=1)
+    cases = np.where(trace > 0, 3, np.argmax(diagonal, axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = cases == 3
+        s = np.sqrt(trace[c] + 1.0) * 2
+        quats[c] = np.stack((0.25 * s,
+                             (m[c, 2, 1] - m[c, 1, 2]) / s,
+                             (m[c, 0, 2] - m[c, 2, 0]) / s,
+                             (m[c, 1, 0] - m[c, 0, 1]) / s), axis=1)
+        c = cases == 0
+        s = np.sqrt(1.0 + m[c, 0, 0] - m[c, 1, 1] - m[c, 2, 2]) * 2
+        quats[c] = np.stack(((m[c, 2, 1] - m[c, 1, 2]) / s,
+                             0.25 * s,
+                             (m[c, 0, 1] + m[c, 1, 0]) / s,
+                             (m[c, 0, 2] + m[c, 2, 0]) / s), axis=1)
+        c = cases == 1
+        s = np.sqrt(1.0 + m[c, 1, 1] - m[c, 0, 0] - m[c, 2, 2]) * 2
+        quats[c] = np.stack(((m[c, 0, 2] - m[c, 2, 0]) / s,
+                             (m[c, 0, 1] + m[c, 1, 0]) / s,
+                             0.25 * s,
+                             (m[c, 1, 2] + m[c, 2, 1]) / s), axis=1)
+        c = cases == 2
+        s = np.sqrt(1.0 + m[c, 2, 2] - m[c, 0, 0] - m[c, 1, 1]) * 2
+        quats[c] = np.stack(((m[c, 1, 0] - m[c, 0, 1]) / s,
+                             (m[c, 0, 2] + m[c, 2, 0]) / s,
+                             (m[c, 1, 2] + m[c, 2, 1]) / s,
+                             0.25 * s), axis=1)
+    quats /= np.linalg.norm(quats, axis=1)[:, None]
+    quats[quats[:, 0] < 0] *= -1
+    if len(quats) > 1:
+        flips = (quats[1:] * quats[:-1]).sum(axis=1) < 0
+        signs = np.cumprod(np.where(flips, -1.0, 1.0))
+        quats[1:] *= signs[:, None]
+    return quats
+
+
+def build_material(chunk):
+    """
+    Returns the settings of a material chunk as a dict. The colors are
+    scaled to [0, 1], and the textures map each used texture slot to its
+    (long name, name) pair.
+    """
+    assert (isinstance(chunk, CgfFormat.MtlChunk))
+
+    def get_color(color):
+        return (float(color.r) / 255, float(color.g) / 255, float(color.b) / 255)
+
+    textures = {}
+    if chunk.type == CgfFormat.MtlType.STANDARD:
+        for slot in TEXTURE_SLOTS:
+            tex_map = getattr(chunk, slot)
+            if tex_map and tex_map.type > 0:
+                textures[slot] = (to_str(tex_map.long_name),
+                                  to_str(tex_map.name) if tex_map.name else None)
+
+    return {
+        'name': chunk.name,
+        'type': int(chunk.type),
+        'diffuse_color': get_color(chunk.col_d),
+        'specular_color': get_color(chunk.col_s),
+        'ambient_color': get_color(chunk.col_a),
+        'self_illum': chunk.self_illum,
+        'spec_level': chunk.spec_level,
+        'spec_shininess': chunk.spec_shininess,
+        'opacity': chunk.opacity,
+        'alpha_test': chunk.alpha_test,
+        'two_sided': chunk.flags.two_sided == 1,
+        'textures': textures,
+    }
+
+
+def build_mesh(chunk, morph_chunks=()):
+    """
+    Returns the geometry of a mesh chunk as a dict of arrays (see
+    MeshChunk.get_geometry_arrays), with the face attributes, the vertex
+    weights and the morph targets as (name, vertex_ids, targets).
+    The normals are empty for a Crysis mesh without a normals stream:
+
+    >>> chunk = CgfFormat.MeshChunk()
+    >>> chunk.set_geometry_arrays(
+    ...     vertices=np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0)]),
+    ...     normals=np.array([(0, 0, 1)] * 3),
+    ...     triangles=np.array([(0, 1, 2)]))
+    >>> # keep only the Crysis data, without normals
+    >>> chunk.num_vertices = chunk.num_faces = 0
+    >>> chunk.vertices.update_size()
+    >>> chunk.faces.update_size()
+    >>> chunk.normals_data = None
+    >>> mesh = build_mesh(chunk)
+    >>> mesh['vertices'].shape, mesh['normals'].shape, mesh['triangles'].tolist()
+    ((3, 3), (0, 3), [[0, 1, 2]])
+    """
+    assert (isinstance(chunk, CgfFormat.MeshChunk))
+
+    vertices, normals, triangles, uvs, uv_triangles, colors = \
+        chunk.get_geometry_arrays()
+    if uvs is not None and len(uv_triangles) != len(triangles):
+        print('Ignore uvs, the number of uv faces does not match the number of faces.')
+        uvs = uv_triangles = None
+    material_ids, smooth_groups, _ = chunk.get_face_attributes()
+
+    return {
+        'vertices': vertices,
+        'normals': normals,
+        'triangles': triangles,
+        'uvs': uvs,
+        'uv_triangles': uv_triangles,
+        'colors': colors,
+        'material_ids': material_ids[:len(triangles)],
+        'smooth_groups': smooth_groups[:len(triangles)],
+        'vertex_weights': chunk.get_vertex_weight_arrays() if chunk.has_vertex_weights else None,
+        'vertex_groups': None,
+        'fingerprint': None,
+        'morph_targets': [(to_str(morph_chunk.target_name),) + morph_chunk.get_morph_arrays()
+                          for morph_chunk in morph_chunks],
+    }
+
+
+def get_material_slots(material_ids):
+    """
+    Maps the material ids of the faces onto material slots, in order of
+    first use. Returns the used material ids, in slot order, and the slot
+    index of every face (0 for faces with a negative material id).
+
+    >>> get_material_slots(np.array([3, 1, 3, -1, 2]))
+    ([3, 1, 2], array([0, 1, 0, 0, 2], dtype=int32))
+    """
+    valid_ids = material_ids >= 0
+    use_mat_ids, first_use, slot_of_id = np.unique(
+        material_ids[valid_ids], return_index=True, return_inverse=True)
+    order = np.argsort(first_use)
+    slot_rank = np.empty(len(order), dtype=np.int32)
+    slot_rank[order] = np.arange(len(order), dtype=np.int32)
+    material_index = np.zeros(len(material_ids), dtype=np.int32)
+    material_index[valid_ids] = slot_rank[slot_of_id.ravel()]
+    return use_mat_ids[order].tolist(), material_index
+
+
+def get_material_fingerprint(material):
+    """
+    Returns a hex digest of the material settings (see build_material):
+    the colours, textures, opacity, alpha test, two sided flag and so on,
+    but not the name, so that materials differing only by name (or by
+    their shader suffix) get the same fingerprint.
+    """
+    settings = sorted((key, value) for key, value in material.items() if key != 'name')
+    return hashlib.sha1(repr(settings).encode()).hexdigest()
+
+
+def get_mesh_fingerprint(mesh, materials=()):
+    """
+    Returns a hex digest of the mesh arrays (see build_mesh) and of the
+    materials it uses, so that identical geometry can share a single
+    blender mesh.
+    """
+    h = hashlib.sha1()
+
+    def update(value):
+        if value is None:
+            h.update(b'None')
+        else:
+            value = np.ascontiguousarray(value)
+            h.update(('%s%s' % (value.dtype.str, value.shape)).encode())
+            h.update(value.tobytes())
+
+    for key in ('vertices', 'normals', 'triangles', 'uvs', 'uv_triangles', 'colors',
+                'material_ids', 'smooth_groups'):
+        update(mesh[key])
+    for value in (mesh['vertex_weights'] or (None,)):
+        update(value)
+    for target_name, vertex_ids, targets in mesh['morph_targets']:
+        h.update(target_name.encode())
+        update(vertex_ids)
+        update(targets)
+    for material in materials:
+        h.update(get_material_fingerprint(material).encode())
+    return h.hexdigest()
+
+
+def group_vertex_weights(vertex_weights, num_bones):
+    """
+    Returns the vertex weights (see MeshChunk.get_vertex_weight_arrays)
+    grouped by bone and by quantised weight, as a list of (bone_id,
+    weight, vertex_ids), so that every group can be added to a vertex
+    group in a single call. Links to unknown bones are dropped.
+
+    >>> group_vertex_weights((np.array([0, 1, 1, 2, 3]),
+    ...                       np.array([0, 0, 1, 0, 5]),
+    ...                       np.array([1.0, 0.5, 0.5, 1.0, 1.0])), 2)
+    Ignore 1 bone links with an unknown bone.
+    [(0, 0.5, [1]), (0, 1.0, [0, 2]), (1, 0.5, [1])]
+    """
+    vertex_ids, bone_ids, weights = vertex_weights
+    valid = (bone_ids >= 0) & (bone_ids < num_bones)
+    if not valid.all():
+        print('Ignore %i bone links with an unknown bone.' %
+              np.count_nonzero(~valid))
+    vertex_ids = vertex_ids[valid]
+    bone_ids = bone_ids[valid].astype(np.int64)
+    steps = np.rint(np.clip(weights[valid], 0.0, 1.0)
+                    * WEIGHT_STEPS).astype(np.int64)
+
+    keys = bone_ids * (WEIGHT_STEPS + 1) + steps
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    vertex_ids = vertex_ids[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    return [(key // (WEIGHT_STEPS + 1),
+             (key % (WEIGHT_STEPS + 1)) / WEIGHT_STEPS,
+             ids.tolist())
+            for key, ids in zip(unique_keys.tolist(),
+                                np.split(vertex_ids, starts[1:]))]
+
+
+def get_bone_names(names):
+    """
+    Returns the blender names of the bones, and the CRC32 of the original
+    names, which the animation controllers refer to.
+    """
+    return ([name.replace(' ', '_') for name in names],
+            [zlib.crc32(name.encode('ascii')) for name in names])
+
+
+def get_bind_matrices(chunk):
+    """
+    Returns the (n, 4, 4) bind matrices of a bone initial position chunk,
+    as blender matrices, with the bones turned so that they point along
+    their y axis.
+    """
+    assert (isinstance(chunk, CgfFormat.BoneInitialPosChunk))
+    fix_z = np.array(((0.0, -1.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, 1.0)))
+    mats = list(chunk.initial_pos_matrices)
+    rots = np.array([mat.rot.as_tuple() for mat in mats], dtype=np.float64).reshape(-1, 3, 3)
+    bind_mats = np.tile(np.identity(4), (len(mats), 1, 1))
+    bind_mats[:, :3, :3] = np.transpose(rots, (0, 2, 1)) @ fix_z.T
+    bind_mats[:, :3, 3] = [(mat.pos.x, mat.pos.y, mat.pos.z) for mat in mats]
+    return bind_mats
+
+
+def build_skeleton(name_chunk, anim_chunk=None, initial_pos_chunk=None):
+    """
+    Returns the skeleton as a dict: the bone names and their CRC32, the
+    bind matrices (see get_bind_matrices) and the parent ids, which are
+    None when there are no bones to create (no bone animation chunk).
+    """
+    assert (isinstance(name_chunk, CgfFormat.BoneNameListChunk))
+    names, name_crcs = get_bone_names(list(name_chunk.names))
+    num_bones = len(names)
+
+    parent_ids = None
+    if anim_chunk is not None:
+        parent_ids = np.full(num_bones, -1, dtype=np.int64)
+        for i, bone_entry in enumerate(list(anim_chunk.bones)[:num_bones]):
+            parent_ids[i] = bone_entry.parent_id
+
+    bind_mats = np.tile(np.identity(4), (num_bones, 1, 1))
+    if initial_pos_chunk is not None:
+        initial_bind_mats = get_bind_matrices(initial_pos_chunk)[:num_bones]
+        bind_mats[:len(initial_bind_mats)] = initial_bind_mats
+
+    return {
+        'names': names,
+        'name_crcs': name_crcs,
+        'parent_ids': parent_ids,
+        'bind_matrices': bind_mats,
+    }
+
+
+def compute_bone_tails(bind_mats, parent_ids):
+    """
+    Returns the tail of every bone: the average head of its children, or
+    for a leaf bone, half the distance to its parent along its x axis.
+    """
+    has_parent = parent_ids >= 0
+    heads = bind_mats[:, :3, 3]
+
+    num_children = np.bincount(parent_ids[has_parent], minlength=len(heads))
+    children_heads = np.zeros_like(heads)
+    np.add.at(children_heads, parent_ids[has_parent], heads[has_parent])
+
+    parent_heads = np.zeros_like(heads)
+    parent_heads[has_parent] = heads[parent_ids[has_parent]]
+    half_lengths = np.linalg.norm(heads - parent_heads, axis=1) * 0.5
+    tails = heads + half_lengths[:, None] * bind_mats[:, :3, 0]
+
+    is_parent = num_children > 0
+    tails[is_parent] = children_heads[is_parent] / num_children[is_parent, None]
+    # Specify root bone, move a little bit preventing invalid data to be removed
+    tails[is_parent & ~has_parent, 2] += CgfFormat.EPSILON
+    return tails
+
+
+def compute_bone_layout(bind_mats, parent_ids, auto_connect=True):
+    """
+    Returns the edit bone heads, tails, rolls and auto connect flags of
+    the bones, as arrays.
+
+    >>> bind_mats = np.tile(np.identity(4), (2, 1, 1))
+    >>> bind_mats[1, :3, 3] = (0.0, 2.0, 0.0)
+    >>> heads, tails, rolls, connects = compute_bone_layout(bind_mats, np.array([-1, 0]))
+    >>> heads.tolist()
+    [[0.0, 0.0, 0.0], [0.0, 2.0, 0.0]]
+    >>> np.round(tails, 3).tolist()
+    [[0.0, 2.0, 0.0], [0.0, 2.2, 0.0]]
+    >>> rolls.tolist(), connects.tolist()
+    ([0.0, 0.0], [False, True])
+    """
+    num_bones = len(bind_mats)
+    if not num_bones:
+        return (np.zeros((0, 3)), np.zeros((0, 3)), np.zeros(0),
+                np.zeros(0, dtype=bool))
+
+    num_children = np.bincount(parent_ids[parent_ids >= 0], minlength=num_bones)
+    heads = bind_mats[:, :3, 3]
+    bone_tails = compute_bone_tails(bind_mats, parent_ids)
+
+    # bone lengths; the bone direction and roll follow the bind matrix
+    axes = bind_mats[:, :3, 1]
+    lengths = np.linalg.norm(bone_tails - heads, axis=1)
+    is_leaf = num_children == 0
+    lengths[is_leaf] = np.linalg.norm(axes[is_leaf] + (0.0, 0.0, 0.001), axis=1) / 5
+    # a single child at the bone origin: use a short bone instead
+    at_origin = np.zeros(num_bones, dtype=bool)
+    local_tails = np.einsum('nij,nj->ni', np.linalg.inv(bind_mats),
+                            np.hstack((bone_tails, np.ones((num_bones, 1)))))[:, :3]
+    at_origin[num_children == 1] = ~local_tails[num_children == 1].any(axis=1)
+    lengths[at_origin] = np.linalg.norm(axes[at_origin], axis=1) * 0.05
+
+    rots = bind_mats[:, :3, :3]
+    rots = rots / np.linalg.norm(rots, axis=1)[:, None, :]
+    tails = heads + rots[:, :, 1] * lengths[:, None]
+    rolls = mat3_to_roll_arrays(rots)
+
+    epsilon = 1.19209290E-07
+    connects = np.zeros(num_bones, dtype=bool)
+    if auto_connect:
+        has_parent = parent_ids >= 0
+        distances = tails[parent_ids[has_parent]] - heads[has_parent]
+        connects[has_parent] = (distances * distances).sum(axis=1) <= epsilon
+
+    return heads, tails, rolls, connects
+
+
+def build_scene(filepath, scale_factor=1.0, profile=None):
+    """
+    Reads a CGF file into a dict of plain data: the materials (see
+    build_material, in chunk order), the meshes (see build_mesh), the
+    nodes that place them, each with its name, its 4x4 transform and the
+    index of its mesh, and the skeleton (see build_skeleton) with the
+    index of its skinned mesh, if the file has bones. Every mesh gets the
+    fingerprint of its geometry and materials (see get_mesh_fingerprint).
+    The phases are recorded in the profile, if any (see ImportProfile).
+
+    >>> mesh = CgfFormat.MeshChunk()
+    >>> mesh.set_geometry_arrays(
+    ...     vertices=np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0)]),
+    ...     normals=np.array([(0, 0, 1)] * 3),
+    ...     triangles=np.array([(0, 1, 2)]),
+    ...     uvs=np.array([(0, 0), (1, 0), (0, 1)]))
+    >>> node = CgfFormat.NodeChunk()
+    >>> node.name = b'triangle'
+    >>> node.object = mesh
+    >>> node.transform.set_identity()
+    >>> data = CgfFormat.Data()
+    >>> data.chunks = [mesh, node]
+    >>> tmpdir = tempfile.TemporaryDirectory()
+    >>> filepath = os.path.join(tmpdir.name, 'triangle.cgf')
+    >>> with open(filepath, 'wb') as stream:
+    ...     data.write(stream)
+    0
+    >>> scene = build_scene(filepath)
+    game:                    Far Cry
+    file type:               0xFFFF0000
+    version:                 0x00000744
+    user version:            0x00000001
+    id 0: MeshChunk
+    id 1: NodeChunk
+    >>> [(node['name'], node['mesh']) for node in scene['nodes']]
+    [('triangle', 0)]
+    >>> scene['meshes'][0]['vertices'].tolist()
+    [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+    >>> scene['meshes'][0]['triangles'].tolist()
+    [[0, 1, 2]]
+    >>> scene['meshes'][0]['uvs'].tolist()
+    [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+    >>> tmpdir.cleanup()
+    """
+    data = read_cgf(filepath, profile)
+
+    if data.game == 'Crysis':
+        print(
+            '[WARNING]: Crysis import is very experimental, and is likely to fail')
+
+    print('game:                    %s' % data.game)
+    print('file type:               0x%08X' % data.header.type)
+    print('version:                 0x%08X' % data.version)
+    print('user version:            0x%08X' % data.user_version)
+
+    for i, chunk in enumerate(data.chunks):
+        print('id %i: %s' % (i, chunk.__class__.__name__))
+
+    scale = get_global_scale(data, scale_factor)
+    with profile_phase(profile, 'apply_scale'):
+        for chunk in data.chunks:
+            chunk.apply_scale(1.0 / scale)
+
+    with profile_phase(profile, 'convert'):
+        return convert_scene(data, filepath)
+
+
+def convert_scene(data, filepath):
+    """
+    Converts the chunks of CGF data, read and scaled, into a scene (see
+    build_scene).
+    """
+    morph_chunks = {}
+    for chunk in data.chunks:
+        if isinstance(chunk, CgfFormat.MeshMorphTargetChunk) and chunk.mesh:
+            morph_chunks.setdefault(id(chunk.mesh), []).append(chunk)
+
+    scene = {
+        'filepath': filepath,
+        'game': data.game,
+        'materials': [],
+        'meshes': [],
+        'nodes': [],
+        'skeleton': None,
+    }
+    mesh_ids = {}
+    skeleton_chunks = {}
+    for chunk in data.chunks:
+        if isinstance(chunk, CgfFormat.MtlChunk):
+            scene['materials'].append(build_material(chunk))
+        elif isinstance(chunk, CgfFormat.NodeChunk) and isinstance(chunk.object, CgfFormat.MeshChunk):
+            mesh_id = mesh_ids.get(id(chunk.object))
+            if mesh_id is None:
+                mesh_id = mesh_ids[id(chunk.object)] = len(scene['meshes'])
+                scene['meshes'].append(build_mesh(chunk.object, morph_chunks.get(id(chunk.object), ())))
+            scene['nodes'].append({
+                'name': to_str(chunk.name),
+                'transform': np.array(chunk.transform.as_tuple(), dtype=np.float64).T,
+                'mesh': mesh_id,
+            })
+        elif isinstance(chunk, (CgfFormat.BoneNameListChunk, CgfFormat.BoneAnimChunk,
+                                CgfFormat.BoneInitialPosChunk)):
+            skeleton_chunks.setdefault(chunk.__class__, chunk)
+
+    name_chunk = skeleton_chunks.get(CgfFormat.BoneNameListChunk)
+    if name_chunk is not None:
+        initial_pos_chunk = skeleton_chunks.get(CgfFormat.BoneInitialPosChunk)
+        skeleton = build_skeleton(name_chunk, skeleton_chunks.get(CgfFormat.BoneAnimChunk),
+                                  initial_pos_chunk)
+        skeleton['mesh'] = None
+        if initial_pos_chunk is not None:
+            skeleton['mesh'] = mesh_ids.get(id(initial_pos_chunk.mesh))
+        if skeleton['mesh'] is not None:
+            mesh = scene['meshes'][skeleton['mesh']]
+            if mesh['vertex_weights'] is not None:
+                mesh['vertex_groups'] = group_vertex_weights(mesh['vertex_weights'],
+                                                             len(skeleton['names']))
+        scene['skeleton'] = skeleton
+
+    # the material ids of the faces index the materials, leaving out the
+    # multi materials
+    materials = [material for material in scene['materials']
+                 if material['type'] != CgfFormat.MtlType.MULTI]
+    for mesh in scene['meshes']:
+        material_ids = np.unique(mesh['material_ids'])
+        mesh['fingerprint'] = get_mesh_fingerprint(
+            mesh, [materials[i] for i in material_ids.tolist() if 0 <= i < len(materials)])
+    return scene
+
+
+def scan_directory(path):
+    """
+    Returns the file names and the (name, mtime) of the subdirectories of
+    a directory. Symbolic links to directories are not followed.
+    """
+    files = []
+    dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append((entry.name, entry.stat(follow_symlinks=False).st_mtime_ns))
+                    else:
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, dirs
+
+
+def scan_texture_index(root, max_workers=None):
+    """
+    Scans the directory tree under root, one level at a time with every
+    directory of the level scanned in parallel. Returns the index as a
+    dict: the mtime of every directory, and the relative path (with '/'
+    separators) of every file, keyed by its lowercase path.
+    """
+    root = os.path.abspath(root)
+    dirs = {'': os.stat(root).st_mtime_ns}
+    files = {}
+    level = ['']
+    with ThreadPoolExecutor(max_workers) as executor:
+        while level:
+            next_level = []
+            results = executor.map(lambda reldir: scan_directory(os.path.join(root, reldir)), level)
+            for reldir, (names, subdirs) in zip(level, results):
+                for name in names:
+                    relpath = reldir + name
+                    files.setdefault(relpath.lower(), relpath)
+                for name, mtime in subdirs:
+                    subdir = reldir + name + '/'
+                    dirs[subdir] = mtime
+                    next_level.append(subdir)
+            level = next_level
+    return {
+        'version': TEXTURE_INDEX_VERSION,
+        'root': root,
+        'dirs': dirs,
+        'files': files,
+    }
+
+
+def is_texture_index_valid(index, max_workers=None):
+    """
+    Returns whether no directory of the index has been modified (or
+    removed) since the index was scanned. Adding or removing a file
+    changes the mtime of its directory.
+    """
+    root = index['root']
+
+    def get_mtime(reldir):
+        try:
+            return os.stat(os.path.join(root, reldir)).st_mtime_ns
+        except OSError:
+            return None
+
+    reldirs = list(index['dirs'])
+    with ThreadPoolExecutor(max_workers) as executor:
+        mtimes = executor.map(get_mtime, reldirs)
+        return all(mtime == index['dirs'][reldir] for reldir, mtime in zip(reldirs, mtimes))
+
+
+def get_texture_index_cache_path(root, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'io_scene_cgf')
+    digest = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()
+    return os.path.join(cache_dir, 'textures-%s.json' % digest)
+
+
+def get_texture_index(root, cache_dir=None, max_workers=None):
+    """
+    Returns the texture index of the project root (see scan_texture_index).
+    The index is stored in cache_dir (by default, in the temporary
+    directory), and only scanned again when a directory was modified.
+    """
+    root = os.path.abspath(root)
+    cache_path = get_texture_index_cache_path(root, cache_dir)
+
+    index = None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != TEXTURE_INDEX_VERSION or index.get('root') != root:
+            index = None
+    except (OSError, ValueError):
+        index = None
+
+    if index is not None and is_texture_index_valid(index, max_workers):
+        return index
+
+    print('Scanning textures of %s ...' % root)
+    index = scan_texture_index(root, max_workers)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = '%s.%i.tmp' % (cache_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print('Failed to store the texture index: %s' % e)
+    return index
+
+
+def resolve_texture_path(index, image_path):
+    """
+    Returns the path of a (Windows style, case insensitive) texture path
+    relative to the root of the texture index, or of its file name at the
+    root, or None if neither exists.
+    """
+    image_path = posixpath.normpath(image_path.replace('\\', '/'))
+    if os.path.isabs(image_path) and os.path.exists(image_path):
+        return image_path
+    files = index['files']
+    relpath = files.get(image_path.lstrip('/').lower())
+    if relpath is None:
+        relpath = files.get(posixpath.basename(image_path).lower())
+    if relpath is None:
+        return None
+    return os.path.join(index['root'], relpath)
+
+
+def get_png_path(dds_path):
+    """
+    Returns the path of the PNG converted from a DDS texture: next to it,
+    with the lowercase name.
+    """
+    dirname, basename = os.path.split(dds_path)
+    return os.path.join(dirname, os.path.splitext(basename)[0].lower() + '.png')
+
+
+def write_png(filepath, rgba):
+    """
+    Writes an array of RGBA pixels, shape (height, width, 4), top row
+    first, as an 8 bit PNG image.
+    """
+    height, width, _ = rgba.shape
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    # every row starts with filter type 0 (none)
+    rows = np.zeros((height, 1 + 4 * width), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, 4 * width)
+    with open(filepath, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def get_file_digest(filepath):
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def convert_texture(dds_path, png_path, digest=None):
+    """
+    Converts the top mipmap of a DDS texture to a PNG image, unless the
+    content of the DDS file still has the given digest and the PNG image
+    exists. Returns the manifest entry of the texture (see
+    convert_textures).
+    """
+    stat = os.stat(dds_path)
+    new_digest = get_file_digest(dds_path)
+    if new_digest != digest or not os.path.exists(png_path):
+        data = DdsFormat.Data()
+        with open(dds_path, 'rb') as stream:
+            data.read(stream)
+        rgba, = data.get_rgba_arrays(top_mip_only=True)
+        tmp_path = '%s.%i.tmp' % (png_path, os.getpid())
+        write_png(tmp_path, rgba)
+        os.replace(tmp_path, png_path)
+    return {
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'digest': new_digest,
+        'output': png_path,
+        'output_mtime': os.stat(png_path).st_mtime_ns,
+    }
+
+
+def get_texture_manifest_path(cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'io_scene_cgf')
+    return os.path.join(cache_dir, 'converted-textures.json')
+
+
+def is_texture_converted(dds_path, entry):
+    """
+    Returns whether neither the DDS texture nor the PNG image has changed
+    since the conversion recorded in the manifest entry. Failed
+    conversions are recorded without an image, and not tried again until
+    the texture changes.
+    """
+    if entry is None:
+        return False
+    try:
+        stat = os.stat(dds_path)
+        output_mtime = None
+        if entry['output'] is not None:
+            output_mtime = os.stat(entry['output']).st_mtime_ns
+    except OSError:
+        return False
+    return (stat.st_mtime_ns == entry['mtime'] and stat.st_size == entry['size']
+            and output_mtime == entry['output_mtime'])
+
+
+def convert_textures(dds_paths, cache_dir=None, max_workers=None):
+    """
+    Converts DDS textures to PNG images (see get_png_path) in worker
+    processes, and returns the path of the PNG image of every texture, or
+    None if the conversion failed. The conversions are recorded in a
+    manifest, stored in cache_dir (by default, in the temporary
+    directory): textures unchanged since (by mtime, or else by content)
+    are not converted again.
+    """
+    dds_paths = list(dict.fromkeys(os.path.abspath(path) for path in dds_paths))
+    manifest_path = get_texture_manifest_path(cache_dir)
+
+    manifest = None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != TEXTURE_MANIFEST_VERSION:
+            manifest = None
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None:
+        manifest = {'version': TEXTURE_MANIFEST_VERSION, 'textures': {}}
+    entries = manifest['textures']
+
+    png_paths = {}
+    pending = []
+    for dds_path in dds_paths:
+        entry = entries.get(dds_path)
+        if is_texture_converted(dds_path, entry):
+            png_paths[dds_path] = entry['output']
+        elif os.path.exists(dds_path):
+            pending.append(dds_path)
+        else:
+            png_paths[dds_path] = None
+    if not pending:
+        return png_paths
+
+    print('Converting %i of %i textures ...' % (len(pending), len(dds_paths)))
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(pending))
+    with get_pool_executor(max_workers) as executor:
+        futures = {}
+        for dds_path in pending:
+            entry = entries.get(dds_path)
+            digest = entry['digest'] if entry is not None else None
+            futures[executor.submit(convert_texture, dds_path,
+                                    get_png_path(dds_path), digest)] = dds_path
+        for future in futures:
+            dds_path = futures[future]
+            try:
+                entries[dds_path] = future.result()
+                png_paths[dds_path] = entries[dds_path]['output']
+            except Exception as e:
+                print('Failed to convert %r: %s' % (dds_path, e))
+                try:
+                    stat = os.stat(dds_path)
+                    entries[dds_path] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                                         'digest': None, 'output': None, 'output_mtime': None}
+                except OSError:
+                    entries.pop(dds_path, None)
+                png_paths[dds_path] = None
+
+    try:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp_path = '%s.%i.tmp' % (manifest_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print('Failed to store the texture manifest: %s' % e)
+    return png_paths
+
+
+def parse_controller(chunk, scale=1.0):
+    """
+    Returns the keys of a controller chunk as arrays: times (n,),
+    positions (n, 3) and rotations (n, 4) as (w, x, y, z).
+    """
+    assert (isinstance(chunk, CgfFormat.ControllerChunk))
+    assert (chunk.type == CgfFormat.CtrlType.NONE)
+
+    keys = chunk.keys
+    times = np.array([k.time for k in keys], dtype=np.float64)
+    positions = np.array([(k.abs_pos.x, k.abs_pos.y, k.abs_pos.z)
+                          for k in keys], dtype=np.float64).reshape(-1, 3) * scale
+    rotations = np.array([(k.rel_quat.w, k.rel_quat.x, k.rel_quat.y, k.rel_quat.z)
+                          for k in keys], dtype=np.float64).reshape(-1, 4)
+    return times, positions, rotations
+
+
+def sample_keys(key_times, positions, quats, times):
+    """
+    Linearly interpolates the positions and (normalised) quaternions of
+    the keys at the given times, holding the first and last key.
+    """
+    if len(key_times) == len(times) and np.array_equal(key_times, times):
+        return positions, quats
+    if len(key_times) == 1:
+        return (np.repeat(positions, len(times), axis=0),
+                np.repeat(quats, len(times), axis=0))
+    idx = np.clip(np.searchsorted(key_times, times, side='right') - 1,
+                  0, len(key_times) - 2)
+    t0 = key_times[idx]
+    t1 = key_times[idx + 1]
+    f = np.clip((times - t0) / np.maximum(t1 - t0, 1e-12), 0.0, 1.0)[:, None]
+    q0 = quats[idx]
+    q1 = quats[idx + 1]
+    q1 = np.where((q0 * q1).sum(axis=1)[:, None] < 0, -q1, q1)
+    q = q0 + (q1 - q0) * f
+    q /= np.linalg.norm(q, axis=1)[:, None]
+    return positions[idx] + (positions[idx + 1] - positions[idx]) * f, q
+
+
+def get_key_errors(times, positions, rotations, first, last):
+    """
+    Returns the position and rotation angle errors of the keys between
+    first and last, when they are interpolated from these two keys.
+    """
+    inner = slice(first + 1, last)
+    interp_positions, interp_rotations = sample_keys(
+        times[[first, last]], positions[[first, last]], rotations[[first, last]], times[inner])
+    position_errors = np.linalg.norm(positions[inner] - interp_positions, axis=1)
+    dots = np.abs((rotations[inner] / np.linalg.norm(rotations[inner], axis=1)[:, None]
+                   * interp_rotations).sum(axis=1))
+    angle_errors = 2.0 * np.arccos(np.clip(dots, 0.0, 1.0))
+    return position_errors, angle_errors
+
+
+def reduce_keys(times, positions, rotations, position_tolerance, angle_tolerance):
+    """
+    Removes the keys that linear interpolation of the remaining keys
+    reproduces within the tolerances (in blender units and radians), by
+    recursive subdivision (Ramer-Douglas-Peucker). The first and last keys
+    are always kept.
+
+    >>> times = np.array([0.0, 1.0, 2.0, 3.0])
+    >>> positions = np.array([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0),
+    ...                       (2.0, 0.0, 0.0), (3.0, 1.0, 0.0)])
+    >>> rotations = np.tile((1.0, 0.0, 0.0, 0.0), (4, 1))
+    >>> times, positions, rotations = reduce_keys(times, positions, rotations, 0.01, 0.01)
+    >>> times.tolist()
+    [0.0, 2.0, 3.0]
+    >>> positions.tolist()
+    [[0.0, 0.0, 0.0], [2.0, 0.0, 0.0], [3.0, 1.0, 0.0]]
+    """
+    num_keys = len(times)
+    if num_keys <= 2:
+        return times, positions, rotations
+    keep = np.zeros(num_keys, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, num_keys - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        position_errors, angle_errors = get_key_errors(times, positions, rotations, first, last)
+        errors = np.maximum(position_errors / max(position_tolerance, 1e-12),
+                            angle_errors / max(angle_tolerance, 1e-12))
+        worst = int(np.argmax(errors))
+        if errors[worst] > 1.0:
+            split = first + 1 + worst
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+    return times[keep], positions[keep], rotations[keep]
+
+
+def resample_keys(times, positions, rotations, ticks_per_frame):
+    """
+    Resamples the keys to one key per whole frame, over the time range of
+    the keys.
+
+    >>> times, positions, rotations = resample_keys(
+    ...     np.array([0.0, 160.0, 480.0]),
+    ...     np.array([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (3.0, 0.0, 0.0)]),
+    ...     np.tile((1.0, 0.0, 0.0, 0.0), (3, 1)), 160.0)
+    >>> times.tolist()
+    [0.0, 160.0, 320.0, 480.0]
+    >>> positions[:, 0].tolist()
+    [0.0, 1.0, 2.0, 3.0]
+    """
+    if not len(times) or ticks_per_frame <= 0:
+        return times, positions, rotations
+    frames = np.arange(np.ceil(times[0] / ticks_per_frame),
+                       np.floor(times[-1] / ticks_per_frame) + 1)
+    frame_times = frames * ticks_per_frame
+    if not len(frame_times):
+        frame_times = times[:1]
+    positions, rotations = sample_keys(times, positions, rotations, frame_times)
+    return frame_times, positions, rotations
+
+
+def parse_animation(filepath, scale_factor=1.0, resample=False,
+                    position_tolerance=None, angle_tolerance=None):
+    """
+    Parses a CAF file into a dict with the timing, the bone names (if the
+    file has any), and the keys of every controller keyed by ctrl_id.
+    The keys are optionally resampled to whole frames, and then reduced,
+    if tolerances are given (see reduce_keys).
+    """
+    data = read_cgf(filepath)
+    scale = 1.0 / get_global_scale(data, scale_factor)
+
+    animation = {
+        'filepath': filepath,
+        'bone_names': None,
+        'controllers': {},
+    }
+    for chunk in data.chunks:
+        if isinstance(chunk, CgfFormat.BoneNameListChunk):
+            if animation['bone_names'] is None:
+                animation['bone_names'] = list(chunk.names)
+        elif isinstance(chunk, CgfFormat.AnimChunk):
+            animation['num_keys'] = chunk.key_nums
+            animation['position'] = (chunk.initial_pos.x, chunk.initial_pos.y,
+                                     chunk.initial_pos.z)
+        elif isinstance(chunk, CgfFormat.TimingChunk):
+            animation['secs_per_tick'] = 1.0 * chunk.secs_per_tick
+            animation['ticks_per_frame'] = 1.0 * chunk.ticks_per_frame
+            animation['start_frame'] = chunk.global_range.start
+            animation['end_frame'] = chunk.global_range.end
+        elif isinstance(chunk, CgfFormat.ControllerChunk):
+            if chunk.ctrl_id not in animation['controllers']:
+                animation['controllers'][chunk.ctrl_id] = parse_controller(chunk, scale)
+
+    for ctrl_id, keys in animation['controllers'].items():
+        if resample and 'ticks_per_frame' in animation:
+            keys = resample_keys(*keys, animation['ticks_per_frame'])
+        if position_tolerance is not None and angle_tolerance is not None:
+            keys = reduce_keys(*keys, position_tolerance, angle_tolerance)
+        animation['controllers'][ctrl_id] = keys
+    return animation
+
+
+def compute_pose_keys(bones, ctrls):
+    """
+    Converts the controller keys of all bones into pose bone locations
+    and rotations with batched matrix math, so no frame has to be
+    evaluated. The bones map each bone name to its rest matrix (relative
+    to the armature), its parent name and its use_local_location flag.
+    Yields (bone_name, times, locations, rotations).
+
+    A key at the rest pose of a child bone gives the identity, while the
+    keys of a root bone are also rotated into blender's bone axes; keys of
+    bones not in the armature are ignored:
+
+    >>> child_rest = np.identity(4)
+    >>> child_rest[1, 3] = 2.0
+    >>> bones = {'root': (np.identity(4), None, True),
+    ...          'child': (child_rest, 'root', True)}
+    >>> identity = np.array([(1.0, 0.0, 0.0, 0.0)])
+    >>> ctrls = [('root', 1, np.array([0.0]), np.zeros((1, 3)), identity),
+    ...          ('child', 2, np.array([0.0]), np.array([(2.0, 0.0, 0.0)]), identity),
+    ...          ('unknown', 3, np.array([0.0]), np.zeros((1, 3)), identity)]
+    >>> for bone_name, times, locations, rotations in compute_pose_keys(bones, ctrls):
+    ...     print(bone_name, locations.tolist(), np.round(rotations, 4).tolist())
+    root [[0.0, 0.0, 0.0]] [[0.7071, 0.0, 0.0, -0.7071]]
+    child [[0.0, 0.0, 0.0]] [[1.0, 0.0, 0.0, 0.0]]
+    """
+    # key matrices are given relative to the parent pose, with the
+    # bones rotated by fix_z (see get_bind_matrices)
+    fix_z = np.array(((0.0, 1.0, 0.0), (-1.0, 0.0, 0.0), (0.0, 0.0, 1.0)))
+
+    animated = {}
+    for (bone_name, ctrl_id, times, positions, rotations) in ctrls:
+        if bone_name in bones and bone_name not in animated and len(times):
+            animated[bone_name] = (times, positions, rotations)
+
+    offsets = {}
+
+    def get_offset(bone_name):
+        # rest matrix of the bone relative to the rest of its parent
+        offset = offsets.get(bone_name)
+        if offset is None:
+            matrix_local, parent_name, _ = bones[bone_name]
+            offset = np.asarray(matrix_local, dtype=np.float64)
+            if parent_name is not None:
+                offset = np.linalg.inv(np.asarray(bones[parent_name][0], dtype=np.float64)) @ offset
+            offsets[bone_name] = offset
+        return offset
+
+    def get_local_keys(bone_name, times):
+        key_times, positions, rotations = animated[bone_name]
+        positions, rotations = sample_keys(key_times, positions, rotations, times)
+        # the key matrix is the translation times the inverted rotation
+        rots = np.transpose(quat_to_mat3_arrays(rotations), (0, 2, 1))
+        if bones[bone_name][1] is None:
+            return rots @ fix_z, positions
+        return fix_z.T @ rots @ fix_z, positions @ fix_z
+
+    pose_rotations = {}
+
+    def get_pose_rotations(bone_name, times):
+        if bone_name is None:
+            return np.identity(3)[None, :, :]
+        key = (bone_name, times.tobytes())
+        rots = pose_rotations.get(key)
+        if rots is None:
+            if bone_name in animated:
+                local_rots = get_local_keys(bone_name, times)[0]
+            else:
+                local_rots = get_offset(bone_name)[:3, :3]
+            rots = get_pose_rotations(bones[bone_name][1], times) @ local_rots
+            pose_rotations[key] = rots
+        return rots
+
+    for bone_name, (times, _, _) in animated.items():
+        _, parent_name, use_local_location = bones[bone_name]
+        offset = get_offset(bone_name)
+        local_rots, local_locs = get_local_keys(bone_name, times)
+        # pose = parent pose @ offset @ basis
+        basis_rots = offset[:3, :3].T @ local_rots
+        locations = local_locs - offset[:3, 3]
+        if use_local_location:
+            locations = locations @ offset[:3, :3]
+        else:
+            # the location is in parent pose space, not bone space
+            locations = np.einsum('kij,kj->ki',
+                                  np.broadcast_to(get_pose_rotations(parent_name, times),
+                                                  (len(times), 3, 3)),
+                                  locations)
+        yield bone_name, times, locations, mat3_to_quat_arrays(basis_rots)
+
+
+def get_pool_executor(max_workers=None):
+    # spawn rather than fork: forking a running Blender is not safe
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def parse_animations(filepaths, scale_factor=1.0, max_workers=None, **options):
+    """
+    Parses CAF files in worker processes. Yields (filepath, animation,
+    error) in the order of filepaths, as soon as each one is done. The
+    options are passed on to parse_animation.
+    """
+    filepaths = list(filepaths)
+    if not filepaths:
+        return
+    with get_pool_executor(max_workers) as executor:
+        futures = [executor.submit(parse_animation, filepath, scale_factor, **options)
+                   for filepath in filepaths]
+        for filepath, future in zip(filepaths, futures):
+            try:
+                yield filepath, future.result(), None
+            except Exception as e:
+                yield filepath, None, e
+
+
+def iter_scenes(filepaths, scale_factor=1.0, max_workers=None, max_in_flight=None):
+    """
+    Builds the scenes of CGF files in worker processes (see build_scene).
+    Yields (filepath, scene, error) as soon as each one is done, in order
+    of completion. At most max_in_flight files (by default, twice the
+    number of workers) are submitted and not yet yielded at any time, so
+    that the built scenes waiting for the caller stay bounded.
+    """
+    pending = list(filepaths)
+    pending.reverse()
+    if not pending:
+        return
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(pending))
+    if max_in_flight is None:
+        max_in_flight = 2 * max_workers
+    max_in_flight = max(1, max_in_flight)
+
+    with get_pool_executor(max_workers) as executor:
+        in_flight = {}
+        while pending or in_flight:
+            while pending and len(in_flight) < max_in_flight:
+                filepath = pending.pop()
+                in_flight[executor.submit(build_scene, filepath, scale_factor)] = filepath
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = in_flight.pop(future)
+                try:
+                    yield filepath, future.result(), None
+                except Exception as e:
+                    yield filepath, None, e
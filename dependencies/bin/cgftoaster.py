@@ -49,6 +49,7 @@ import pyffi.spells
 import pyffi.spells.cgf
 import pyffi.spells.cgf.check
 import pyffi.spells.cgf.dump
+import pyffi.spells.cgf.optimize
 import pyffi.formats.cgf
 import pyffi.spells.check
 
@@ -59,7 +60,8 @@ class CgfToaster(pyffi.spells.cgf.CgfToaster):
         pyffi.spells.cgf.check.SpellReadWrite,
         pyffi.spells.cgf.check.SpellCheckTangentSpace,
         pyffi.spells.cgf.check.SpellCheckHasVertexColors,
-        pyffi.spells.cgf.dump.SpellDumpAll]
+        pyffi.spells.cgf.dump.SpellDumpAll,
+        pyffi.spells.cgf.optimize.SpellGenerateLods]
     ALIASDICT = {
         "read": "check_read",
         "readwrite": "check_readwrite"}
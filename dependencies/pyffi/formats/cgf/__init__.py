@@ -218,11 +218,16 @@ import os
 import re
 import warnings
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 import pyffi.object_models.common
 import pyffi.object_models
 import pyffi.object_models.xml
+import pyffi.utils.bvh
 import pyffi.utils.mathutils
 import pyffi.utils.tangentspace
 from pyffi.object_models.xml.basic import BasicBase
@@ -1856,6 +1861,233 @@ chunk size mismatch when reading %s at 0x%08X
                     for i in range(meshsubset.num_indices // 3):
                         yield meshsubset.mat_id
 
+        def get_geometry_arrays(self):
+            """Get the geometry as numpy arrays, following the same
+            conventions as :meth:`get_vertices`, :meth:`get_normals`,
+            :meth:`get_triangles`, :meth:`get_uvs`,
+            :meth:`get_uv_triangles`, and :meth:`get_colors`.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> chunk.set_geometry(verticeslist = [[(0,0,0),(0,1,0),(1,0,0)]],
+            ...                    normalslist = [[(0,0,1)] * 3],
+            ...                    triangleslist = [[(0,1,2)]],
+            ...                    uvslist = [[(0,0),(0,1),(1,0)]])
+            >>> vertices, normals, triangles, uvs, uv_triangles, colors = chunk.get_geometry_arrays()
+            >>> vertices.shape, normals.shape, triangles.tolist(), uvs.shape
+            ((3, 3), (3, 3), [[0, 1, 2]], (3, 2))
+            >>> uv_triangles.tolist(), colors
+            ([[0, 1, 2]], None)
+
+            :return: A tuple ``(vertices, normals, triangles, uvs,
+                uv_triangles, colors)``. The uv and color entries are
+                ``None`` if the mesh has no uvs or no colors.
+            """
+            if numpy is None:
+                raise ImportError("get_geometry_arrays requires numpy")
+            vertices = numpy.array(
+                list((vert.x, vert.y, vert.z) for vert in self.get_vertices()),
+                dtype=numpy.float32).reshape(-1, 3)
+            normals = numpy.array(
+                list((norm.x, norm.y, norm.z) for norm in self.get_normals()),
+                dtype=numpy.float32).reshape(-1, 3)
+            if self.faces:
+                triangles = numpy.array(
+                    list((face.v_0, face.v_1, face.v_2) for face in self.faces),
+                    dtype=numpy.int32).reshape(-1, 3)
+            elif self.indices_data:
+                triangles = numpy.fromiter(
+                    self.indices_data.indices, dtype=numpy.int32,
+                    count=self.indices_data.num_elements)
+                triangles = triangles[:len(triangles) - len(triangles) % 3]
+                triangles = triangles.reshape(-1, 3)
+            else:
+                triangles = numpy.zeros((0, 3), dtype=numpy.int32)
+            uvs = numpy.array(list(self.get_uvs()),
+                              dtype=numpy.float32).reshape(-1, 2)
+            if not len(uvs):
+                uvs = uv_triangles = None
+            elif self.uv_faces:
+                uv_triangles = numpy.array(
+                    list((uvface.t_0, uvface.t_1, uvface.t_2)
+                         for uvface in self.uv_faces),
+                    dtype=numpy.int32).reshape(-1, 3)
+            else:
+                # Crysis: UV triangles coincide with triangles
+                uv_triangles = triangles
+            colors = numpy.array(list(self.get_colors()),
+                                 dtype=numpy.uint8).reshape(-1, 4)
+            if not len(colors):
+                colors = None
+            return vertices, normals, triangles, uvs, uv_triangles, colors
+
+        def get_vertex_weight_arrays(self):
+            """Get the vertex weights as flat numpy arrays, with one entry
+            per bone link.
+
+            :return: A tuple ``(vertex_ids, bone_ids, weights)``.
+            """
+            if numpy is None:
+                raise ImportError("get_vertex_weight_arrays requires numpy")
+            links = []
+            if self.has_vertex_weights:
+                for i, vertex_weight in enumerate(self.vertex_weights):
+                    for bone_link in vertex_weight.bone_links:
+                        links.append((i, bone_link.bone, bone_link.blending))
+            vertex_ids = numpy.array([link[0] for link in links],
+                                     dtype=numpy.int32)
+            bone_ids = numpy.array([link[1] for link in links],
+                                   dtype=numpy.int32)
+            weights = numpy.array([link[2] for link in links],
+                                  dtype=numpy.float32)
+            return vertex_ids, bone_ids, weights
+
+        def get_welded_geometry(self):
+            """Merge the separate vertex and uv index spaces into a single
+            indexed vertex buffer. Triangle corners which share position,
+            normal, uv, color, and vertex weights are welded into one vertex.
+            Welded vertices are numbered in order of first use.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> import numpy
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> chunk.set_geometry_arrays(
+            ...     vertices = [(0,0,0),(0,1,0),(1,0,0),(0,1,0)],
+            ...     normals = [(0,0,1)] * 4,
+            ...     triangles = [(0,1,2),(2,3,0)])
+            >>> vertices, normals, uvs, colors, triangles, vertex_map = chunk.get_welded_geometry()
+            >>> len(vertices), triangles.tolist(), vertex_map.tolist()
+            (3, [[0, 1, 2], [2, 1, 0]], [0, 1, 2])
+
+            :return: A tuple ``(vertices, normals, uvs, colors, triangles,
+                vertex_map)`` of numpy arrays, where ``triangles`` indexes
+                the welded vertices, and ``vertex_map`` gives the original
+                vertex index of each welded vertex (for looking up vertex
+                weights and morph targets). The uv and color entries are
+                ``None`` if the mesh has no uvs or no colors.
+            """
+            (vertices, normals, triangles,
+             uvs, uv_triangles, colors) = self.get_geometry_arrays()
+            corner_vertices = triangles.ravel()
+            columns = [
+                # adding zero turns -0.0 into 0.0, so both weld together
+                vertices[corner_vertices] + numpy.float32(0),
+                normals[corner_vertices] + numpy.float32(0)]
+            if uvs is not None:
+                columns.append(uvs[uv_triangles.ravel()] + numpy.float32(0))
+            if colors is not None:
+                columns.append(colors[corner_vertices])
+            if self.has_vertex_weights:
+                # one hash per vertex over its (sorted) bone links
+                weight_hashes = numpy.fromiter(
+                    (hash(tuple(sorted((bone_link.bone, bone_link.blending)
+                                       for bone_link in vertex_weight.bone_links)))
+                     for vertex_weight in self.vertex_weights),
+                    dtype=numpy.int64, count=self.num_vertices)
+                columns.append(weight_hashes[corner_vertices])
+
+            # compare corners by the raw bytes of their attributes
+            rows = numpy.hstack([
+                numpy.ascontiguousarray(column).reshape(
+                    len(corner_vertices), -1 if len(corner_vertices) else 1
+                ).view(numpy.uint8)
+                for column in columns])
+            rows = numpy.ascontiguousarray(rows).view(
+                numpy.dtype((numpy.void, rows.shape[1]))).ravel()
+            _, first_corners, corner_keys = numpy.unique(
+                rows, return_index=True, return_inverse=True)
+
+            # number welded vertices in order of first use
+            order = numpy.argsort(first_corners)
+            new_index = numpy.empty(len(order), dtype=numpy.int32)
+            new_index[order] = numpy.arange(len(order), dtype=numpy.int32)
+            first_corners = first_corners[order]
+            welded_triangles = new_index[corner_keys.ravel()].reshape(-1, 3)
+
+            vertex_map = corner_vertices[first_corners]
+            welded_uvs = (uvs[uv_triangles.ravel()[first_corners]]
+                          if uvs is not None else None)
+            welded_colors = (colors[vertex_map]
+                             if colors is not None else None)
+            return (vertices[vertex_map], normals[vertex_map],
+                    welded_uvs, welded_colors, welded_triangles, vertex_map)
+
+        def get_bvh(self, leaf_size=4):
+            """Build a bounding volume hierarchy over the triangles of this
+            mesh, for ray, nearest point, and box overlap queries. See
+            :class:`pyffi.utils.bvh.BVH`.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> chunk.set_geometry(verticeslist = [[(0,0,0),(0,1,0),(1,0,0)]],
+            ...                    normalslist = [[(0,0,1)] * 3],
+            ...                    triangleslist = [[(0,1,2)]])
+            >>> chunk.get_bvh().ray_intersect((0.2,0.2,-1), (0,0,1))
+            (0, 1.0)
+            """
+            vertices, normals, triangles, uvs, uv_triangles, colors \
+                = self.get_geometry_arrays()
+            return pyffi.utils.bvh.BVH(vertices, triangles, leaf_size=leaf_size)
+
+        def get_face_attributes(self):
+            """Get material indices and smoothing groups of all triangles as
+            arrays, along with the triangle range covered by each material.
+            For Crysis meshes, the ranges are the mesh subsets; for Far Cry
+            meshes, they are the runs of consecutive faces sharing the same
+            material.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> chunk.set_geometry(verticeslist = [[(0,0,0),(0,1,0),(1,0,0)],
+            ...                                    [(0,0,1),(0,1,1),(1,0,1)]],
+            ...                    normalslist = [[(0,0,1)] * 3, [(0,0,1)] * 3],
+            ...                    triangleslist = [[(0,1,2)], [(0,1,2),(2,1,0)]],
+            ...                    matlist = [4, 7])
+            >>> material_ids, smoothing_groups, subset_ranges = chunk.get_face_attributes()
+            >>> material_ids.tolist()
+            [4, 7, 7]
+            >>> smoothing_groups.tolist()
+            [1, 1, 1]
+            >>> subset_ranges
+            [(4, 0, 1), (7, 1, 2)]
+
+            :return: A tuple ``(material_ids, smoothing_groups,
+                subset_ranges)``, where the first two are integer arrays with
+                one entry per triangle, and ``subset_ranges`` is a list of
+                ``(mat_id, first_triangle, num_triangles)`` tuples.
+            """
+            if numpy is None:
+                raise ImportError("get_face_attributes requires numpy")
+            if self.faces:
+                material_ids = numpy.fromiter(
+                    (face.material for face in self.faces),
+                    dtype=numpy.int32, count=self.num_faces)
+                smoothing_groups = numpy.fromiter(
+                    (face.sm_group for face in self.faces),
+                    dtype=numpy.int32, count=self.num_faces)
+                # runs of consecutive faces with the same material
+                firsts = numpy.flatnonzero(
+                    numpy.diff(material_ids, prepend=material_ids[:1] - 1))
+                nums = numpy.diff(firsts, append=len(material_ids))
+                subset_ranges = list(zip(material_ids[firsts].tolist(),
+                                         firsts.tolist(), nums.tolist()))
+            elif self.mesh_subsets:
+                numtriangles = self.get_num_triangles()
+                material_ids = numpy.zeros(numtriangles, dtype=numpy.int32)
+                # mesh subsets carry no smoothing groups
+                smoothing_groups = numpy.ones(numtriangles, dtype=numpy.int32)
+                subset_ranges = []
+                for meshsubset in self.mesh_subsets.mesh_subsets:
+                    first = meshsubset.first_index // 3
+                    num = meshsubset.num_indices // 3
+                    material_ids[first:first + num] = meshsubset.mat_id
+                    subset_ranges.append((meshsubset.mat_id, first, num))
+            else:
+                material_ids = numpy.zeros(0, dtype=numpy.int32)
+                smoothing_groups = numpy.zeros(0, dtype=numpy.int32)
+                subset_ranges = []
+            return material_ids, smoothing_groups, subset_ranges
+
         def get_uvs(self):
             """Generator for all uv coordinates."""
             if self.uvs:
@@ -2632,26 +2864,240 @@ chunk size mismatch when reading %s at 0x%08X
             self.max_bound.y = maxbound[1]
             self.max_bound.z = maxbound[2]
 
-        def update_tangent_space(self):
-            """Recalculate tangent space data."""
+        def set_geometry_arrays(self,
+                                vertices, normals, triangles,
+                                materials = None, uvs = None, colors = None):
+            """Set geometry data from numpy arrays. This is the array based
+            variant of :meth:`set_geometry`: instead of one list per
+            material, it takes a single indexed mesh along with a material
+            index per triangle. Triangles are (stably) sorted by material,
+            so every material ends up as one contiguous mesh subset. The
+            data streams are filled in bulk from the arrays, which on large
+            meshes makes this several times faster than :meth:`set_geometry`.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> import numpy
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> vertices = numpy.array([(0,0,0),(0,1,0),(1,0,0),(1,1,0)])
+            >>> normals = numpy.array([(0,0,1),(0,0,1),(0,0,1),(0,0,1)])
+            >>> triangles = numpy.array([(0,1,2),(2,1,3)])
+            >>> uvs = numpy.array([(0,0),(0,1),(1,0),(1,1)])
+            >>> chunk.set_geometry_arrays(vertices, normals, triangles,
+            ...                           materials = numpy.array([5, 2]),
+            ...                           uvs = uvs)
+            >>> list(chunk.get_triangles())
+            [(2, 1, 3), (0, 1, 2)]
+            >>> list(chunk.get_material_indices())
+            [2, 5]
+            >>> [(subset.first_index, subset.num_indices, subset.mat_id)
+            ...  for subset in chunk.mesh_subsets.mesh_subsets]
+            [(0, 3, 2), (3, 3, 5)]
+            >>> print(chunk.max_bound)
+            [  1.000  1.000  0.000 ]
+
+            :param vertices: Array of vertices, shape ``(n, 3)``.
+            :param normals: Array of normals, shape ``(n, 3)``.
+            :param triangles: Array of vertex indices, shape ``(m, 3)``.
+            :param materials: Array of material indices, shape ``(m,)``.
+                Optional.
+            :param uvs: Array of uvs, shape ``(n, 2)``. Optional.
+            :param colors: Array of RGBA colors, shape ``(n, 4)``, with each
+                component an integer between 0 and 255. Optional.
+            """
+            if numpy is None:
+                raise ImportError("set_geometry_arrays requires numpy")
+
+            # argument sanity checking
+            vertices = numpy.asarray(vertices, dtype=numpy.float32).reshape(-1, 3)
+            normals = numpy.asarray(normals, dtype=numpy.float32).reshape(-1, 3)
+            triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+            numvertices = len(vertices)
+            numtriangles = len(triangles)
+            if len(normals) != numvertices:
+                raise ValueError("vertex and normal arrays must have same length")
+            if materials is None:
+                materials = numpy.zeros(numtriangles, dtype=numpy.int64)
+            else:
+                materials = numpy.asarray(materials, dtype=numpy.int64).ravel()
+                if len(materials) != numtriangles:
+                    raise ValueError("materials must have one entry per triangle")
+            if uvs is not None:
+                uvs = numpy.asarray(uvs, dtype=numpy.float32).reshape(-1, 2)
+                if len(uvs) != numvertices:
+                    raise ValueError("vertex and uv arrays must have same length")
+            if colors is not None:
+                colors = numpy.asarray(colors, dtype=numpy.uint8).reshape(-1, 4)
+                if len(colors) != numvertices:
+                    raise ValueError("vertex and color arrays must have same length")
+            if numvertices > 65535:
+                raise ValueError("cannot store geometry: too many vertices (%i and maximum is 65535)" % numvertices)
+            if numtriangles and (triangles.min() < 0 or triangles.max() >= numvertices):
+                raise ValueError("triangle vertex index out of range")
+
+            # group triangles by material
+            order = numpy.argsort(materials, kind='stable')
+            triangles = triangles[order]
+            materials = materials[order]
+            mat_ids, first_triangles, num_triangles = numpy.unique(
+                materials, return_index=True, return_counts=True)
+            indices = triangles.ravel()
+
+            # the stream arrays are filled in bulk (see Array.set_rows),
+            # from arrays of values of the right type and range
+
+            # Far Cry data
+            self.num_vertices = numvertices
+            self.vertices.set_rows(numpy.hstack((vertices, normals)))
+            self.num_faces = numtriangles
+            self.faces.set_rows(numpy.column_stack(
+                (triangles, materials,
+                 numpy.ones(numtriangles, dtype=numpy.int64))))
+            if uvs is not None:
+                self.num_uvs = numvertices
+                self.uvs.set_rows(uvs)
+                self.uv_faces.set_rows(triangles)
+            if colors is not None:
+                self.has_vertex_colors = True
+                # note: Far Cry does not support alpha color channel
+                self.vertex_colors.set_rows(colors[:, :3])
+
+            # Crysis data
+            self.num_indices = numtriangles * 3
+
+            self.vertices_data = CgfFormat.DataStreamChunk()
+            self.vertices_data.data_stream_type = CgfFormat.DataStreamType.VERTICES
+            self.vertices_data.bytes_per_element = 12
+            self.vertices_data.num_elements = numvertices
+            self.vertices_data.vertices.set_rows(vertices)
+
+            self.normals_data = CgfFormat.DataStreamChunk()
+            self.normals_data.data_stream_type = CgfFormat.DataStreamType.NORMALS
+            self.normals_data.bytes_per_element = 12
+            self.normals_data.num_elements = numvertices
+            self.normals_data.normals.set_rows(normals)
+
+            self.indices_data = CgfFormat.DataStreamChunk()
+            self.indices_data.data_stream_type = CgfFormat.DataStreamType.INDICES
+            self.indices_data.bytes_per_element = 2
+            self.indices_data.num_elements = numtriangles * 3
+            self.indices_data.indices.set_rows(indices)
+
+            if uvs is not None:
+                # OpenGL fix
+                uvs = uvs * numpy.float32((1, -1)) + numpy.float32((0, 1))
+                self.uvs_data = CgfFormat.DataStreamChunk()
+                self.uvs_data.data_stream_type = CgfFormat.DataStreamType.UVS
+                self.uvs_data.bytes_per_element = 8
+                self.uvs_data.num_elements = numvertices
+                self.uvs_data.uvs.set_rows(uvs)
+
+            if colors is not None:
+                self.colors_data = CgfFormat.DataStreamChunk()
+                self.colors_data.data_stream_type = CgfFormat.DataStreamType.COLORS
+                self.colors_data.bytes_per_element = 4
+                self.colors_data.num_elements = numvertices
+                self.colors_data.rgba_colors.set_rows(colors)
+
+            # Crysis mesh subsets, one per material
+            self.num_mesh_subsets = len(mat_ids)
+            self.mesh_subsets = CgfFormat.MeshSubsetsChunk()
+            self.mesh_subsets.num_mesh_subsets = self.num_mesh_subsets
+            self.mesh_subsets.mesh_subsets.update_size()
+            for meshsubset, mat, first, num in zip(
+                self.mesh_subsets.mesh_subsets, mat_ids.tolist(),
+                first_triangles.tolist(), num_triangles.tolist()):
+                subset_indices = indices[3 * first:3 * (first + num)]
+                subset_vertices = vertices[numpy.unique(subset_indices)]
+                vertmin = subset_vertices.min(axis=0)
+                vertmax = subset_vertices.max(axis=0)
+                center = (vertmin + vertmax) * 0.5
+                radius = numpy.sqrt(
+                    ((subset_vertices - center) ** 2).sum(axis=1).max())
+                meshsubset.first_index = 3 * first
+                meshsubset.num_indices = 3 * num
+                meshsubset.first_vertex = int(subset_indices.min())
+                meshsubset.num_vertices = int(subset_indices.max()) + 1 - meshsubset.first_vertex
+                meshsubset.mat_id = mat
+                meshsubset.radius = float(radius)
+                meshsubset.center.x, meshsubset.center.y, meshsubset.center.z \
+                    = center.tolist()
+
+            # update tangent space, from the arrays at hand
+            if uvs is not None:
+                self.update_tangent_space(vertices = vertices, normals = normals,
+                                          uvs = uvs, triangles = triangles)
+
+            # set global bounding box
+            if numvertices:
+                minbound = vertices.min(axis=0).tolist()
+                maxbound = vertices.max(axis=0).tolist()
+            else:
+                minbound = maxbound = (0, 0, 0)
+            self.min_bound.x, self.min_bound.y, self.min_bound.z = minbound
+            self.max_bound.x, self.max_bound.y, self.max_bound.z = maxbound
+
+        def update_tangent_space(self, vertices = None, normals = None,
+                                 uvs = None, triangles = None):
+            """Recalculate tangent space data. With numpy, the geometry can be
+            passed in as arrays, as stored in the Crysis data streams (so
+            with flipped v coordinates); the data streams are read for
+            whatever is not given.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> chunk = CgfFormat.MeshChunk()
+            >>> chunk.set_geometry_arrays(
+            ...     vertices = [(0,0,0),(0,1,0),(1,0,0)],
+            ...     normals = [(0,0,1)] * 3,
+            ...     triangles = [(0,1,2)],
+            ...     uvs = [(0,0),(0,1),(1,0)])
+            >>> [(t.x, t.y, t.z, t.w) for t in chunk.tangents_data.tangents[0]]
+            [(32767, 0, 0, 32767), (0, -32767, 0, 32767)]
+            >>> chunk.update_tangent_space()
+            >>> [(t.x, t.y, t.z, t.w) for t in chunk.tangents_data.tangents[0]]
+            [(32767, 0, 0, 32767), (0, -32767, 0, 32767)]
+            """
             # set up tangent space
             self.tangents_data = CgfFormat.DataStreamChunk()
             self.tangents_data.data_stream_type = CgfFormat.DataStreamType.TANGENTS
             self.tangents_data.bytes_per_element = 16
             self.tangents_data.num_elements = self.num_vertices
-            self.tangents_data.tangents.update_size()
-            selftangents_data_iter = iter(self.tangents_data.tangents)
 
             # set Crysis tangents info
+            if numpy is not None:
+                if vertices is None:
+                    vertices = numpy.array(
+                        list((vert.x, vert.y, vert.z)
+                             for vert in self.vertices_data.vertices),
+                        dtype=numpy.float32).reshape(-1, 3)
+                if normals is None:
+                    normals = numpy.array(
+                        list((norm.x, norm.y, norm.z)
+                             for norm in self.normals_data.normals),
+                        dtype=numpy.float32).reshape(-1, 3)
+                if uvs is None:
+                    uvs = numpy.array(
+                        list((uv.u, uv.v) for uv in self.uvs_data.uvs),
+                        dtype=numpy.float32).reshape(-1, 2)
+                if triangles is None:
+                    triangles = self.get_geometry_arrays()[2]
+                packed = pyffi.utils.tangentspace.getPackedTangentSpace(
+                    vertices = vertices, normals = normals, uvs = uvs,
+                    triangles = triangles)
+                self.tangents_data.tangents.set_rows(packed)
+                return
+
+            self.tangents_data.tangents.update_size()
+            vertices = list((vert.x, vert.y, vert.z)
+                            for vert in self.vertices_data.vertices)
+            normals = list((norm.x, norm.y, norm.z)
+                           for norm in self.normals_data.normals)
+            uvs = list((uv.u, uv.v)
+                       for uv in self.uvs_data.uvs)
+            triangles = list(self.get_triangles())
+
             tangents, binormals, orientations = pyffi.utils.tangentspace.getTangentSpace(
-                vertices = list((vert.x, vert.y, vert.z)
-                                for vert in self.vertices_data.vertices),
-                normals = list((norm.x, norm.y, norm.z)
-                                for norm in self.normals_data.normals),
-                uvs = list((uv.u, uv.v)
-                           for uv in self.uvs_data.uvs),
-                triangles = list(self.get_triangles()),
-                orientation = True)
+                vertices = vertices, normals = normals, uvs = uvs,
+                triangles = triangles, orientation = True)
 
             for crytangent, tan, bin, orient in zip(self.tangents_data.tangents,
                                                      tangents, binormals, orientations):
@@ -2678,6 +3124,37 @@ chunk size mismatch when reading %s at 0x%08X
                 morphvert.vertex_target.y *= scale
                 morphvert.vertex_target.z *= scale
 
+        def get_morph_arrays(self):
+            """Get the morph vertices as numpy arrays.
+
+            >>> from pyffi.formats.cgf import CgfFormat
+            >>> chunk = CgfFormat.MeshMorphTargetChunk()
+            >>> chunk.num_morph_vertices = 2
+            >>> chunk.morph_vertices.update_size()
+            >>> chunk.morph_vertices[0].vertex_index = 3
+            >>> chunk.morph_vertices[1].vertex_index = 1
+            >>> chunk.morph_vertices[1].vertex_target.y = 2.0
+            >>> vertex_ids, targets = chunk.get_morph_arrays()
+            >>> vertex_ids.tolist(), targets.tolist()
+            ([3, 1], [[0.0, 0.0, 0.0], [0.0, 2.0, 0.0]])
+
+            :return: A tuple ``(vertex_ids, targets)``, where ``targets``
+                holds the morphed (not relative) vertex coordinates, shape
+                ``(n, 3)``.
+            """
+            if numpy is None:
+                raise ImportError("get_morph_arrays requires numpy")
+            vertex_ids = numpy.array(
+                [morphvert.vertex_index for morphvert in self.morph_vertices],
+                dtype=numpy.int32)
+            targets = numpy.array(
+                [(morphvert.vertex_target.x,
+                  morphvert.vertex_target.y,
+                  morphvert.vertex_target.z)
+                 for morphvert in self.morph_vertices],
+                dtype=numpy.float32).reshape(-1, 3)
+            return vertex_ids, targets
+
         def get_global_node_parent(self):
             """Get the block parent (used for instance in the QSkope global view)."""
             return self.mesh
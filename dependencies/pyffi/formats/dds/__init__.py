@@ -108,6 +108,11 @@ import struct
 import os
 import re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import pyffi.object_models.xml
 import pyffi.object_models.common
 from pyffi.object_models.xml.basic import BasicBase
@@ -183,6 +188,148 @@ class DdsFormat(pyffi.object_models.xml.FileFormat):
             """
             return 4
 
+    @staticmethod
+    def decode_rgb565(colors):
+        """Convert an array of 16 bit 5:6:5 colors to an array of 8 bit
+        RGB colors, replicating the high bits into the low bits.
+
+        >>> from pyffi.formats.dds import DdsFormat
+        >>> import numpy
+        >>> DdsFormat.decode_rgb565(numpy.array([0xffff, 0xf800, 0x07e0, 0x001f, 0x0000])).tolist()
+        [[255, 255, 255], [255, 0, 0], [0, 255, 0], [0, 0, 255], [0, 0, 0]]
+        """
+        if numpy is None:
+            raise ImportError("decode_rgb565 requires numpy")
+        colors = numpy.asarray(colors, dtype=numpy.uint32)
+        r = (colors >> 11) & 0x1f
+        g = (colors >> 5) & 0x3f
+        b = colors & 0x1f
+        return numpy.stack(((r << 3) | (r >> 2),
+                            (g << 2) | (g >> 4),
+                            (b << 3) | (b >> 2)), axis=-1).astype(numpy.uint8)
+
+    @staticmethod
+    def decode_color_blocks(blocks, dxt1 = True):
+        """Decode an array of BC1 color blocks, shape ``(n, 8)``, into
+        an array of RGBA texels, shape ``(n, 16, 4)``, in row major order
+        within each block. For DXT1, blocks whose first color does not
+        exceed the second use three colors and transparent black; for
+        DXT3 and DXT5, blocks always use four colors.
+
+        >>> from pyffi.formats.dds import DdsFormat
+        >>> import numpy
+        >>> # red and blue, each row of texels using palette entries 0 to 3
+        >>> block = numpy.array([[0x00, 0xf8, 0x1f, 0x00, 0xe4, 0xe4, 0xe4, 0xe4]])
+        >>> DdsFormat.decode_color_blocks(block)[0, :4].tolist()
+        [[255, 0, 0, 255], [0, 0, 255, 255], [170, 0, 85, 255], [85, 0, 170, 255]]
+        >>> # swapped: three colors and transparent black
+        >>> block = numpy.array([[0x1f, 0x00, 0x00, 0xf8, 0xe4, 0xe4, 0xe4, 0xe4]])
+        >>> DdsFormat.decode_color_blocks(block)[0, :4].tolist()
+        [[0, 0, 255, 255], [255, 0, 0, 255], [127, 0, 127, 255], [0, 0, 0, 0]]
+        """
+        if numpy is None:
+            raise ImportError("decode_color_blocks requires numpy")
+        blocks = numpy.asarray(blocks, dtype=numpy.uint8).reshape(-1, 8)
+        words = blocks.view('<u2').astype(numpy.uint32)
+        color0 = words[:, 0]
+        color1 = words[:, 1]
+        indices = blocks[:, 4:8].copy().view('<u4').astype(numpy.uint32).reshape(-1)
+
+        palette = numpy.empty((len(blocks), 4, 4), dtype=numpy.uint32)
+        palette[:, :, 3] = 255
+        rgb0 = DdsFormat.decode_rgb565(color0).astype(numpy.uint32)
+        rgb1 = DdsFormat.decode_rgb565(color1).astype(numpy.uint32)
+        palette[:, 0, :3] = rgb0
+        palette[:, 1, :3] = rgb1
+        four = (color0 > color1) if dxt1 else numpy.ones(len(blocks), dtype=bool)
+        four_ = four[:, None]
+        palette[:, 2, :3] = numpy.where(four_, (2 * rgb0 + rgb1) // 3, (rgb0 + rgb1) // 2)
+        palette[:, 3, :3] = numpy.where(four_, (rgb0 + 2 * rgb1) // 3, 0)
+        palette[~four, 3, 3] = 0
+
+        shifts = 2 * numpy.arange(16, dtype=numpy.uint32)
+        texel_indices = (indices[:, None] >> shifts) & 3
+        return palette[numpy.arange(len(blocks))[:, None],
+                       texel_indices].astype(numpy.uint8)
+
+    @staticmethod
+    def decode_explicit_alpha_blocks(blocks):
+        """Decode an array of BC2 (DXT3) alpha blocks, shape ``(n, 8)``,
+        into an array of alpha values, shape ``(n, 16)``.
+
+        >>> from pyffi.formats.dds import DdsFormat
+        >>> import numpy
+        >>> block = numpy.array([[0x10, 0x32, 0x54, 0x76, 0x98, 0xba, 0xdc, 0xfe]])
+        >>> DdsFormat.decode_explicit_alpha_blocks(block)[0].tolist()
+        [0, 17, 34, 51, 68, 85, 102, 119, 136, 153, 170, 187, 204, 221, 238, 255]
+        """
+        if numpy is None:
+            raise ImportError("decode_explicit_alpha_blocks requires numpy")
+        blocks = numpy.asarray(blocks, dtype=numpy.uint8).reshape(-1, 8)
+        nibbles = numpy.stack((blocks & 0x0f, blocks >> 4), axis=-1)
+        return (nibbles.reshape(-1, 16) * 17).astype(numpy.uint8)
+
+    @staticmethod
+    def decode_interpolated_alpha_blocks(blocks):
+        """Decode an array of BC3 (DXT5) alpha blocks, shape ``(n, 8)``,
+        into an array of alpha values, shape ``(n, 16)``.
+
+        >>> from pyffi.formats.dds import DdsFormat
+        >>> import numpy
+        >>> # eight alpha levels: texels 0 to 7 use indices 0 to 7
+        >>> block = numpy.array([[255, 0, 0x88, 0xc6, 0xfa, 0, 0, 0]])
+        >>> DdsFormat.decode_interpolated_alpha_blocks(block)[0, :8].tolist()
+        [255, 0, 218, 182, 145, 109, 72, 36]
+        >>> # six alpha levels, plus 0 and 255
+        >>> block = numpy.array([[0, 255, 0x88, 0xc6, 0xfa, 0, 0, 0]])
+        >>> DdsFormat.decode_interpolated_alpha_blocks(block)[0, :8].tolist()
+        [0, 255, 51, 102, 153, 204, 0, 255]
+        """
+        if numpy is None:
+            raise ImportError("decode_interpolated_alpha_blocks requires numpy")
+        blocks = numpy.asarray(blocks, dtype=numpy.uint8).reshape(-1, 8)
+        alpha0 = blocks[:, 0].astype(numpy.uint32)
+        alpha1 = blocks[:, 1].astype(numpy.uint32)
+        bits = numpy.zeros(len(blocks), dtype=numpy.uint64)
+        for i in range(6):
+            bits |= blocks[:, 2 + i].astype(numpy.uint64) << numpy.uint64(8 * i)
+
+        eight = (alpha0 > alpha1)[:, None]
+        steps = numpy.arange(1, 7, dtype=numpy.uint32)
+        palette = numpy.empty((len(blocks), 8), dtype=numpy.uint32)
+        palette[:, 0] = alpha0
+        palette[:, 1] = alpha1
+        palette[:, 2:8] = numpy.where(
+            eight,
+            ((7 - steps) * alpha0[:, None] + steps * alpha1[:, None]) // 7,
+            numpy.concatenate((
+                ((5 - steps[:4]) * alpha0[:, None] + steps[:4] * alpha1[:, None]) // 5,
+                numpy.tile(numpy.array([0, 255], dtype=numpy.uint32), (len(blocks), 1))),
+                axis=1))
+
+        shifts = 3 * numpy.arange(16, dtype=numpy.uint64)
+        texel_indices = ((bits[:, None] >> shifts) & numpy.uint64(7)).astype(numpy.intp)
+        return palette[numpy.arange(len(blocks))[:, None],
+                       texel_indices].astype(numpy.uint8)
+
+    @staticmethod
+    def decode_blocks(four_c_c, blocks):
+        """Decode an array of compressed blocks, of 8 bytes for DXT1 or
+        16 bytes for DXT2 to DXT5, into an array of RGBA texels, shape
+        ``(n, 16, 4)``. Premultiplied alpha (DXT2, DXT4) is not undone.
+        """
+        if four_c_c == DdsFormat.FourCC.DXT1:
+            return DdsFormat.decode_color_blocks(blocks.reshape(-1, 8))
+        blocks = blocks.reshape(-1, 16)
+        texels = DdsFormat.decode_color_blocks(blocks[:, 8:], dxt1 = False)
+        if four_c_c in (DdsFormat.FourCC.DXT2, DdsFormat.FourCC.DXT3):
+            texels[:, :, 3] = DdsFormat.decode_explicit_alpha_blocks(blocks[:, :8])
+        elif four_c_c in (DdsFormat.FourCC.DXT4, DdsFormat.FourCC.DXT5):
+            texels[:, :, 3] = DdsFormat.decode_interpolated_alpha_blocks(blocks[:, :8])
+        else:
+            raise ValueError("unsupported compression 0x%08X" % four_c_c)
+        return texels
+
     @staticmethod
     def version_number(version_str):
         """Converts version string into an integer.
@@ -278,6 +425,154 @@ class DdsFormat(pyffi.object_models.xml.FileFormat):
             # next the pixel data
             self.pixeldata.write(stream, data=self)
 
+        def get_block_size(self):
+            """Return the number of bytes of a compressed 4x4 block, or
+            ``None`` for uncompressed data.
+            """
+            pixel_format = self.header.pixel_format
+            if not pixel_format.flags.four_c_c:
+                return None
+            if pixel_format.four_c_c == DdsFormat.FourCC.DXT1:
+                return 8
+            if pixel_format.four_c_c in (
+                DdsFormat.FourCC.DXT2, DdsFormat.FourCC.DXT3,
+                DdsFormat.FourCC.DXT4, DdsFormat.FourCC.DXT5):
+                return 16
+            raise ValueError(
+                "unsupported compression 0x%08X" % pixel_format.four_c_c)
+
+        def get_mipmap_sizes(self):
+            """Return the width, height, and number of bytes of every mipmap
+            of the (first) image, largest first.
+            """
+            width = self.header.width
+            height = self.header.height
+            num_mipmaps = 1
+            if self.header.flags.mipmap_count:
+                num_mipmaps = max(1, self.header.mipmap_count)
+            block_size = self.get_block_size()
+            sizes = []
+            for i in range(num_mipmaps):
+                if block_size:
+                    size = ((width + 3) // 4) * ((height + 3) // 4) * block_size
+                else:
+                    size = width * height * (self.header.pixel_format.bit_count // 8)
+                sizes.append((width, height, size))
+                if width == 1 and height == 1:
+                    break
+                width = max(1, width // 2)
+                height = max(1, height // 2)
+            return sizes
+
+        def decode_uncompressed(self, pixels, width, height):
+            """Decode uncompressed pixel data, given as an array of bytes,
+            into an array of RGBA pixels, shape ``(height, width, 4)``, using
+            the channel masks of the pixel format. Luminance is copied into
+            the red, green and blue channels.
+            """
+            pixel_format = self.header.pixel_format
+            num_bytes = pixel_format.bit_count // 8
+            if num_bytes not in (1, 2, 3, 4):
+                raise ValueError(
+                    "unsupported bit count %i" % pixel_format.bit_count)
+            pixels = pixels[:width * height * num_bytes].reshape(-1, num_bytes)
+            values = numpy.zeros(len(pixels), dtype=numpy.uint32)
+            for i in range(num_bytes):
+                values |= pixels[:, i].astype(numpy.uint32) << (8 * i)
+
+            def channel(mask, default):
+                if not mask:
+                    return numpy.full(len(values), default, dtype=numpy.uint8)
+                shift = (mask & -mask).bit_length() - 1
+                maximum = mask >> shift
+                return ((((values & mask) >> shift) * 255 + maximum // 2)
+                        // maximum).astype(numpy.uint8)
+
+            flags = pixel_format.flags
+            has_alpha = flags.alpha_pixels or flags.alpha
+            alpha = channel(pixel_format.a_mask if has_alpha else 0, 255)
+            if flags.alpha and not (flags.rgb or flags.luminance):
+                red = green = blue = numpy.zeros(len(values), dtype=numpy.uint8)
+            elif flags.luminance:
+                red = green = blue = channel(pixel_format.r_mask, 0)
+            else:
+                red = channel(pixel_format.r_mask, 0)
+                green = channel(pixel_format.g_mask, 0)
+                blue = channel(pixel_format.b_mask, 0)
+            return numpy.stack((red, green, blue, alpha), axis=-1).reshape(
+                height, width, 4)
+
+        def get_rgba_arrays(self, top_mip_only = False):
+            """Decode the pixel data of DXT1, DXT3, DXT5 (BC1 to BC3) or
+            uncompressed images into RGBA arrays, one per mipmap, of shape
+            ``(height, width, 4)`` and type ``uint8``, in top to bottom row
+            order. Every block of a mipmap is decoded at once. Only the
+            first image of cube maps and volumes is decoded.
+
+            >>> from pyffi.formats.dds import DdsFormat
+            >>> import numpy
+            >>> data = DdsFormat.Data()
+            >>> data.header.width = 8
+            >>> data.header.height = 4
+            >>> data.header.flags.mipmap_count = 1
+            >>> data.header.mipmap_count = 4
+            >>> data.header.pixel_format.flags.four_c_c = 1
+            >>> data.header.pixel_format.four_c_c = DdsFormat.FourCC.DXT1
+            >>> [size for size in data.get_mipmap_sizes()]
+            [(8, 4, 16), (4, 2, 8), (2, 1, 8), (1, 1, 8)]
+            >>> red = [0x00, 0xf8, 0x00, 0xf8, 0, 0, 0, 0]
+            >>> blue = [0x1f, 0x00, 0x1f, 0x00, 0, 0, 0, 0]
+            >>> data.pixeldata.set_value(bytes(red + blue + red * 3))
+            >>> top, = data.get_rgba_arrays(top_mip_only = True)
+            >>> top.shape, top[0, 0].tolist(), top[3, 7].tolist()
+            ((4, 8, 4), [255, 0, 0, 255], [0, 0, 255, 255])
+            >>> [mipmap.shape for mipmap in data.get_rgba_arrays()]
+            [(4, 8, 4), (2, 4, 4), (1, 2, 4), (1, 1, 4)]
+
+            >>> data = DdsFormat.Data()
+            >>> data.header.width = 2
+            >>> data.header.height = 1
+            >>> pixel_format = data.header.pixel_format
+            >>> pixel_format.flags.rgb = 1
+            >>> pixel_format.flags.alpha_pixels = 1
+            >>> pixel_format.bit_count = 32
+            >>> pixel_format.r_mask = 0x00ff0000
+            >>> pixel_format.g_mask = 0x0000ff00
+            >>> pixel_format.b_mask = 0x000000ff
+            >>> pixel_format.a_mask = 0xff000000
+            >>> data.pixeldata.set_value(bytes([1, 2, 3, 4, 5, 6, 7, 8]))
+            >>> data.get_rgba_arrays()[0].tolist()
+            [[[3, 2, 1, 4], [7, 6, 5, 8]]]
+            """
+            if numpy is None:
+                raise ImportError("get_rgba_arrays requires numpy")
+            pixels = numpy.frombuffer(self.pixeldata.get_value(),
+                                      dtype=numpy.uint8)
+            block_size = self.get_block_size()
+            four_c_c = self.header.pixel_format.four_c_c
+            images = []
+            offset = 0
+            for width, height, size in self.get_mipmap_sizes():
+                if offset + size > len(pixels):
+                    raise ValueError("pixel data too short for mipmap %ix%i"
+                                     % (width, height))
+                mipmap = pixels[offset:offset + size]
+                offset += size
+                if block_size:
+                    blocks_x = (width + 3) // 4
+                    blocks_y = (height + 3) // 4
+                    texels = DdsFormat.decode_blocks(four_c_c, mipmap)
+                    # blocks to rows of texels, then crop the padding
+                    image = texels.reshape(blocks_y, blocks_x, 4, 4, 4).transpose(
+                        0, 2, 1, 3, 4).reshape(blocks_y * 4, blocks_x * 4, 4)
+                    image = image[:height, :width]
+                else:
+                    image = self.decode_uncompressed(mipmap, width, height)
+                images.append(numpy.ascontiguousarray(image))
+                if top_mip_only:
+                    break
+            return images
+
         # DetailNode
 
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
@@ -40,6 +40,7 @@
 # --------------------------------------------------------------------------
 
 # note: some imports are defined at the end to avoid problems with circularity
+import gc
 import logging
 import weakref
 
@@ -282,6 +283,83 @@ class Array(_ListWrap):
                             argument = self._elementTypeArgument)
                         elemlist.append(elem)
 
+    def set_rows(self, rows):
+        """Replace all elements by new elements holding the given values,
+        in bulk. Each row gives the values of one element: a single value
+        for basic elements, or the values of all basic attributes for
+        struct elements, with nested structs flattened in attribute
+        order. For two dimensional arrays, each row is a sequence of such
+        rows. The number of rows must match the size field of the array.
+
+        The elements are built directly from the layout of a default
+        element, without going through the constructor and the attribute
+        setters of every element. The values are stored as given,
+        without the conversion and range checks of ``set_value``, so they
+        must already have the right type and range. A numpy array of the
+        right dtype can be passed as is.
+
+        >>> from pyffi.formats.cgf import CgfFormat
+        >>> chunk = CgfFormat.DataStreamChunk()
+        >>> chunk.data_stream_type = CgfFormat.DataStreamType.VERTICES
+        >>> chunk.num_elements = 2
+        >>> chunk.vertices.set_rows([(0.0, 1.0, 2.0), (3.0, 4.0, 5.0)])
+        >>> print(chunk.vertices[1])
+        [  3.000  4.000  5.000 ]
+        >>> chunk.data_stream_type = CgfFormat.DataStreamType.TANGENTS
+        >>> chunk.tangents.set_rows([[(1, 2, 3, 4), (5, 6, 7, 8)],
+        ...                          [(0, 0, 0, 0), (9, 9, 9, -9)]])
+        >>> chunk.tangents[1][1].w
+        -9
+        >>> chunk.num_elements = 3
+        >>> chunk.tangents.set_rows([])
+        Traceback (most recent call last):
+            ...
+        ValueError: 0 rows given for an array of size 3
+        """
+        make = _get_element_factory(self._elementType(
+            template = self._elementTypeTemplate,
+            argument = self._elementTypeArgument))
+        if make is None:
+            # not a plain layout: build every element the generic way
+            make = self._make_element
+        # creating many objects at once triggers many needless garbage
+        # collection passes, which roughly double the time taken
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            rows = rows.tolist() if hasattr(rows, 'tolist') else list(rows)
+            len1 = self._len1()
+            if len(rows) != len1:
+                raise ValueError('%i rows given for an array of size %i'
+                                 % (len(rows), len1))
+            del self[0:self.__len__()]
+            if self._count2 is None:
+                flatten = _get_flattener(rows)
+                self.extend([make(iter(flatten(row))) for row in rows])
+            else:
+                for i, row in enumerate(rows):
+                    if len(row) != self._len2(i):
+                        raise ValueError(
+                            '%i values given for row %i of size %i'
+                            % (len(row), i, self._len2(i)))
+                    elemlist = _ListWrap(self._elementType, parent = self)
+                    flatten = _get_flattener(row)
+                    elemlist.extend(
+                        [make(iter(flatten(item))) for item in row])
+                    self.append(elemlist)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _make_element(self, values):
+        """Create an element the generic way, setting its basic
+        attributes from the values iterator (see set_rows)."""
+        elem = self._elementType(
+            template = self._elementTypeTemplate,
+            argument = self._elementTypeArgument)
+        _set_basic_values(elem, values)
+        return elem
+
     def read(self, stream, data):
         """Read array from stream."""
         # parse arguments
@@ -406,5 +484,78 @@ describing number of elements (%i)"%(elemlist.__len__(),len2i))
                 for elem in list.__iter__(elemlist):
                     yield elem
 
+def _flatten(row):
+    """Return the row as a flat tuple of values (see Array.set_rows)."""
+    if not isinstance(row, (tuple, list)):
+        return (row,)
+    if all(not isinstance(value, (tuple, list)) for value in row):
+        return row
+    return tuple(value for item in row for value in _flatten(item))
+
+def _get_flattener(rows):
+    """Return a function that flattens each of the rows, judging from
+    the first row, as all rows of an array have the same shape."""
+    if (rows and isinstance(rows[0], (tuple, list))
+        and _flatten(rows[0]) is rows[0]):
+        # rows are already flat
+        return lambda row: row
+    return _flatten
+
+def _set_basic_values(elem, values):
+    """Set the basic attributes of elem, depth first, from the values
+    iterator."""
+    if isinstance(elem, BasicBase):
+        elem.set_value(next(values))
+    else:
+        for item in elem._items:
+            _set_basic_values(item, values)
+
+def _get_element_factory(elem):
+    """Return a function that creates an element with the same layout as
+    elem, taking the values of its basic attributes from an iterator, or
+    ``None`` if elem holds anything but basic attributes and structs of
+    them (such as arrays, or other state) which the function would not
+    reproduce."""
+    cls = elem.__class__
+    if isinstance(elem, BasicBase):
+        try:
+            if set(vars(elem)) != {'_value'}:
+                return None
+        except TypeError:
+            return None
+        new = cls.__new__
+        def make(values):
+            basic = new(cls)
+            basic._value = next(values)
+            return basic
+        return make
+    if not isinstance(elem, StructBase) or cls.__init__ is not StructBase.__init__:
+        return None
+    # as in StructBase.__init__
+    names = []
+    for attr in cls._attribute_list:
+        name = "_%s_value_" % attr.name
+        if name not in names:
+            names.append(name)
+    items = elem._items
+    if (len(names) != len(items)
+        or any(getattr(elem, name) is not item
+               for name, item in zip(names, items))):
+        return None
+    factories = [_get_element_factory(item) for item in items]
+    if None in factories:
+        return None
+    arg = elem.arg
+    new = cls.__new__
+    def make(values):
+        struct = new(cls)
+        struct_items = [factory(values) for factory in factories]
+        for name, item in zip(names, struct_items):
+            setattr(struct, name, item)
+        struct.arg = arg
+        struct._items = struct_items
+        return struct
+    return make
+
 from pyffi.object_models.xml.basic import BasicBase
 from pyffi.object_models.xml.struct_ import StructBase
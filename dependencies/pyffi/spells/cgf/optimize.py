@@ -0,0 +1,245 @@
+"""Spells for optimizing cgf files."""
+
+# --------------------------------------------------------------------------
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, NIF File Format Library and Tools.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os.path
+import tempfile
+
+from pyffi.formats.cgf import CgfFormat
+import pyffi.spells.cgf
+import pyffi.utils.decimate
+
+class SpellGenerateLods(pyffi.spells.cgf.CgfSpell):
+    """Generate levels of detail, by quadric decimation of every mesh.
+    Level ``i`` is written to ``<cgfname>_lod<i>.cgf`` next to the toast
+    file (or to a temporary file if ``--dryrun`` is specified); the
+    original file is left untouched.
+
+    The ``--arg`` option is a comma separated list of triangle ratios,
+    one per level (e.g. ``-a 0.5,0.25``). Material borders and uv seams
+    are preserved, and the surviving vertices keep their uvs, normals,
+    colors, and vertex weights or bone maps. Morph targets are not
+    carried over. Meshes whose bone map does not have one entry per
+    vertex are left as they are.
+    """
+
+    SPELLNAME = "opt_generatelods"
+    READONLY = True
+    LOD_RATIOS = (0.5, 0.25, 0.125)
+    """Triangle ratios if no ``--arg`` is given."""
+
+    # mesh references that set_geometry_arrays replaces
+    STREAM_REFS = ("vertices_data", "normals_data", "uvs_data", "colors_data",
+                   "indices_data", "tangents_data", "mesh_subsets",
+                   "bone_map_data")
+    # per vertex streams that cannot be carried over
+    DROPPED_STREAM_REFS = ("colors_2_data", "sh_coeffs_data",
+                           "shape_deformation_data",
+                           "face_map_data", "vert_mats_data")
+
+    @classmethod
+    def toastentry(cls, toaster):
+        arg = toaster.options["arg"]
+        try:
+            toaster.lod_ratios = (
+                tuple(float(ratio) for ratio in arg.split(","))
+                if arg else cls.LOD_RATIOS)
+        except ValueError:
+            toaster.logger.warn(
+                "must specify comma separated ratios as argument "
+                "(e.g. -a 0.5,0.25) to apply spell")
+            return False
+        if not all(0 < ratio < 1 for ratio in toaster.lod_ratios):
+            toaster.logger.warn("lod ratios must be between 0 and 1")
+            return False
+        return True
+
+    @classmethod
+    def get_toast_stream(cls, toaster, filename, test_exists=False):
+        """We do not toast the original file, so stream construction
+        is delegated to :meth:`get_toast_lod_stream`.
+        """
+        if test_exists:
+            return False
+        else:
+            return None
+
+    def datainspect(self):
+        return self.inspectblocktype(CgfFormat.MeshChunk)
+
+    def get_toast_lod_stream(self, level):
+        if self.toaster.options["dryrun"]:
+            self.toaster.msg("saving as temporary file")
+            return tempfile.TemporaryFile()
+        head, root, ext = self.toaster.get_toast_head_root_ext(
+            self.stream.name)
+        if head and not os.path.exists(head):
+            self.toaster.logger.info("creating destination path %s" % head)
+            os.makedirs(head)
+        filename = os.path.join(head, "%s_lod%i%s" % (root, level, ext))
+        self.toaster.msg("saving as %s" % filename)
+        return open(filename, "wb")
+
+    def dataentry(self):
+        meshes = [chunk for chunk in self.data.chunks
+                  if isinstance(chunk, CgfFormat.MeshChunk)
+                  and (chunk.num_vertices or chunk.vertices_data)]
+        for mesh in list(meshes):
+            if not self.has_valid_bone_map(mesh):
+                self.toaster.logger.warn(
+                    "bone map does not match the vertices, "
+                    "mesh is left as it is")
+                meshes.remove(mesh)
+        if not meshes:
+            return False
+        # morph targets refer to vertex indices of the full mesh
+        self.data.chunks = [
+            chunk for chunk in self.data.chunks
+            if not (isinstance(chunk, CgfFormat.MeshMorphTargetChunk)
+                    and any(chunk.mesh is mesh for mesh in meshes))]
+        self.toaster.msg("welding %i meshes" % len(meshes))
+        sources = [self.get_source_geometry(mesh) for mesh in meshes]
+        for level, ratio in enumerate(self.toaster.lod_ratios, 1):
+            self.toaster.msgblockbegin("lod %i (ratio %.3f)" % (level, ratio))
+            for mesh, source in zip(meshes, sources):
+                self.decimate_mesh(mesh, source, ratio)
+            stream = self.get_toast_lod_stream(level)
+            try:
+                self.data.write(stream)
+            finally:
+                stream.close()
+            self.toaster.msgblockend()
+        # spell is finished: prevent recursing into the tree
+        return False
+
+    @staticmethod
+    def has_valid_bone_map(mesh):
+        """Whether the bone map of a mesh, if any, has one entry per
+        vertex, so it can be carried over to the levels of detail."""
+        if not getattr(mesh, "bone_map_data", None):
+            return True
+        if mesh.vertices:
+            num_vertices = len(mesh.vertices)
+        elif mesh.vertices_data:
+            num_vertices = mesh.vertices_data.num_elements
+        else:
+            num_vertices = 0
+        return mesh.bone_map_data.num_elements == num_vertices
+
+    def get_source_geometry(self, mesh):
+        """Welded geometry, materials, bone links, and bone map of a
+        mesh."""
+        vertices, normals, uvs, colors, triangles, vertex_map = \
+            mesh.get_welded_geometry()
+        materials = mesh.get_face_attributes()[0]
+        bone_links = None
+        if mesh.has_vertex_weights:
+            bone_links = [
+                [(link.bone,
+                  (link.offset.x, link.offset.y, link.offset.z),
+                  link.blending)
+                 for link in vertex_weight.bone_links]
+                for vertex_weight in mesh.vertex_weights]
+        bone_map = None
+        if getattr(mesh, "bone_map_data", None):
+            bone_map = [list(row) for row in mesh.bone_map_data.bone_map]
+        return (vertices, normals, uvs, colors, triangles, materials,
+                vertex_map, bone_links, bone_map)
+
+    def decimate_mesh(self, mesh, source, ratio):
+        """Replace the geometry of *mesh* by a decimated copy of
+        *source*, as returned by :meth:`get_source_geometry`.
+        """
+        (vertices, normals, uvs, colors, triangles, materials,
+         vertex_map, bone_links, bone_map) = source
+        lod_vertex_map, lod_triangles, face_map = \
+            pyffi.utils.decimate.decimate(
+                vertices, triangles, int(len(triangles) * ratio),
+                materials=materials)
+        self.toaster.msg("%i -> %i triangles"
+                         % (len(triangles), len(lod_triangles)))
+        old_refs = dict((name, getattr(mesh, name))
+                        for name in self.STREAM_REFS + self.DROPPED_STREAM_REFS)
+        mesh.set_geometry_arrays(
+            vertices[lod_vertex_map], normals[lod_vertex_map], lod_triangles,
+            materials=materials[face_map],
+            uvs=uvs[lod_vertex_map] if uvs is not None else None,
+            colors=colors[lod_vertex_map] if colors is not None else None)
+        if bone_links is not None:
+            # vertex weights follow the original vertex of each lod vertex
+            mesh.vertex_weights.update_size()
+            for vertex_weight, index in zip(
+                mesh.vertex_weights, vertex_map[lod_vertex_map].tolist()):
+                links = bone_links[index]
+                vertex_weight.num_bone_links = len(links)
+                vertex_weight.bone_links.update_size()
+                for bone_link, (bone, offset, blending) in zip(
+                    vertex_weight.bone_links, links):
+                    bone_link.bone = bone
+                    bone_link.offset.x, bone_link.offset.y, bone_link.offset.z \
+                        = offset
+                    bone_link.blending = blending
+        if bone_map is not None:
+            # so does the bone map, a new stream as the old one is shared
+            # by all levels
+            old_bone_map = old_refs["bone_map_data"]
+            mesh.bone_map_data = CgfFormat.DataStreamChunk()
+            mesh.bone_map_data.data_stream_type = \
+                CgfFormat.DataStreamType.BONEMAP
+            mesh.bone_map_data.bytes_per_element = \
+                old_bone_map.bytes_per_element
+            mesh.bone_map_data.num_elements = len(lod_vertex_map)
+            mesh.bone_map_data.bone_map.set_rows(
+                [bone_map[index]
+                 for index in vertex_map[lod_vertex_map].tolist()])
+        if self.data.game == "Crysis":
+            # data streams are chunks of their own: swap them in the list
+            for name in self.DROPPED_STREAM_REFS:
+                setattr(mesh, name, None)
+            for name, old_ref in old_refs.items():
+                new_ref = getattr(mesh, name)
+                if new_ref is old_ref:
+                    continue
+                if old_ref in self.data.chunks:
+                    index = self.data.chunks.index(old_ref)
+                    if new_ref is None:
+                        del self.data.chunks[index]
+                    else:
+                        self.data.chunks[index] = new_ref
+                elif new_ref is not None:
+                    self.data.chunks.append(new_ref)
@@ -0,0 +1,372 @@
+"""A bounding volume hierarchy over triangle meshes.
+
+The hierarchy is built with a vectorised median split: all nodes of one
+level are split at once, along the longest axis of their centroid bounds.
+Nodes are stored breadth first in flat arrays, so a tree can be saved and
+restored as a handful of numpy arrays.
+
+>>> vertices = [(0,0,0),(1,0,0),(0,1,0),(5,0,0),(6,0,0),(5,1,0)]
+>>> triangles = [(0,1,2),(3,4,5)]
+>>> bvh = BVH(vertices, triangles, leaf_size=1)
+>>> bvh.ray_intersect((0.2,0.2,1), (0,0,-1))
+(0, 1.0)
+>>> bvh.ray_intersect((3,0.2,1), (0,0,-1)) is None
+True
+>>> triangle, point, distance = bvh.nearest_point((5.2,0.2,2))
+>>> triangle, point, distance
+(1, (5.2, 0.2, 0.0), 2.0)
+>>> bvh.overlap_aabb((0.5,0.5,-1),(5.5,5.5,1)).tolist()
+[0, 1]
+>>> bvh.overlap_aabb((2,0,-1),(4,1,1)).tolist()
+[]
+>>> copy = BVH.from_arrays(vertices, triangles, **bvh.get_arrays())
+>>> copy.ray_intersect((5.2,0.2,-1), (0,0,1))
+(1, 1.0)
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class BVH:
+    """A bounding volume hierarchy over the triangles of a mesh.
+
+    Inner nodes store the index of their first child (the second child
+    follows directly after it) and a primitive count of zero. Leaf nodes
+    store the offset of their first triangle in :attr:`primitives` and
+    their triangle count.
+    """
+
+    def __init__(self, vertices, triangles, leaf_size=4, _arrays=None):
+        """Build the hierarchy.
+
+        :param vertices: Array of vertices, shape ``(n, 3)``.
+        :param triangles: Array of vertex indices, shape ``(m, 3)``.
+        :param leaf_size: Maximal number of triangles per leaf.
+        """
+        if numpy is None:
+            raise ImportError("BVH requires numpy")
+        self.vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+        self.triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+        corners = self.vertices[self.triangles]
+        self._tri_min = corners.min(axis=1) if len(corners) else numpy.zeros((0, 3))
+        self._tri_max = corners.max(axis=1) if len(corners) else numpy.zeros((0, 3))
+        if _arrays is None:
+            _arrays = self._build(max(int(leaf_size), 1))
+        (self.node_min, self.node_max,
+         self.node_child, self.node_count, self.primitives) = _arrays
+        # plain python copies speed up traversal
+        self._min = self.node_min.tolist()
+        self._max = self.node_max.tolist()
+        self._child = self.node_child.tolist()
+        self._count = self.node_count.tolist()
+
+    @staticmethod
+    def _segment_reduce(ufunc, values, starts, ends):
+        """Reduce values over each [start, end) segment."""
+        # append a sentinel so that end == len(values) is a valid index
+        padded = numpy.concatenate((values, values[:1]))
+        indices = numpy.empty(2 * len(starts), dtype=numpy.int64)
+        indices[0::2] = starts
+        indices[1::2] = ends
+        return ufunc.reduceat(padded, indices, axis=0)[0::2]
+
+    def _build(self, leaf_size):
+        num_triangles = len(self.triangles)
+        centroids = (self._tri_min + self._tri_max) * 0.5
+        primitives = numpy.arange(num_triangles, dtype=numpy.int64)
+        node_min = []
+        node_max = []
+        node_child = []
+        node_count = []
+        if num_triangles == 0:
+            return (numpy.zeros((0, 3), dtype=numpy.float32),
+                    numpy.zeros((0, 3), dtype=numpy.float32),
+                    numpy.zeros(0, dtype=numpy.int32),
+                    numpy.zeros(0, dtype=numpy.int32),
+                    primitives.astype(numpy.int32))
+        starts = numpy.array([0])
+        ends = numpy.array([num_triangles])
+        num_nodes = 0
+        while len(starts):
+            # bounds of all nodes in this level
+            node_min.append(self._segment_reduce(
+                numpy.minimum, self._tri_min[primitives], starts, ends))
+            node_max.append(self._segment_reduce(
+                numpy.maximum, self._tri_max[primitives], starts, ends))
+            sizes = ends - starts
+            split = sizes > leaf_size
+            num_level = len(starts)
+            num_nodes += num_level
+            # children of split nodes make up the next level, in order
+            children = num_nodes + 2 * (numpy.cumsum(split) - 1)
+            node_child.append(numpy.where(split, children, starts))
+            node_count.append(numpy.where(split, 0, sizes))
+            if not split.any():
+                break
+            starts = starts[split]
+            ends = ends[split]
+            # split along the longest axis of the centroid bounds
+            cent = centroids[primitives]
+            extent = (self._segment_reduce(numpy.maximum, cent, starts, ends)
+                      - self._segment_reduce(numpy.minimum, cent, starts, ends))
+            axes = numpy.argmax(extent, axis=1)
+            positions = numpy.concatenate(
+                [numpy.arange(start, end) for start, end
+                 in zip(starts.tolist(), ends.tolist())])
+            segments = numpy.repeat(numpy.arange(len(starts)), ends - starts)
+            keys = cent[positions, axes[segments]]
+            order = numpy.lexsort((keys, segments))
+            primitives[positions] = primitives[positions[order]]
+            mids = starts + (ends - starts) // 2
+            starts, ends = (numpy.stack((starts, mids), axis=1).ravel(),
+                            numpy.stack((mids, ends), axis=1).ravel())
+        # round bounds outwards, so single precision boxes stay conservative
+        return (numpy.nextafter(numpy.concatenate(node_min).astype(numpy.float32),
+                                numpy.float32(-numpy.inf)),
+                numpy.nextafter(numpy.concatenate(node_max).astype(numpy.float32),
+                                numpy.float32(numpy.inf)),
+                numpy.concatenate(node_child).astype(numpy.int32),
+                numpy.concatenate(node_count).astype(numpy.int32),
+                primitives.astype(numpy.int32))
+
+    def get_arrays(self):
+        """Return the hierarchy as a dictionary of arrays, suitable for
+        :func:`numpy.savez` and :meth:`from_arrays`."""
+        return dict(node_min=self.node_min, node_max=self.node_max,
+                    node_child=self.node_child, node_count=self.node_count,
+                    primitives=self.primitives)
+
+    @classmethod
+    def from_arrays(cls, vertices, triangles,
+                    node_min, node_max, node_child, node_count, primitives):
+        """Restore a hierarchy from the arrays of :meth:`get_arrays`."""
+        return cls(vertices, triangles, _arrays=(
+            numpy.asarray(node_min, dtype=numpy.float32),
+            numpy.asarray(node_max, dtype=numpy.float32),
+            numpy.asarray(node_child, dtype=numpy.int32),
+            numpy.asarray(node_count, dtype=numpy.int32),
+            numpy.asarray(primitives, dtype=numpy.int32)))
+
+    def _leaf_triangles(self, node):
+        first = self._child[node]
+        return self.primitives[first:first + self._count[node]]
+
+    def ray_intersect(self, origin, direction, max_distance=float('inf')):
+        """Find the first triangle hit by a ray.
+
+        :param origin: The ray origin.
+        :param direction: The ray direction (need not be normalized).
+        :param max_distance: Ignore hits further than this, measured in
+            units of C{direction}.
+        :return: Tuple ``(triangle_index, distance)``, or ``None`` if the
+            ray hits nothing.
+        """
+        origin = tuple(float(x) for x in origin)
+        direction = tuple(float(x) for x in direction)
+        inv = tuple(1.0 / x if x != 0 else float('inf') for x in direction)
+        best = None
+        best_t = max_distance
+        stack = [0] if self._count else []
+        while stack:
+            node = stack.pop()
+            # slab test
+            tmin = 0.0
+            tmax = best_t
+            bmin = self._min[node]
+            bmax = self._max[node]
+            for axis in range(3):
+                if inv[axis] == float('inf'):
+                    if not bmin[axis] <= origin[axis] <= bmax[axis]:
+                        tmax = -1.0
+                        break
+                    continue
+                t1 = (bmin[axis] - origin[axis]) * inv[axis]
+                t2 = (bmax[axis] - origin[axis]) * inv[axis]
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                tmin = max(tmin, t1)
+                tmax = min(tmax, t2)
+            if tmin > tmax:
+                continue
+            if self._count[node] == 0:
+                stack.append(self._child[node])
+                stack.append(self._child[node] + 1)
+                continue
+            # Moller-Trumbore on all triangles of the leaf
+            tris = self._leaf_triangles(node)
+            corners = self.vertices[self.triangles[tris]]
+            edge1 = corners[:, 1] - corners[:, 0]
+            edge2 = corners[:, 2] - corners[:, 0]
+            pvec = numpy.cross(direction, edge2)
+            det = (edge1 * pvec).sum(axis=1)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                inv_det = 1.0 / det
+                tvec = numpy.asarray(origin) - corners[:, 0]
+                u = (tvec * pvec).sum(axis=1) * inv_det
+                qvec = numpy.cross(tvec, edge1)
+                v = (qvec * direction).sum(axis=1) * inv_det
+                t = (edge2 * qvec).sum(axis=1) * inv_det
+            hit = ((det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1)
+                   & (t >= 0) & (t <= best_t))
+            if hit.any():
+                i = numpy.flatnonzero(hit)[numpy.argmin(t[hit])]
+                best = int(tris[i])
+                best_t = float(t[i])
+        if best is None:
+            return None
+        return best, best_t
+
+    def nearest_point(self, point):
+        """Find the point on the mesh closest to the given point.
+
+        :return: Tuple ``(triangle_index, closest_point, distance)``, or
+            ``None`` if the mesh has no triangles.
+        """
+        point = tuple(float(x) for x in point)
+        best = None
+        best_d2 = float('inf')
+        stack = [(0.0, 0)] if self._count else []
+        while stack:
+            d2, node = stack.pop()
+            if d2 >= best_d2:
+                continue
+            if self._count[node] == 0:
+                children = []
+                for child in (self._child[node], self._child[node] + 1):
+                    bmin = self._min[child]
+                    bmax = self._max[child]
+                    child_d2 = sum(
+                        max(bmin[axis] - point[axis], 0.0,
+                            point[axis] - bmax[axis]) ** 2
+                        for axis in range(3))
+                    children.append((child_d2, child))
+                # visit the nearest child first
+                stack.extend(sorted(children, reverse=True))
+                continue
+            tris = self._leaf_triangles(node)
+            closest = closest_points_on_triangles(
+                point, self.vertices[self.triangles[tris]])
+            dist2 = ((closest - point) ** 2).sum(axis=1)
+            i = int(numpy.argmin(dist2))
+            if dist2[i] < best_d2:
+                best_d2 = float(dist2[i])
+                best = (int(tris[i]), tuple(closest[i].tolist()))
+        if best is None:
+            return None
+        return best[0], best[1], best_d2 ** 0.5
+
+    def overlap_aabb(self, box_min, box_max):
+        """Find all triangles whose bounding box overlaps the given
+        axis aligned box.
+
+        :return: Sorted array of triangle indices.
+        """
+        box_min = tuple(float(x) for x in box_min)
+        box_max = tuple(float(x) for x in box_max)
+        found = []
+        stack = [0] if self._count else []
+        while stack:
+            node = stack.pop()
+            bmin = self._min[node]
+            bmax = self._max[node]
+            if any(bmin[axis] > box_max[axis] or bmax[axis] < box_min[axis]
+                   for axis in range(3)):
+                continue
+            if self._count[node] == 0:
+                stack.append(self._child[node])
+                stack.append(self._child[node] + 1)
+                continue
+            tris = self._leaf_triangles(node)
+            overlap = ((self._tri_min[tris] <= box_max).all(axis=1)
+                       & (self._tri_max[tris] >= box_min).all(axis=1))
+            found.append(tris[overlap])
+        if not found:
+            return numpy.zeros(0, dtype=numpy.int32)
+        return numpy.sort(numpy.concatenate(found))
+
+def closest_points_on_triangles(point, corners):
+    """For each triangle, find the point closest to the given point.
+
+    >>> closest_points_on_triangles(
+    ...     (2, 2, 1), [[(0,0,0), (1,0,0), (0,1,0)]]).tolist()
+    [[0.5, 0.5, 0.0]]
+
+    :param point: The point.
+    :param corners: Array of triangle corners, shape ``(m, 3, 3)``.
+    :return: Array of closest points, shape ``(m, 3)``.
+    """
+    point = numpy.asarray(point, dtype=numpy.float64)
+    corners = numpy.asarray(corners, dtype=numpy.float64)
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+
+    def dot(vec1, vec2):
+        return (vec1 * vec2).sum(axis=1)
+
+    def closest_on_segment(start, end):
+        edge = end - start
+        length2 = dot(edge, edge)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t = numpy.clip(dot(point - start, edge) / length2, 0.0, 1.0)
+        t = numpy.where(length2 > 0, t, 0.0)
+        return start + edge * t[:, numpy.newaxis]
+
+    # candidates: the projection on the plane, and the three edges
+    normal = numpy.cross(b - a, c - a)
+    norm2 = dot(normal, normal)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        proj = point - normal * (dot(point - a, normal) / norm2)[:, numpy.newaxis]
+        # barycentric coordinates of the projection
+        inside = ((dot(numpy.cross(b - a, proj - a), normal) >= 0)
+                  & (dot(numpy.cross(c - b, proj - b), normal) >= 0)
+                  & (dot(numpy.cross(a - c, proj - c), normal) >= 0)
+                  & (norm2 > 0))
+    candidates = numpy.stack((closest_on_segment(a, b),
+                              closest_on_segment(b, c),
+                              closest_on_segment(c, a)), axis=1)
+    dist2 = ((candidates - point) ** 2).sum(axis=2)
+    closest = candidates[numpy.arange(len(a)), numpy.argmin(dist2, axis=1)]
+    closest[inside] = proj[inside]
+    return closest
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,255 @@
+"""Mesh simplification by quadric error metrics.
+
+Triangles are removed by half edge collapses (one end point of an edge
+is merged into the other), ordered by the quadric error of Garland and
+Heckbert. Since the surviving vertex keeps its position, all of its
+attributes (normal, uv, color, skin weights) stay valid, so the result
+is returned as a map into the original vertices.
+
+Vertices on open boundaries, and vertices shared by triangles of
+different materials, never move. On a welded mesh (see
+:meth:`pyffi.formats.cgf.CgfFormat.MeshChunk.get_welded_geometry`) uv
+seams are open boundaries, so seams are preserved as well.
+
+>>> # a flat 4x4 grid of quads, with the border locked
+>>> vertices = [(x, y, 0) for y in range(5) for x in range(5)]
+>>> triangles = []
+>>> for y in range(4):
+...     for x in range(4):
+...         i = 5 * y + x
+...         triangles.extend([(i, i + 1, i + 6), (i, i + 6, i + 5)])
+>>> vertex_map, new_triangles, face_map = decimate(vertices, triangles, 16)
+>>> len(new_triangles)
+16
+>>> sorted(set(vertex_map.tolist()) & {0, 4, 20, 24})
+[0, 4, 20, 24]
+>>> len(vertex_map)
+17
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def getQuadrics(vertices, triangles):
+    """Calculate the area weighted plane quadric of every vertex.
+
+    >>> getQuadrics([(0,0,0),(1,0,0),(0,1,0)], [(0,1,2)])[0].tolist()
+    [[0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.5, 0.0], [0.0, 0.0, 0.0, 0.0]]
+
+    :param vertices: Array of vertices, shape ``(n, 3)``.
+    :param triangles: Array of vertex indices, shape ``(m, 3)``.
+    :return: Array of quadrics, shape ``(n, 4, 4)``.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    corners = vertices[triangles]
+    normals = numpy.cross(corners[:, 1] - corners[:, 0],
+                          corners[:, 2] - corners[:, 0])
+    doublearea = numpy.sqrt((normals * normals).sum(axis=1))
+    valid = doublearea > 0
+    planes = numpy.zeros((len(triangles), 4))
+    planes[valid, :3] = normals[valid] / doublearea[valid, numpy.newaxis]
+    planes[:, 3] = -(planes[:, :3] * corners[:, 0]).sum(axis=1)
+    planequadrics = (planes[:, :, numpy.newaxis] * planes[:, numpy.newaxis, :]
+                     * (0.5 * doublearea)[:, numpy.newaxis, numpy.newaxis])
+    quadrics = numpy.zeros((len(vertices), 4, 4))
+    for corner in range(3):
+        numpy.add.at(quadrics, triangles[:, corner], planequadrics)
+    return quadrics
+
+def getLockedVertices(num_vertices, triangles, materials=None):
+    """Find the vertices that must not move: those on open boundaries,
+    and those shared by triangles of different materials.
+
+    >>> getLockedVertices(4, [(0,1,2),(2,1,3)]).tolist()
+    [True, True, True, True]
+    >>> getLockedVertices(5, [(0,1,4),(1,2,4),(2,3,4),(3,0,4)]).tolist()
+    [True, True, True, True, False]
+    >>> getLockedVertices(5, [(0,1,4),(1,2,4),(2,3,4),(3,0,4)], [0,0,0,0]).tolist()
+    [True, True, True, True, False]
+    >>> getLockedVertices(5, [(0,1,4),(1,2,4),(2,3,4),(3,0,4)], [0,0,1,1]).tolist()
+    [True, True, True, True, True]
+    """
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    locked = numpy.zeros(num_vertices, dtype=bool)
+    # edges used by a single triangle are boundary edges
+    edges = numpy.sort(
+        triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges, counts = numpy.unique(edges, axis=0, return_counts=True)
+    locked[edges[counts == 1].ravel()] = True
+    if materials is not None:
+        materials = numpy.asarray(materials, dtype=numpy.int64).ravel()
+        pairs = numpy.unique(numpy.stack(
+            (triangles.ravel(), numpy.repeat(materials, 3)), axis=1), axis=0)
+        locked[pairs[:, 0][numpy.diff(pairs[:, 0], prepend=-1) == 0]] = True
+    return locked
+
+def _quadric_error(q, x, y, z):
+    """Evaluate a quadric, stored as its ten upper triangular entries."""
+    return (q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z
+            + 2 * q[3] * x + q[4] * y * y + 2 * q[5] * y * z
+            + 2 * q[6] * y + q[7] * z * z + 2 * q[8] * z + q[9])
+
+def decimate(vertices, triangles, num_triangles, materials=None, locked=None):
+    """Reduce a mesh to (at most, if possible) the given number of
+    triangles.
+
+    :param vertices: Array of vertices, shape ``(n, 3)``.
+    :param triangles: Array of vertex indices, shape ``(m, 3)``.
+    :param num_triangles: The target number of triangles.
+    :param materials: Array of material indices, shape ``(m,)``. Optional.
+    :param locked: Boolean array, shape ``(n,)``, of extra vertices that
+        must not move. Optional.
+    :return: A tuple ``(vertex_map, triangles, face_map)`` of arrays:
+        the original index of every remaining vertex, the remaining
+        triangles (indexing the remaining vertices), and the original
+        index of every remaining triangle.
+    """
+    if numpy is None:
+        raise ImportError("decimate requires numpy")
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    num_vertices = len(vertices)
+
+    is_locked = getLockedVertices(num_vertices, triangles, materials)
+    if locked is not None:
+        is_locked |= numpy.asarray(locked, dtype=bool)
+    quadrics = getQuadrics(vertices, triangles)
+    upper = numpy.triu_indices(4)
+    quadrics = quadrics[:, upper[0], upper[1]].tolist()
+    is_locked = is_locked.tolist()
+    positions = vertices.tolist()
+    faces = triangles.tolist()
+    alive = [True] * len(faces)
+    vertex_faces = [set() for i in range(num_vertices)]
+    for face_index, face in enumerate(faces):
+        for vertex in face:
+            vertex_faces[vertex].add(face_index)
+    versions = [0] * num_vertices
+    removed = [False] * num_vertices
+
+    def push_candidates(heap, u, v):
+        """Push the collapses of u into v and of v into u."""
+        quadric = [a + b for a, b in zip(quadrics[u], quadrics[v])]
+        for source, target in ((u, v), (v, u)):
+            if not is_locked[source]:
+                heapq.heappush(heap, (
+                    _quadric_error(quadric, *positions[target]),
+                    source, target, versions[source], versions[target]))
+
+    def neighbours(vertex):
+        return set(other for face_index in vertex_faces[vertex]
+                   for other in faces[face_index]) - {vertex}
+
+    heap = []
+    edges = numpy.unique(numpy.sort(
+        triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1), axis=0)
+    for u, v in edges.tolist():
+        push_candidates(heap, u, v)
+
+    def normal(a, b, c):
+        ab = [q - p for p, q in zip(a, b)]
+        ac = [q - p for p, q in zip(a, c)]
+        return (ab[1] * ac[2] - ab[2] * ac[1],
+                ab[2] * ac[0] - ab[0] * ac[2],
+                ab[0] * ac[1] - ab[1] * ac[0])
+
+    num_alive = len(faces)
+    while num_alive > num_triangles and heap:
+        cost, u, v, version_u, version_v = heapq.heappop(heap)
+        if (removed[u] or removed[v]
+            or versions[u] != version_u or versions[v] != version_v):
+            # stale entry
+            continue
+        shared = vertex_faces[u] & vertex_faces[v]
+        if not shared:
+            continue
+        # link condition: the only common neighbours of u and v must be the
+        # opposite corners of the faces that disappear, else the collapse
+        # creates a non-manifold mesh
+        opposite = set(other for face_index in shared
+                       for other in faces[face_index]) - {u, v}
+        if (neighbours(u) & neighbours(v)) != opposite:
+            continue
+        # reject collapses that flip or degenerate a remaining face
+        moved = vertex_faces[u] - shared
+        flips = False
+        for face_index in moved:
+            corners = [positions[vertex] for vertex in faces[face_index]]
+            old_normal = normal(*corners)
+            corners[faces[face_index].index(u)] = positions[v]
+            new_normal = normal(*corners)
+            if sum(p * q for p, q in zip(old_normal, new_normal)) <= 0:
+                flips = True
+                break
+        if flips:
+            continue
+        # collapse u into v
+        for face_index in shared:
+            alive[face_index] = False
+            num_alive -= 1
+            for vertex in faces[face_index]:
+                vertex_faces[vertex].discard(face_index)
+        for face_index in moved:
+            face = faces[face_index]
+            face[face.index(u)] = v
+            vertex_faces[v].add(face_index)
+        vertex_faces[u] = set()
+        removed[u] = True
+        quadrics[v] = [a + b for a, b in zip(quadrics[u], quadrics[v])]
+        versions[v] += 1
+        for w in neighbours(v):
+            push_candidates(heap, v, w)
+
+    face_map = numpy.flatnonzero(alive)
+    new_triangles = numpy.array([faces[face_index] for face_index in face_map.tolist()],
+                                dtype=numpy.int64).reshape(-1, 3)
+    vertex_map, new_triangles = numpy.unique(new_triangles, return_inverse=True)
+    return (vertex_map.astype(numpy.int32),
+            new_triangles.reshape(-1, 3).astype(numpy.int32),
+            face_map.astype(numpy.int32))
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -39,6 +39,11 @@
 
 from pyffi.utils.mathutils import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def getTangentSpace(vertices = None, normals = None, uvs = None,
                     triangles = None, orientation = False,
                     orthogonal = True):
@@ -165,6 +170,154 @@ def getTangentSpace(vertices = None, normals = None, uvs = None,
     else:
         return tan, bin
 
+def getTangentSpaceArrays(vertices = None, normals = None, uvs = None,
+                          triangles = None, orientation = False):
+    """Calculate tangent space data with numpy. Gives the same result as
+    :func:`getTangentSpace`, but takes and returns arrays, so it scales
+    to large meshes.
+
+    >>> vertices = [(0,0,0), (0,1,0), (1,0,0)]
+    >>> normals = [(0,0,1), (0,0,1), (0,0,1)]
+    >>> uvs = [(0,0), (0,1), (1,0)]
+    >>> triangles = [(0,1,2)]
+    >>> tan, bin = getTangentSpaceArrays(vertices = vertices, normals = normals, uvs = uvs, triangles = triangles)
+    >>> tan.tolist()
+    [[0.0, 1.0, 0.0], [0.0, 1.0, 0.0], [0.0, 1.0, 0.0]]
+    >>> bin.tolist()
+    [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 0.0, 0.0]]
+
+    :param vertices: Array of vertices, shape ``(n, 3)``.
+    :param normals: Array of normals, shape ``(n, 3)``.
+    :param uvs: Array of uvs, shape ``(n, 2)``.
+    :param triangles: Array of triangle indices, shape ``(m, 3)``.
+    :param orientation: Set to ``True`` to return orientation as well.
+    :return: Arrays of tangents and binormals, shape ``(n, 3)``, and if
+        C{orientation} is ``True``, an array of orientations, shape ``(n,)``.
+    """
+    if numpy is None:
+        raise ImportError("getTangentSpaceArrays requires numpy")
+
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    normals = numpy.asarray(normals, dtype=numpy.float64).reshape(-1, 3)
+    uvs = numpy.asarray(uvs, dtype=numpy.float64).reshape(-1, 2)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+
+    # validate input
+    if len(vertices) != len(normals) or len(vertices) != len(uvs):
+        raise ValueError(
+            "lists of vertices, normals, and uvs must have the same length")
+
+    numvertices = len(vertices)
+    tan = numpy.zeros((numvertices, 3))
+    bin = numpy.zeros((numvertices, 3))
+    orientations = numpy.zeros(numvertices)
+
+    # skip degenerate triangles
+    t1, t2, t3 = triangles.T
+    triangles = triangles[(t1 != t2) & (t2 != t3) & (t3 != t1)]
+    t1, t2, t3 = triangles.T
+
+    # directions of the triangles, in space and in texture space
+    v2v1 = vertices[t2] - vertices[t1]
+    v3v1 = vertices[t3] - vertices[t1]
+    w2w1 = uvs[t2] - uvs[t1]
+    w3w1 = uvs[t3] - uvs[t1]
+
+    # surface of triangle in texture space, and its sign
+    r = w2w1[:, 0] * w3w1[:, 1] - w3w1[:, 0] * w2w1[:, 1]
+    r_sign = numpy.where(r >= 0, 1.0, -1.0)[:, numpy.newaxis]
+
+    # contribution of each triangle to tangents and binormals
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        sdir = r_sign * (w3w1[:, 1, numpy.newaxis] * v2v1
+                         - w2w1[:, 1, numpy.newaxis] * v3v1)
+        tdir = r_sign * (w2w1[:, 0, numpy.newaxis] * v3v1
+                         - w3w1[:, 0, numpy.newaxis] * v2v1)
+        snorm = numpy.sqrt((sdir * sdir).sum(axis=1))
+        tnorm = numpy.sqrt((tdir * tdir).sum(axis=1))
+        sdir /= snorm[:, numpy.newaxis]
+        tdir /= tnorm[:, numpy.newaxis]
+    # skip triangles with zero or invalid directions
+    valid = (numpy.isfinite(sdir).all(axis=1) & (snorm > 0)
+             & numpy.isfinite(tdir).all(axis=1) & (tnorm > 0))
+    triangles = triangles[valid]
+    sdir = sdir[valid]
+    tdir = tdir[valid]
+    r = r[valid]
+
+    for corner in range(3):
+        numpy.add.at(tan, triangles[:, corner], tdir)
+        numpy.add.at(bin, triangles[:, corner], sdir)
+        numpy.add.at(orientations, triangles[:, corner], r)
+
+    # convert into orthogonal space
+    norms = numpy.sqrt((normals * normals).sum(axis=1))
+    bad = numpy.abs(1 - norms) > 0.01
+    if bad.any():
+        i = int(numpy.argmax(bad))
+        raise ValueError(
+            "tangentspace: unnormalized normal in list of normals (%s, norm is %f)" % (tuple(normals[i]), norms[i]))
+
+    def dot(vec1, vec2):
+        return (vec1 * vec2).sum(axis=1)[:, numpy.newaxis]
+
+    # turn norm, bin, tan into a base via Gram-Schmidt
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        bin = bin - normals * dot(normals, bin)
+        binnorm = numpy.sqrt(dot(bin, bin))
+        bin = bin / binnorm
+        tan = tan - normals * dot(normals, tan)
+        tan = tan - bin * dot(normals, bin)
+        tannorm = numpy.sqrt(dot(tan, tan))
+        tan = tan / tannorm
+    fallback = ((binnorm[:, 0] == 0) | (tannorm[:, 0] == 0)
+                | ~numpy.isfinite(bin).all(axis=1)
+                | ~numpy.isfinite(tan).all(axis=1))
+    if fallback.any():
+        # insuffient data to set tangent space for these vertices
+        # in that case pick a space
+        norm = normals[fallback]
+        fbin = numpy.cross((1, 0, 0), norm)
+        fbinnorm = numpy.sqrt(dot(fbin, fbin))
+        degenerate = fbinnorm[:, 0] == 0
+        fbin[degenerate] = numpy.cross((0, 1, 0), norm[degenerate])
+        fbinnorm[degenerate] = numpy.sqrt(
+            dot(fbin[degenerate], fbin[degenerate]))
+        fbin /= fbinnorm
+        bin[fallback] = fbin
+        tan[fallback] = numpy.cross(norm, fbin)
+
+    # return result
+    if orientation:
+        return tan, bin, orientations
+    else:
+        return tan, bin
+
+def getPackedTangentSpace(vertices = None, normals = None, uvs = None,
+                          triangles = None):
+    """Calculate tangent space data with numpy, packed as 16 bit integers
+    in the layout of a Crysis tangents data stream: for each vertex, the
+    binormal and the tangent as (x, y, z, w), scaled by 32767, where w
+    is +32767 or -32767 depending on the orientation.
+
+    >>> vertices = [(0,0,0), (0,1,0), (1,0,0)]
+    >>> normals = [(0,0,1), (0,0,1), (0,0,1)]
+    >>> uvs = [(0,0), (0,1), (1,0)]
+    >>> triangles = [(0,1,2)]
+    >>> getPackedTangentSpace(vertices = vertices, normals = normals, uvs = uvs, triangles = triangles)[0].tolist()
+    [[32767, 0, 0, -32767], [0, 32767, 0, -32767]]
+
+    :return: Array of shape ``(n, 2, 4)`` and type ``int16``.
+    """
+    tan, bin, orientations = getTangentSpaceArrays(
+        vertices = vertices, normals = normals, uvs = uvs,
+        triangles = triangles, orientation = True)
+    packed = numpy.empty((len(tan), 2, 4), dtype=numpy.int16)
+    packed[:, 0, :3] = 32767 * bin
+    packed[:, 1, :3] = 32767 * tan
+    packed[:, :, 3] = numpy.where(orientations > 0, 32767, -32767)[:, numpy.newaxis]
+    return packed
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -1,5 +1,6 @@
 import array
 from gc import collect
+import hashlib
 import os
 import time
 import bpy
@@ -11,6 +12,7 @@ import mathutils
 import math
 import itertools
 import bmesh
+import numpy as np
 
 from math import *
 from mathutils import *
@@ -18,50 +20,147 @@ from mathutils import *
 from bpy_extras.wm_utils.progress_report import ProgressReport, ProgressReportSubstep
 from pyffi.formats.cgf import CgfFormat
 
+import cgf_scene
+from cgf_scene import to_str
 
-def to_str(bytes_val) -> str:
-    try:
-        return bytes_val.decode('utf-8', "replace")
-    except:
-        return str(bytes_val)
-
-
-class BoneInfo:
-    bone_id = 0
-    parent_id = -1
-    name = ""
-    name_crc_32 = 0
-    bind_pos = None
-    bind_rot = None
-    bind_mat = None
-    origin_mat = None
-    parent = None
-    blender_bone = None
-    roll = 0
-    head = []
-    tail = []
-    children = []
+# custom mesh property holding the fingerprint of the imported geometry
+MESH_FINGERPRINT_PROPERTY = 'cgf_fingerprint'
+
+# custom material property holding the key of the imported material settings
+MATERIAL_FINGERPRINT_PROPERTY = 'cgf_fingerprint'
+
+
+# number of deferred images loaded on each tick of the loader timer
+DEFERRED_IMAGES_PER_TICK = 4
+
+# seconds between the ticks of the loader timer
+DEFERRED_IMAGES_INTERVAL = 0.1
+
+# names of the placeholder images still to be loaded (see load_deferred_images)
+deferred_images = []
+
+
+def load_deferred_images():
+    """
+    Timer loading the pixels of a few placeholder images (see
+    ImportCGF.create_image_placeholder) on each tick, until all are
+    loaded, so the textures fill in after the import without blocking.
+    """
+    names = deferred_images[:DEFERRED_IMAGES_PER_TICK]
+    del deferred_images[:DEFERRED_IMAGES_PER_TICK]
+    for name in names:
+        image = bpy.data.images.get(name)
+        if image is None:
+            # removed since
+            continue
+        image.reload()
+        # reading the size loads the file
+        if not image.size[0]:
+            print('Failed to load image %s from %s' % (name, image.filepath))
+
+    if names and bpy.context.window_manager is not None:
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type in {'VIEW_3D', 'IMAGE_EDITOR', 'NODE_EDITOR'}:
+                    area.tag_redraw()
+
+    if deferred_images:
+        return DEFERRED_IMAGES_INTERVAL
+    print('Loaded all deferred images.')
+    return None
+
+
+def defer_image_loading(image):
+    deferred_images.append(image.name)
+    if not bpy.app.timers.is_registered(load_deferred_images):
+        bpy.app.timers.register(load_deferred_images,
+                                first_interval=DEFERRED_IMAGES_INTERVAL)
+
+
+def cancel_deferred_images():
+    """
+    Stops the loader timer. The images not loaded yet are still loaded on
+    first use.
+    """
+    del deferred_images[:]
+    if bpy.app.timers.is_registered(load_deferred_images):
+        bpy.app.timers.unregister(load_deferred_images)
+
+
+def get_keyframe_interpolation(name):
+    """
+    Returns the value of an interpolation mode of the keyframes, such as
+    'LINEAR', as taken by foreach_set. The values are looked up, as they
+    are not part of the API.
+    """
+    return bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[name].value
+
+
+def index_by_property(datablocks, name):
+    """
+    Returns the datablocks having the custom property, keyed by its value.
+    """
+    return dict((datablock[name], datablock) for datablock in datablocks
+                if name in datablock)
+
+
+
+class ImportSession:
+    """
+    Registry of the datablocks created by imports, so that those left
+    unused can be removed afterwards without scanning, or touching, any
+    other data of the blend file.
+    """
+
+    __slots__ = ['datablocks']
+
+    # the bpy.data collections of the datablocks, users before what they use
+    COLLECTIONS = ('meshes', 'armatures', 'actions', 'materials', 'images')
 
     def __init__(self):
-        self.bone_id = 0
-        self.name = ""
-        self.bind_pos = Vector()
-        self.bind_rot = Matrix().to_3x3()
-        self.bind_mat = Matrix()
-        self.origin_mat = Matrix()
-        self.parent = None
-        self.parent_id = -1
-        self.blender_bone = None
-        self.roll = 0
-        self.head = []
-        self.tail = []
-        self.children = []
+        self.datablocks = []
+
+    def add(self, collection, datablock):
+        assert collection in self.COLLECTIONS
+        self.datablocks.append((collection, datablock))
+        return datablock
+
+    def release_unused(self):
+        """
+        Removes the registered datablocks without users, including those
+        only used by other removed ones (such as the images of an unused
+        material), and returns how many were removed.
+        """
+        datablocks = sorted(self.datablocks, key=lambda item: self.COLLECTIONS.index(item[0]))
+        self.datablocks = []
+        num_removed = 0
+        removed = True
+        while removed:
+            removed = False
+            kept = []
+            for collection, datablock in datablocks:
+                try:
+                    users = datablock.users
+                except ReferenceError:
+                    # removed since
+                    continue
+                if users:
+                    kept.append((collection, datablock))
+                else:
+                    getattr(bpy.data, collection).remove(datablock)
+                    num_removed += 1
+                    removed = True
+            datablocks = kept
+        return num_removed
 
 
 class ImportCGF:
 
-    __slots__ = ['_filepath', 'scale_factor', 'project_root', 'dataname', 'bone_names', 'ob_meshes', 'ob_armature', 'bone_infos',
-                 'skin_mesh_chunk', 'animation_map', 'armature_auto_connect', 'animations_loaded', 'dds_convert']
+    __slots__ = ['_filepath', 'scale_factor', 'project_root', 'dataname', 'bone_names', 'ob_meshes', 'ob_armature', 'skeleton',
+                 'animation_map', 'armature_auto_connect', 'animations_loaded', 'dds_convert',
+                 'weighted_objects', 'animation_options', 'reuse_meshes', 'mesh_cache',
+                 'material_cache', 'texture_indices', 'converted_textures', 'defer_images',
+                 'session', 'profile']
 
     def __init__(self):
         self.scale_factor = 1.0
@@ -69,8 +168,7 @@ class ImportCGF:
         self.bone_names = {}
         self.ob_meshes = []
         self.ob_armature = None
-        self.bone_infos = []
-        self.skin_mesh_chunk = None
+        self.skeleton = None
         self._filepath = None
         self.project_root: str = None
         self.animation_map = None
@@ -78,6 +176,16 @@ class ImportCGF:
         self.armature_auto_connect = True
         self.animations_loaded = []
         self.dds_convert = False
+        self.weighted_objects = set()
+        self.animation_options = {}
+        self.reuse_meshes = False
+        self.mesh_cache = None
+        self.material_cache = None
+        self.texture_indices = {}
+        self.converted_textures = {}
+        self.defer_images = False
+        self.session = ImportSession()
+        self.profile = None
 
     def get_material_name(self, name):
         if isinstance(name, bytes):
@@ -107,44 +215,58 @@ class ImportCGF:
             return name[s_begin+1:s_begin+7].lower() == b'nodraw'
         return False
 
-    def convert_dds_to_png(self, filepath: str):
-        if not filepath.lower().endswith('.dds'):
-            return False
-
-        _dirname = os.path.dirname(filepath)
-        _basename = os.path.basename(filepath)
-        _filename, _extname = os.path.splitext(_basename)
-        _target_fullpath = os.path.join(_dirname, f'{_filename.lower()}.png')
-
-        # im = bpy_extras.image_utils.load_image(_basename, _dirname, verbose=True, check_existing=True)
-        # im.filepath_raw = _target_fullpath
-        # im.file_format = 'PNG'
-        # im.save()
-        ret, = bpy.ops.image.open(filepath=filepath, directory=_dirname, files=[
-                                  {'name': _basename}], relative_path=True, show_multiview=True)
-        if ret == 'FINISHED':
-            im = bpy.data.images[_basename]
-            im.save_render(_target_fullpath)
-            im.user_clear()
-            bpy.data.images.remove(im)
-
-        # TODO: convert dds to png.
-        # with Image.open(filepath) as im:
-        #     _dirname = os.path.dirname(filepath)
-        #     _basename = os.path.basename(filepath)
-        #     _filename, _extname = os.path.splitext(_basename)
-        #     _target_fullpath = os.path.join(_dirname, f'{_filename.lower()}.png')
-        #     im.save(_target_fullpath)
-
-        return True
-
-    def create_std_material(self, chunk: CgfFormat.MtlChunk, reuse_images: bool = False, project_root: str = None):
+    def resolve_image_path(self, image_path, project_root=None):
+        """
+        Returns the file path of a texture path of a material: found in the
+        texture index of the project, or else relative to the project root,
+        or else by its file name at the project root.
         """
-        Returns blender material from standard material chunk.
+        if project_root is None:
+            project_root = self.project_root
+        project_root = '' if (project_root is None) else project_root
+
+        filepath = None
+        texture_index = self.get_texture_index(project_root)
+        if texture_index is not None:
+            filepath = cgf_scene.resolve_texture_path(texture_index, image_path)
+        if filepath is None:
+            filepath = image_path
+            if not os.path.isabs(image_path):
+                filepath = os.path.join(project_root, image_path)
+            if not os.path.exists(filepath):
+                filepath = os.path.join(
+                    project_root, os.path.basename(image_path))
+
+        return filepath.replace('\\', '/').replace('//', '/')
+
+    def convert_textures(self, materials):
+        """
+        Converts the DDS textures of all the materials (see
+        cgf_scene.build_material) to PNG images at once, before the
+        materials are created (see cgf_scene.convert_textures). The
+        textures converted before are not converted again.
+        """
+        dds_paths = set()
+        for material in materials:
+            if material['type'] == CgfFormat.MtlType.MULTI:
+                continue
+            for long_name, name in material['textures'].values():
+                filepath = self.resolve_image_path(long_name)
+                if filepath.lower().endswith('.dds') and filepath not in self.converted_textures:
+                    dds_paths.add(filepath)
+        if not dds_paths:
+            return
+        png_paths = cgf_scene.convert_textures(sorted(dds_paths))
+        for filepath in dds_paths:
+            self.converted_textures[filepath] = png_paths[os.path.abspath(filepath)]
+
+    def create_std_material(self, material: dict, reuse_images: bool = False, project_root: str = None):
+        """
+        Returns blender material from standard material settings (see
+        cgf_scene.build_material).
         For use with Far Cry.
         """
-        assert (isinstance(chunk, CgfFormat.MtlChunk))
-        # assert (chunk.type == CgfFormat.MtlType.STANDARD)  # DEBUG
+        # assert (material['type'] == CgfFormat.MtlType.STANDARD)  # DEBUG
         # TODO: check duplicated imported
 
         if project_root is None:
@@ -154,94 +276,76 @@ class ImportCGF:
 
         print("Creating material...")
         # get material name
-        mtlname = self.get_material_name(chunk.name)
+        mtlname = self.get_material_name(material['name'])
         # print("name: %s\nshader: %s\nscript: %s" % (mtlname, mtlshader, mtlscript))
         print("name: %s" % mtlname)
 
         # create material
-        mat = bpy.data.materials.new(to_str(mtlname))
+        mat = self.session.add('materials', bpy.data.materials.new(to_str(mtlname)))
         # set material parameters
 
         ma_wrap = node_shader_utils.PrincipledBSDFWrapper(
             mat, is_readonly=False)
         cycles_material_wrap_map[mat] = ma_wrap
 
-        # print(f'chunk.col_d: {chunk.col_d}')
-        # print(f'chunk.col_s: {chunk.col_s}')
-        # print(f'chunk.col_a: {chunk.col_a}')
-        # print(f'chunk: {chunk}')
+        diffuse_color = material['diffuse_color']
+        specular_color = material['specular_color']
+        ambient_color = material['ambient_color']
 
-        diffuse_color = (float(chunk.col_d.r) / 255,
-                         float(chunk.col_d.g) / 255,
-                         float(chunk.col_d.b) / 255)
-        specular_color = (float(chunk.col_s.r) / 255,
-                          float(chunk.col_s.g) / 255,
-                          float(chunk.col_s.b) / 255)
-        ambient_color = (float(chunk.col_a.r) / 255,
-                         float(chunk.col_a.g) / 255,
-                         float(chunk.col_a.b) / 255)
-
-        ma_wrap.emission_strength = chunk.self_illum
+        ma_wrap.emission_strength = material['self_illum']
 
         ma_wrap.base_color = diffuse_color
         ma_wrap.specular = sum(specular_color) / 3
-        ma_wrap.specular_tint = chunk.spec_level
-        ma_wrap.roughness = int((1.0 - chunk.spec_shininess) * 8.0)
+        ma_wrap.specular_tint = material['spec_level']
+        ma_wrap.roughness = int((1.0 - material['spec_shininess']) * 8.0)
         # ma_wrap.metallic = sum(ambient_color) / 3
 
         # Don't load the same image multiple times
         context_imagepath_map = {}
 
-        project_root = '' if (project_root is None) else project_root
-
-        def determine_texture_map(chunk: CgfFormat.MtlChunk, name: str) -> bool:
-            tex_map = chunk.__getattribute__(name)
-            if tex_map and tex_map.type > 0:
-                print(
-                    f"{chunk.name} -> texture ({name}): long_name = {tex_map.long_name}, type = {tex_map.type}")
-                return True
-            return False
-
         def load_material_image(image_path, alias_name=None, reuse_images: bool = False):
             print("load_material_image: %s" % image_path)
-            filepath = image_path
-            if not os.path.isabs(image_path):
-                filepath = os.path.join(project_root, image_path)
-            if not os.path.exists(filepath):
-                filepath = os.path.join(
-                    project_root, os.path.basename(image_path))
+            filepath = self.resolve_image_path(image_path, project_root)
 
-            filepath = filepath.replace('\\', '/').replace('//', '/')
+            # converted by convert_textures, unless the conversion failed
+            if self.dds_convert and self.converted_textures.get(filepath):
+                filepath = self.converted_textures[filepath]
 
             base_name = os.path.basename(filepath)
             dir_name = os.path.dirname(filepath)
 
-            fileNameWithoutExt, fileNameExt = os.path.splitext(base_name)
-
-            if self.dds_convert and fileNameExt.lower() == ".dds":
-                self.convert_dds_to_png(filepath)
-                base_name = fileNameWithoutExt.lower() + '.png'
-
             image = None
             if reuse_images:
                 if bpy.data.images.find(base_name) != -1:
                     image = bpy.data.images.get(base_name)
 
+            if image is None and self.defer_images and os.path.isfile(filepath):
+                image = self.create_image_placeholder(filepath)
             if image is None:
                 image = load_image(base_name, dir_name)
+                if image is not None:
+                    self.session.add('images', image)
             if not alias_name:
                 alias_name = os.path.basename(image_path)
 
             return (alias_name, image)
 
-        alpha_test = chunk.alpha_test > 0.0 and chunk.alpha_test < 1.0
+        alpha_test = material['alpha_test'] > 0.0 and material['alpha_test'] < 1.0
+        opacity = material['opacity']
+        textures = material['textures']
+
+        def load_texture_image(slot):
+            long_name, name = textures[slot]
+            print(f"{material['name']} -> texture ({slot}): long_name = {long_name}")
+            with cgf_scene.profile_phase(self.profile, 'images'):
+                (alias_name, image) = load_material_image(long_name, name, reuse_images)
+            return image
 
         # determines how many textures specified.
-        if chunk.type == 1:
+        if material['type'] == 1:
             has_opacity_texture = False
-            if determine_texture_map(chunk, 'tex_o'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_o.long_name), to_str(
-                    chunk.tex_o.name) if chunk.tex_o.name else None, reuse_images)
+            if 'tex_o' in textures:
+                image = load_texture_image('tex_o')
 
                 # opacity_texture = node_shader_utils.ShaderImageTextureWrapper(ma_wrap, ma_wrap.node_principled_bsdf, ma_wrap.node_principled_bsdf.inputs['Alpha'])
                 # opacity_texture.image = image
@@ -252,65 +356,59 @@ class ImportCGF:
                     ma_wrap.node_principled_bsdf.inputs['Alpha'], ma_wrap.alpha_texture.node_image.outputs['Alpha'])
                 has_opacity_texture = True
 
-            if determine_texture_map(chunk, 'tex_d'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_d.long_name),
-                                                          to_str(chunk.tex_d.name) if chunk.tex_d.name else None, reuse_images)
+            if 'tex_d' in textures:
+                image = load_texture_image('tex_d')
                 ma_wrap.base_color_texture.image = image
                 ma_wrap.base_color_texture.texcoords = 'UV'
 
-                if not has_opacity_texture and (chunk.opacity < 1.0 or alpha_test):
+                if not has_opacity_texture and (opacity < 1.0 or alpha_test):
                     ma_wrap.material.node_tree.links.new(
                         ma_wrap.node_principled_bsdf.inputs['Alpha'], ma_wrap.base_color_texture.node_image.outputs['Alpha'])
 
-            if determine_texture_map(chunk, 'tex_a'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_a.long_name), to_str(
-                    chunk.tex_a.name) if chunk.tex_a.name else None, reuse_images)
+            if 'tex_a' in textures:
+                image = load_texture_image('tex_a')
                 ma_wrap.emission_color_texture.image = image
                 ma_wrap.emission_color_texture.texcoords = 'UV'
-            if determine_texture_map(chunk, 'tex_s'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_s.long_name), to_str(
-                    chunk.tex_s.name) if chunk.tex_s.name else None, reuse_images)
+            if 'tex_s' in textures:
+                image = load_texture_image('tex_s')
                 ma_wrap.specular_texture.image = image
                 ma_wrap.specular_texture.texcoords = 'UV'
 
-            if determine_texture_map(chunk, 'tex_b'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_b.long_name), to_str(
-                    chunk.tex_b.name) if chunk.tex_b.name else None, reuse_images)
+            if 'tex_b' in textures:
+                image = load_texture_image('tex_b')
                 ma_wrap.normalmap_texture.image = image
                 ma_wrap.normalmap_texture.texcoords = 'UV'
-            if determine_texture_map(chunk, 'tex_g'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_g.long_name), to_str(
-                    chunk.tex_g.name) if chunk.tex_g.name else None, reuse_images)
+            if 'tex_g' in textures:
+                image = load_texture_image('tex_g')
                 ma_wrap.roughness_texture.image = image
                 ma_wrap.roughness_texture.texcoords = 'UV'
-            if determine_texture_map(chunk, 'tex_f'):
+            if 'tex_f' in textures:
                 print('No implemented for tex_f.');
                 pass
-            if determine_texture_map(chunk, 'tex_c'):
+            if 'tex_c' in textures:
                 print('No implemented for tex_f.');
                 pass
-            if determine_texture_map(chunk, 'tex_r'):
-                (alias_name, image) = load_material_image(to_str(chunk.tex_r.long_name), to_str(
-                    chunk.tex_r.name) if chunk.tex_r.name else None, reuse_images)
+            if 'tex_r' in textures:
+                image = load_texture_image('tex_r')
                 ma_wrap.metallic_texture.image = image
                 ma_wrap.metallic_texture.texcoords = 'UV'
-            if determine_texture_map(chunk, 'tex_subsurf'):
+            if 'tex_subsurf' in textures:
                 print('No implemented for tex_subsurf.');
                 pass
-            if determine_texture_map(chunk, 'tex_detail'):
+            if 'tex_detail' in textures:
                 print('No implemented for tex_detail.');
                 pass
 
-        if chunk.opacity < 1.0:
-            ma_wrap.alpha = chunk.opacity
+        if opacity < 1.0:
+            ma_wrap.alpha = opacity
             mat.blend_method = 'BLEND'
             mat.shadow_method = 'HASHED'
         elif alpha_test:
             mat.blend_method = 'CLIP'
             mat.shadow_method = 'CLIP'
-            mat.alpha_threshold = chunk.alpha_test
+            mat.alpha_threshold = material['alpha_test']
 
-        if chunk.flags.two_sided == 1:
+        if material['two_sided']:
             mat.use_backface_culling = False
         else:
             mat.use_backface_culling = True
@@ -321,180 +419,258 @@ class ImportCGF:
 
         return mat
 
-    def create_mesh(self, new_objects,
-                    mesh_chunk: CgfFormat.MeshChunk,
-                    unique_materials: list[bpy.types.Material],
-                    dataname: str):
-        assert (isinstance(mesh_chunk, CgfFormat.MeshChunk))
+    def create_image_placeholder(self, filepath):
+        """
+        Returns a new image of the file without reading it. The pixels are
+        loaded on first use, or else by the deferred image loader (see
+        load_deferred_images).
+        """
+        image = self.session.add('images', bpy.data.images.new(os.path.basename(filepath), 1, 1))
+        image.source = 'FILE'
+        image.filepath = filepath
+        defer_image_loading(image)
+        return image
 
-        verts_loc = []
-        verts_nor = []
-        verts_tex = None
-        verts_col = [] if (mesh_chunk.has_vertex_colors) else None
-        faces = []
-        uv_faces = None
+    def create_materials(self, materials, reuse_materials=False, reuse_images=False):
+        """
+        Returns the blender material and nodraw flag of every material
+        (see cgf_scene.build_material), indexed by the material ids of the
+        mesh faces. Multi materials have no index.
+        """
+        b_mats = []
+        for material in materials:
+            # multi material: skip
+            # if chunk.children or to_str(chunk.name).startswith('s_nouvmap') \
+            #         or chunk.type != CgfFormat.MtlType.STANDARD \
+            #         or self.get_material_name(chunk.name) is None:
+            #     print(f'Ignore MtlChunk: {chunk.name}')
+            #     continue
+            if material['type'] == CgfFormat.MtlType.MULTI:
+                print(
+                    f"Ignore MtlChunk: {material['name']}, because of MtlType.MULTI")
+                continue
+            elif self.get_material_name(material['name']) is None:
+                print(
+                    f"Ignore MtlChunk: {material['name']}, unlegal material name.")
+                b_mats.append((None, True))
+                continue
 
-        me = bpy.data.meshes.new(dataname)
+            # single material
+            mat_appended = False
+            found_mat = None
+            if reuse_materials is True:
+                mat_name = self.get_material_name(material['name'])
+                if bpy.data.materials.find(mat_name) != -1:
+                    found_mat = bpy.data.materials.get(mat_name)
+
+                # or with the same settings, whatever the name
+                material_key = self.get_material_key(material)
+                if found_mat is None:
+                    found_mat = self.get_cached_material(material_key)
+
+                if found_mat is not None:
+                    b_mats.append(
+                        (found_mat, self.is_material_nodraw(material['name'])))
+                    mat_appended = True
+
+            if not mat_appended:
+                mat = self.create_std_material(material, reuse_images)
+                if reuse_materials is True:
+                    mat[MATERIAL_FINGERPRINT_PROPERTY] = material_key
+                    self.material_cache[material_key] = mat
+                b_mats.append((mat, self.is_material_nodraw(material['name'])))
+        return b_mats
 
-        for i, (vert, norm) in enumerate(zip(mesh_chunk.get_vertices(), mesh_chunk.get_normals())):
-            verts_loc.append((vert.x, vert.y, vert.z))
-            verts_nor.append((norm.x, norm.y, norm.z))
+    def get_texture_index(self, project_root):
+        """
+        Returns the case insensitive texture index of the project root (see
+        cgf_scene.get_texture_index), or None when the project root was not
+        found from the file path, so as not to scan an arbitrary directory.
+        """
+        if not project_root or project_root != self.inspect_project_root_dir():
+            return None
+        if project_root not in self.texture_indices:
+            self.texture_indices[project_root] = cgf_scene.get_texture_index(project_root)
+        return self.texture_indices[project_root]
 
-        for i, (f) in enumerate(mesh_chunk.get_triangles()):
-            faces.append(f)
+    def get_material_key(self, material):
+        # texture paths are resolved against the project root, so the same
+        # settings can refer to other images in another project
+        return hashlib.sha1(('%s:%s' % (cgf_scene.get_material_fingerprint(material),
+                                        self.project_root)).encode()).hexdigest()
 
-        verts_tex = list(mesh_chunk.get_uvs())
+    def get_cached_material(self, material_key):
+        """
+        Returns the blender material created for the same material settings
+        (see get_material_key), if any. The index is built from the
+        fingerprint property of all materials on first use.
+        """
+        if self.material_cache is None:
+            self.material_cache = index_by_property(bpy.data.materials, MATERIAL_FINGERPRINT_PROPERTY)
+        return self.material_cache.get(material_key)
 
-        if mesh_chunk.has_vertex_colors:
-            verts_col = list(mesh_chunk.get_colors())
+    def create_mesh(self, mesh: dict,
+                    unique_materials: list[bpy.types.Material],
+                    dataname: str):
+        """
+        Returns a new object with the mesh arrays (see cgf_scene.build_mesh).
+        The blender mesh of an identical mesh imported before is reused,
+        making the object a linked duplicate, if reuse_meshes is set.
+        """
+        use_mat_ids, material_index = cgf_scene.get_material_slots(mesh['material_ids'])
+        bNoDraw = all(unique_materials[mat_id][1] for mat_id in use_mat_ids)
+
+        me = None
+        if self.reuse_meshes:
+            me = self.get_cached_mesh(mesh['fingerprint'])
+        if me is None:
+            me = self.create_mesh_data(mesh, unique_materials, dataname,
+                                       use_mat_ids, material_index)
+            if mesh['fingerprint'] is not None:
+                me[MESH_FINGERPRINT_PROPERTY] = mesh['fingerprint']
+                if self.mesh_cache is not None:
+                    self.mesh_cache[mesh['fingerprint']] = me
+            reused = False
+        else:
+            print('Reuse mesh %s for %s' % (me.name, dataname))
+            reused = True
+        if self.profile is not None:
+            self.profile.add_mesh(dataname, len(me.vertices), len(me.loops), len(me.polygons), reused)
 
-        uv_faces = list(mesh_chunk.get_uv_triangles())
+        ob = bpy.data.objects.new(dataname, me)
 
-        if len(faces) != len(uv_faces) and len(uv_faces) == 0:
-            uv_faces = len(faces) * [(0, 0)]
+        print('Hide Preview and Render: %i' % bNoDraw)
+        if bNoDraw:
+            # ob.hide_viewport = True
+            # ob.hide_set(True)
+            ob.hide_render = True
 
-        me.from_pydata(verts_loc, [], faces)
+        return ob
+
+    def get_cached_mesh(self, fingerprint):
+        """
+        Returns the blender mesh with the given fingerprint, if any. The
+        index is built from the fingerprint property of all meshes on first
+        use, so meshes of earlier imports and of saved files are found too.
+        """
+        if fingerprint is None:
+            return None
+        if self.mesh_cache is None:
+            self.mesh_cache = index_by_property(bpy.data.meshes, MESH_FINGERPRINT_PROPERTY)
+        return self.mesh_cache.get(fingerprint)
+
+    def create_mesh_data(self, mesh, unique_materials, dataname, use_mat_ids, material_index):
+        verts_loc = mesh['vertices']
+        verts_nor = mesh['normals']
+        faces = mesh['triangles']
+        verts_tex = mesh['uvs']
+        uv_faces = mesh['uv_triangles']
+        verts_col = mesh['colors']
+
+        num_vertices = len(verts_loc)
+        num_polygons = len(faces)
+        num_loops = num_polygons * 3
+
+        me = self.session.add('meshes', bpy.data.meshes.new(dataname))
+
+        me.vertices.add(num_vertices)
+        me.loops.add(num_loops)
+        me.polygons.add(num_polygons)
+
+        me.vertices.foreach_set("co", verts_loc.ravel())
+        me.loops.foreach_set("vertex_index", faces.ravel())
+        me.polygons.foreach_set(
+            "loop_start", np.arange(0, num_loops, 3, dtype=np.int32))
+        me.polygons.foreach_set(
+            "loop_total", np.full(num_polygons, 3, dtype=np.int32))
 
         print("Mesh num vertices: %i" % len(me.vertices))
         print("Mesh num polygon: %i" % len(me.polygons))
         print("Mesh num loops: %i" % len(me.loops))
 
-        #  for material in unique_materials:
-        #  me.materials.append(material)
-
-        use_mat_ids = []
-
-        if verts_nor and me.loops:
-            me.create_normals_split()
-            # or me.split_faces()
-
-        if verts_tex and me.polygons:
+        if verts_tex is not None and num_polygons:
             me.uv_layers.new()
-            # me.uv_textures.new()
+            me.uv_layers[0].data.foreach_set(
+                "uv", verts_tex[uv_faces.ravel()].ravel())
 
-        if verts_col and len(verts_col):
+        if verts_col is not None and num_polygons:
             me.vertex_colors.new()
+            me.vertex_colors[0].data.foreach_set(
+                "color", (verts_col[faces.ravel()] / np.float32(255.0)).ravel())
 
-        context_material_old = -1  # avoid a dict lookup
-        mat = 0  # rare case it may be un-initialized
-        material_index = 0
-
-        def get_smooth_group_indices():
-            if mesh_chunk.faces:
-                for face in mesh_chunk.faces:
-                    yield face.sm_group
-            elif mesh_chunk.mesh_subsets:
-                for meshsubset in mesh_chunk.mesh_subsets.mesh_subsets:
-                    for i in range(meshsubset.num_indices // 3):
-                        yield meshsubset.sm_group
-
-        for i, (face, uv_face, blen_poly, context_material_id, context_smooth_group) in enumerate(zip(faces, uv_faces, me.polygons,
-                                                                                                      mesh_chunk.get_material_indices(), get_smooth_group_indices())):
-            if context_smooth_group > 0:
-                blen_poly.use_smooth = True
-
-            if context_material_id >= 0:
-                if context_material_old != context_material_id:
-                    mat = context_material_id
-                    context_material_old = context_material_id
-                    try:
-                        idx = use_mat_ids.index(mat)
-                        material_index = idx
-                    except ValueError:
-                        use_mat_ids.append(mat)
-                        material_index = len(use_mat_ids) - 1
-
-                blen_poly.material_index = material_index
-            else:
-                print(
-                    f'mesh_chunk.get_material_indices() return a material id less than 0.')
-
-            blen_uvs = None
-            if len(me.uv_layers) > 0:
-                blen_uvs = me.uv_layers[0]
-
-            blen_vcs = me.vertex_colors[0] if (
-                verts_col and len(verts_col)) else None
-
-            if verts_nor:
-                for face_idx, face_uvidx, lidx in zip(face, uv_face, blen_poly.loop_indices):
-                    me.loops[lidx].normal[:] = verts_nor[0 if (
-                        face_idx is ...) else face_idx]
-                    if blen_uvs is not None:
-                        blen_uvs.data[lidx].uv = verts_tex[0 if (
-                            face_uvidx is ...) else face_uvidx]
-                    if blen_vcs:
-                        (c1, c2, c3, c4) = verts_col[0 if (
-                            face_idx is ...) else face_idx]
-                        blen_vcs.data[lidx].color = (c1, c2, c3, c4)
-
-            if verts_tex and uv_face:
-                if context_material_id:
-                    # TODO: set texture image
-                    pass
+        if (mesh['material_ids'] < 0).any():
+            print(f'Mesh {dataname} has a material id less than 0.')
 
-        print('Use material ids: %i' % len(use_mat_ids))
+        me.polygons.foreach_set("material_index", material_index)
+        me.polygons.foreach_set("use_smooth", mesh['smooth_groups'] > 0)
 
-        bNoDraw = True
+        print('Use material ids: %i' % len(use_mat_ids))
 
-        if len(use_mat_ids):
-            for mat_id in use_mat_ids:
-                print('Use material is(%i) => %s' %
-                      (mat_id, unique_materials[mat_id]))
-                me.materials.append(unique_materials[mat_id][0])
-                bNoDraw = bNoDraw and unique_materials[mat_id][1]
+        for mat_id in use_mat_ids:
+            print('Use material is(%i) => %s' %
+                  (mat_id, unique_materials[mat_id]))
+            me.materials.append(unique_materials[mat_id][0])
 
+        # the edges are not set above, derive them from the polygons
+        me.update(calc_edges=True)
         me.validate(clean_customdata=False)
         me.update(calc_edges=False)
 
-        if verts_nor:
-            clnors = array.array('f', [0.0] * (len(me.loops) * 3))
-            me.loops.foreach_get("normal", clnors)
-
-            me.normals_split_custom_set(tuple(zip(*(iter(clnors),) * 3)))
+        # Crysis meshes without a normals stream have no normals at all
+        if len(me.loops) and len(verts_nor) == num_vertices:
+            # cgf normals are per vertex, and blender vertices map one to one
+            # onto cgf vertices, so no per loop normals are needed
+            me.normals_split_custom_set_from_vertices(verts_nor)
             # me.use_auto_smooth = True
             # me.show_edge_sharp = True
 
-        ob = bpy.data.objects.new(me.name, me)
-        new_objects[mesh_chunk] = ob
+        return me
 
-        print('Hide Preview and Render: %i' % bNoDraw)
-        if bNoDraw:
-            # ob.hide_viewport = True
-            # ob.hide_set(True)
-            ob.hide_render = True
+    def create_shape_keys(self, ob, morph_targets):
+        """
+        Adds a shape key to the object for each morph target, given as
+        (name, vertex_ids, targets) (see cgf_scene.build_mesh).
+        """
+        # a reused mesh already has its shape keys
+        if not morph_targets or ob.data.shape_keys is not None:
+            return
 
-    def parse_bone_name_list(self, chunk):
-        assert (isinstance(chunk, CgfFormat.BoneNameListChunk))
-        print("Num of bones: %d" % chunk.num_names)
-        self.bone_infos = [None] * chunk.num_names
-        from zlib import crc32
-        for i, name in enumerate(chunk.names):
-            k = crc32(name.encode('ascii'))
-            name = name.replace(' ', '_')
-            self.bone_names[k] = name
-            info = BoneInfo()
-            info.name = name
-            info.name_crc_32 = k
-            self.bone_infos[i] = info
-
-    def build_bone_infos(self, chunk):
-        assert (isinstance(chunk, CgfFormat.BoneAnimChunk))
-        bone_entries = list(chunk.bones)
-
-        for i, bone_entry in enumerate(bone_entries):
-            info = self.bone_infos[i]
-            info.bone_id = bone_entry.bone_id
-            info.parent_id = bone_entry.parent_id
-            if info.parent_id != -1:
-                info.parent = self.bone_infos[info.parent_id]
-                info.parent.children.append(info)
-
-    def create_armatures(self, chunk, new_objects, scale_factor=1.0):
-        assert (isinstance(chunk, CgfFormat.BoneAnimChunk))
+        me = ob.data
+        num_vertices = len(me.vertices)
+        basis_co = np.empty(num_vertices * 3, dtype=np.float32)
+        me.vertices.foreach_get("co", basis_co)
+        basis_co = basis_co.reshape(-1, 3)
+
+        ob.shape_key_add(name='Basis', from_mix=False)
+        for target_name, vertex_ids, targets in morph_targets:
+            valid = (vertex_ids >= 0) & (vertex_ids < num_vertices)
+            if not valid.all():
+                print('Morph target %s: ignore %i vertices out of range.' %
+                      (target_name, np.count_nonzero(~valid)))
+                vertex_ids = vertex_ids[valid]
+                targets = targets[valid]
+            deltas = targets - basis_co[vertex_ids]
+
+            key_co = basis_co.copy()
+            key_co[vertex_ids] += deltas
+            shape_key = ob.shape_key_add(name=target_name, from_mix=False)
+            shape_key.data.foreach_set("co", key_co.ravel())
+
+        print('Num shape keys: %i' % len(morph_targets))
+
+    def set_bone_name_list(self, names):
+        print("Num of bones: %d" % len(names))
+        names, name_crcs = cgf_scene.get_bone_names(names)
+        self.bone_names.update(zip(name_crcs, names))
+
+    def create_armature(self, skeleton, mesh_objects, global_matrix):
+        """
+        Returns a new armature object with the bones of the skeleton (see
+        cgf_scene.build_skeleton), parenting the skinned mesh objects to it.
+        """
         #  dataname = self.dataname + "Skeleton"
         dataname = "Skeleton"
-        anim = bpy.data.armatures.new(dataname)
+        anim = self.session.add('armatures', bpy.data.armatures.new(dataname))
 
         anim_obj = bpy.data.objects.new(dataname, anim)
         collection = bpy.context.view_layer.active_layer_collection.collection
@@ -502,11 +678,16 @@ class ImportCGF:
         for i in collection.objects:
             i.select_set(False)  # deselect all objects
         anim_obj.select_set(True)
-
-        new_objects[chunk] = anim_obj
+        anim_obj.matrix_world = global_matrix
 
         # anim_obj.show_x_ray = True
 
+        # compute the whole skeleton first, then create all bones in a
+        # single edit mode session
+        parent_ids = skeleton['parent_ids']
+        heads, tails, rolls, connects = cgf_scene.compute_bone_layout(
+            skeleton['bind_matrices'], parent_ids, self.armature_auto_connect)
+
         # set current armature to edit the bone
         bpy.context.view_layer.objects.active = anim_obj
 
@@ -514,232 +695,64 @@ class ImportCGF:
         if bpy.ops.object.mode_set.poll():
             bpy.ops.object.mode_set(mode='EDIT')
 
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        def vec_roll_to_mat3(vec, roll):
-            nor = vec.normalized()
-
-            THETA_THRESHOLD_NEGY = 1.0e-09
-            THETA_THRESHOLD_NEGY_CLOSE = 1.0e-05
-
-            # create a 3x3 matrix
-            bMatrix = Matrix().to_3x3()
-
-            theta = 1.0 + nor[1]
-
-            if (theta > THETA_THRESHOLD_NEGY_CLOSE) or ((nor[0] or nor[2]) and theta > THETA_THRESHOLD_NEGY):
-                bMatrix[1][0] = -nor[0]
-                bMatrix[0][1] = nor[0]
-                bMatrix[1][1] = nor[1]
-                bMatrix[2][1] = nor[2]
-                bMatrix[1][2] = -nor[2]
-                if theta > THETA_THRESHOLD_NEGY_CLOSE:
-                    # If nor is far enough from -Y, apply the general case.
-                    bMatrix[0][0] = 1 - nor[0] * nor[0] / theta
-                    bMatrix[2][2] = 1 - nor[2] * nor[2] / theta
-                    bMatrix[0][2] = bMatrix[2][0] = -nor[0] * nor[2] / theta
-                else:
-                    # If nor is too close to -Y, apply the special case
-                    theta = nor[0] * nor[0] + nor[2] * nor[2]
-                    bMatrix[0][0] = (nor[0] + nor[2]) * \
-                        (nor[0] - nor[2]) / -theta
-                    bMatrix[2][2] = -bMatrix[0][0]
-                    bMatrix[0][2] = bMatrix[2][0] = 2.0 * \
-                        nor[0] * nor[2] / theta
-            else:
-                # If nor is -Y, simple symmetry by Z axis
-                bMatrix = Matrix().to_3x3()
-                bMatrix[0][0] = bMatrix[1][1] = -1.0
-
-            # Make roll matrix
-            rMatrix = Matrix.Rotation(roll, 3, nor)
-            mat = rMatrix @ bMatrix
-            return mat
-
-        def mat3_to_vec_roll(mat):
-            vec = mat.col[1]
-            vecmat = vec_roll_to_mat3(mat.col[1], 0)
-            vecmatinv = vecmat.inverted()
-            rollmat = vecmatinv @ mat
-            roll = math.atan2(rollmat[0][2], rollmat[2][2])
-            return vec, roll
-
-        if bpy.ops.object.mode_set.poll():
-            bpy.ops.object.mode_set(mode='EDIT')
-
-        for info in self.bone_infos:
-            # Go to edit mode for the bones
-            bpy.ops.object.mode_set(mode='EDIT')
-
-            #  bpy.ops.armature.bone_primitive_add(name=info.name)
-            newbone = anim_obj.data.edit_bones.get(info.name)
+        edit_bones = anim_obj.data.edit_bones
+        new_bones = []
+        for name, head, tail, roll in zip(skeleton['names'], heads.tolist(), tails.tolist(), rolls.tolist()):
+            #  bpy.ops.armature.bone_primitive_add(name=name)
+            newbone = edit_bones.get(name)
             if newbone is None:
-                newbone = anim_obj.data.edit_bones.new(info.name)
-            info.blender_bone = newbone
-            parent_bone = info.parent.blender_bone if info.parent else None
-            newbone.parent = parent_bone
-
-            axis, roll = mat3_to_vec_roll(info.bind_mat.to_3x3())
-
-            axis.z = axis.z + 0.001
-
-            newbone.head = info.bind_pos
-            tmp_tail = info.bind_pos + axis / 5
-
-            if len(info.children) == 0:
-                newbone.tail = tmp_tail
-            elif len(info.children) == 1:
-                direction = info.bind_mat.inverted() @ Vector(info.tail)
-                nor = direction.normalized()
-                error_limit = 0.0001
-                if nor.dot(nor) > error_limit:
-                    newbone.tail = info.tail
-                else:
-                    newbone.tail = info.bind_mat @ Vector((0, 0.05, 0))
-            else:
-                newbone.tail = info.tail
-
+                newbone = edit_bones.new(name)
+            newbone.head = head
+            newbone.tail = tail
+            newbone.roll = roll
             #  newbone.use_inherit_rotation = False
             newbone.use_local_location = False
+            new_bones.append(newbone)
 
-            newbone.matrix = info.bind_mat
-
-            epsilon = 1.19209290E-07
-
-            if info.parent:
-                distance = parent_bone.tail - newbone.head
+        for newbone, parent_id, connect in zip(new_bones, parent_ids.tolist(), connects.tolist()):
+            if parent_id >= 0:
+                newbone.parent = new_bones[parent_id]
                 #  # Auto connect the bone that head locate at the parent's tail.
-                if self.armature_auto_connect and distance.dot(distance) <= epsilon:
-                    #  and distance.x < epsilon and distance.y < epsilon and distance.z < epsilon:
-                    newbone.use_connect = True
+                newbone.use_connect = connect
 
         # bpy.context.scene.update()
 
-        self.mapping_vertex_group_weights(new_objects)
-
-        mesh_obj = new_objects.get(self.skin_mesh_chunk)
-
-        if mesh_obj:
-            if mesh_obj not in collection.objects.values():
-                collection.objects.link(mesh_obj)
-
         if bpy.ops.object.mode_set.poll():
             bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
 
         bpy.ops.object.select_all(action='DESELECT')  # deselect all object
 
-        mesh_obj.select_set(True)
-        anim_obj.select_set(True)
+        if mesh_objects:
+            for mesh_obj in mesh_objects:
+                mesh_obj.select_set(True)
+            anim_obj.select_set(True)
 
-        bpy.context.view_layer.objects.active = anim_obj
-        bpy.ops.object.parent_set(type='ARMATURE')
+            bpy.context.view_layer.objects.active = anim_obj
+            bpy.ops.object.parent_set(type='ARMATURE')
 
-    def mapping_vertex_group_weights(self, new_objects):
-        if not self.bone_infos:
+        return anim_obj
+
+    def create_vertex_groups(self, mesh_obj, mesh):
+        """
+        Adds a vertex group per bone of the skeleton to the skinned mesh
+        object, and the vertex weights of the mesh (see
+        cgf_scene.group_vertex_weights) to them, with one call per group.
+        """
+        if not self.skeleton or mesh_obj in self.weighted_objects:
             return
 
-        # Vertex Group/Weight
-        mesh_obj = new_objects.get(self.skin_mesh_chunk)
-        if mesh_obj:
-            for info in self.bone_infos:
-                if not mesh_obj.vertex_groups.get(info.name):
-                    mesh_obj.vertex_groups.new(name=info.name)
-
-        if self.skin_mesh_chunk and self.skin_mesh_chunk.has_vertex_weights:
-            # import vertex weight from cgf mesh data.
-            for i, vw in enumerate(self.skin_mesh_chunk.vertex_weights):
-                for bl in vw.bone_links:
-                    rel_group_name = self.bone_infos[bl.bone].name
-                    blending = bl.blending
-                    #  mesh_obj.vertex_groups[rel_group_name].add([i], blending, 'ADD')
-                    mesh_obj.vertex_groups[rel_group_name].add(
-                        [i], blending, 'REPLACE')
-
-    def get_bone_head_pos(self, bone_info):
-        pos_head = [0.0] * 3
-        pos = bone_info.bind_mat.to_translation()
-
-        pos_head[0] = pos.x
-        pos_head[1] = pos.y
-        pos_head[2] = pos.z
-
-        return pos_head
-
-    def get_bone_tail_pos(self, bone_info):
-        pos_tail = [0.0] * 3
-        ischildfound = False
-        children = []
-
-        for info in self.bone_infos:
-            #  print('Parent: %s | Bone Info: %s' % (info.parent, bone_info))
-            if info.parent and info.parent == bone_info:
-                ischildfound = True
-                children.append(info)
-
-        if ischildfound:
-            tmp_head = [0.0] * 3
-            for info in children:
-                tmp_head[0] += info.head[0]
-                tmp_head[1] += info.head[1]
-                tmp_head[2] += info.head[2]
-            tmp_head[0] /= len(children)
-            tmp_head[1] /= len(children)
-            tmp_head[2] /= len(children)
-            if bone_info.parent is None:  # Specify root bone, move a little bit preventing invalid data to be removed
-                tmp_head[2] += CgfFormat.EPSILON
-            #  print('Return tmp_head %s for bone: %s' % (tmp_head, bone_info.name))
-            return tmp_head
-        else:
-            tmp_len = 0.0
-            parent_head = [0.0] * 3
-            if bone_info.parent:
-                parent_head = bone_info.parent.head
-            tmp_len += (bone_info.head[0] - parent_head[0]) ** 2
-            tmp_len += (bone_info.head[1] - parent_head[1]) ** 2
-            tmp_len += (bone_info.head[2] - parent_head[2]) ** 2
-            tmp_len = tmp_len ** 0.5 * 0.5
-            pos_tail[0] = bone_info.head[0] + \
-                tmp_len * bone_info.bind_mat[0][0]
-            pos_tail[1] = bone_info.head[1] + \
-                tmp_len * bone_info.bind_mat[1][0]
-            pos_tail[2] = bone_info.head[2] + \
-                tmp_len * bone_info.bind_mat[2][0]
-            #  print("Return pos_tail %s for bone: %s" % (pos_tail, bone_info.name))
-            return pos_tail
-
-    def process_bone_initial_position(self, chunk):
-        assert (isinstance(chunk, CgfFormat.BoneInitialPosChunk))
-
-        self.skin_mesh_chunk = chunk.mesh
-
-        fix_z = Quaternion((0, 0, 1), math.radians(90)).to_matrix()
-        # fix_z = Matrix.Rotation(math.radians(-90), 4, 'Z')
-
-        for i, mat in enumerate(chunk.initial_pos_matrices):
-            info = self.bone_infos[i]
-            info.bind_pos = Vector((mat.pos.x, mat.pos.y, mat.pos.z))
-            info.bind_rot = Matrix(mat.rot.as_tuple()).transposed()
-
-            cgf_mat = CgfFormat.Matrix44()
-            cgf_mat.set_identity()
-            cgf_mat.set_matrix_33(mat.rot)
-            cgf_mat.set_translation(mat.pos)
-
-            #  print('### %s' % info.name)
-            #  print('---')
-            #  print(cgf_mat)
-            #  print(Matrix(cgf_mat.as_tuple()).transposed())
-            #  print('\n')
-
-            info.bind_mat = Matrix(cgf_mat.as_tuple()).transposed()
-            info.bind_mat = info.bind_mat @ fix_z.transposed().to_4x4()
-            info.origin_mat = info.bind_mat.copy()
-
-        for info in self.bone_infos:
-            info.head = self.get_bone_head_pos(info)
-
-        for info in self.bone_infos:
-            info.tail = self.get_bone_tail_pos(info)
+        names = self.skeleton['names']
+        for name in names:
+            if not mesh_obj.vertex_groups.get(name):
+                mesh_obj.vertex_groups.new(name=name)
+
+        if mesh['vertex_groups']:
+            # import vertex weight from cgf mesh data, one call per group.
+            for bone_id, weight, vertex_ids in mesh['vertex_groups']:
+                mesh_obj.vertex_groups[names[bone_id]].add(
+                    vertex_ids, weight, 'REPLACE')
+
+        self.weighted_objects.add(mesh_obj)
 
     def get_animation_list(self):
         if self.animation_map:
@@ -801,49 +814,7 @@ class ImportCGF:
             return None
         return self.animation_map.get(action_name)
 
-    def parse_animation_controller(self, chunk, anim_info, scale=1.0):
-        assert (isinstance(chunk, CgfFormat.ControllerChunk))
-        try:
-            bone_name = self.bone_names[chunk.ctrl_id]
-        except KeyError:
-            bone_name = None
-        print('Parsing Animation Controller for Bone: \"%s\" (%i) ...' %
-              (bone_name, chunk.ctrl_id))
-        assert (chunk.type == CgfFormat.CtrlType.NONE)
-
-        if bone_name is None:
-            return
-
-        ctrls = anim_info.get('ctrls')
-        if ctrls is None:
-            ctrls = []
-            anim_info['ctrls'] = ctrls
-
-        keyframes = []
-
-        for idx, k in enumerate(chunk.keys):
-            mat = Matrix()
-            pos = Vector((k.abs_pos.x, k.abs_pos.y, k.abs_pos.z)) * scale
-            rot = Quaternion((k.rel_quat.w, k.rel_quat.x,
-                             k.rel_quat.y, k.rel_quat.z))
-            mat = Matrix.Translation(pos) @ rot.to_matrix().to_4x4().inverted()
-            keyframe = (k.time, pos, rot, mat)
-            keyframes.append(keyframe)
-
-        ctrls.append((bone_name, chunk.ctrl_id, keyframes))
-
-    def load_animations(self):
-        action_name_list = self.get_animation_list()
-        if action_name_list and len(action_name_list):
-            print('Loading animations in a cycle loop ...')
-            for action_name in action_name_list:
-                self.load_animation(action_name)
-
-            print('\nAll animation loaded.')
-        else:
-            print('No action list found.')
-
-    def load_animation(self, action_name=None):
+    def resolve_animation_info(self, action_name=None):
         only_caf = self.filepath.endswith('.caf')
         if not only_caf:
             if action_name is None or len(action_name) == 0:
@@ -853,47 +824,94 @@ class ImportCGF:
                 return None
         else:
             anim_info = {'filepath': self.filepath}
+        return anim_info
+
+    def get_animation_ctrls(self, animation):
+        ctrls = []
+        for ctrl_id, (times, positions, rotations) in animation['controllers'].items():
+            bone_name = self.bone_names.get(ctrl_id)
+            print('Parsing Animation Controller for Bone: \"%s\" (%i) ...' %
+                  (bone_name, ctrl_id))
+            if bone_name is None:
+                continue
+            ctrls.append((bone_name, ctrl_id, times, positions, rotations))
+        return ctrls
+
+    def get_pending_animations(self):
+        """
+        Returns the (action name, animation info) of the animations of the
+        action list not loaded yet, keyed by the path of their CAF file, or
+        None if there is no action list.
+        """
+        action_name_list = self.get_animation_list()
+        if not action_name_list:
+            return None
+        pending = {}
+        for action_name in action_name_list:
+            anim_info = self.resolve_animation_info(action_name)
+            if anim_info is None:
+                continue
+            filepath = anim_info['filepath']
+            blen_action_name = os.path.basename(os.path.splitext(filepath)[0])
+            if blen_action_name in self.animations_loaded or filepath in pending:
+                continue
+            pending[filepath] = (action_name, anim_info)
+        return pending
+
+    def load_animations(self):
+        pending = self.get_pending_animations()
+        if pending is not None:
+            print('Loading animations in worker processes ...')
+
+            # parse all files in parallel, only create the actions here
+            for filepath, animation, error in cgf_scene.parse_animations(pending.keys(), self.scale_factor,
+                                                                            **self.animation_options):
+                if error is not None:
+                    print('Failed to load animation %s: %s' % (filepath, error))
+                    continue
+                action_name, anim_info = pending[filepath]
+                self.create_action(action_name, anim_info, animation)
+
+            print('\nAll animation loaded.')
+        else:
+            print('No action list found.')
+
+    def load_animation(self, action_name=None):
+        anim_info = self.resolve_animation_info(action_name)
+        if anim_info is None:
+            return None
 
         filepath = anim_info['filepath']
 
         blen_action_name = os.path.basename(os.path.splitext(filepath)[0])
 
+        if blen_action_name in self.animations_loaded:  # Preventing duplicate loading
+            return None
+
+        animation = cgf_scene.parse_animation(filepath, self.scale_factor, **self.animation_options)
+        self.create_action(action_name, anim_info, animation)
+
+    def create_action(self, action_name, anim_info, animation):
+        filepath = anim_info['filepath']
+
+        blen_action_name = os.path.basename(os.path.splitext(filepath)[0])
+
         if blen_action_name in self.animations_loaded:  # Preventing duplicate loading
             return None
 
         print("Ready to load animation %s with action %s as %s" %
               (filepath, action_name, blen_action_name))
-        with open(filepath, 'rb') as caf:
-            data = CgfFormat.Data()
-            try:
-                data.inspect_version_only(caf)
-            except ValueError as e:
-                print(e)
 
-            try:
-                data.read(caf)
-            except:
-                raise
-
-        for chunk in data.chunks:
-            if len(self.bone_names.keys()) == 0 and isinstance(chunk, CgfFormat.BoneNameListChunk):
-                self.parse_bone_name_list(chunk)
-
-        scale_factor = 1.0 / self.get_global_scale(data)
-
-        for i, chunk in enumerate(data.chunks):
-            if isinstance(chunk, CgfFormat.AnimChunk):
-                anim_info['num_keys'] = chunk.key_nums
-                anim_info['position'] = Vector((chunk.initial_pos.x, chunk.initial_pos.y,
-                                                chunk.initial_pos.z))
-            elif isinstance(chunk, CgfFormat.TimingChunk):
-                anim_info['secs_per_tick'] = 1.0 * chunk.secs_per_tick
-                anim_info['ticks_per_frame'] = 1.0 * chunk.ticks_per_frame
-                anim_info['start_frame'] = chunk.global_range.start
-                anim_info['end_frame'] = chunk.global_range.end
-            elif isinstance(chunk, CgfFormat.ControllerChunk):
-                self.parse_animation_controller(
-                    chunk, anim_info, scale=scale_factor)
+        if len(self.bone_names.keys()) == 0 and animation['bone_names']:
+            self.set_bone_name_list(animation['bone_names'])
+
+        for key in ('num_keys', 'secs_per_tick', 'ticks_per_frame', 'start_frame', 'end_frame'):
+            if key in animation:
+                anim_info[key] = animation[key]
+        if 'position' in animation:
+            anim_info['position'] = Vector(animation['position'])
+
+        ctrls = self.get_animation_ctrls(animation)
 
         bpy.context.scene.frame_start = anim_info['start_frame']
         bpy.context.scene.frame_end = anim_info['end_frame']
@@ -922,45 +940,55 @@ class ImportCGF:
         if obj.animation_data is None:
             obj.animation_data_create()
         # New an action and set to the current animation action.
-        action = bpy.data.actions.new(name=blen_action_name)
+        action = self.session.add('actions', bpy.data.actions.new(name=blen_action_name))
         obj.animation_data.action = action
 
         # action.frame_start = anim_info['start_frame']
         # action.frame_end = anim_info['end_frame']
 
         # Parsing the source controllers into blender action data.
-        ctrls = anim_info['ctrls']
-
-        fix_z = Matrix.Rotation(math.radians(-90), 4, 'Z')
-
-        for ctrl in ctrls:
-            (bone_name, bone_key, keyframes) = ctrl
-            pose_bones = obj.pose.bones
-
-            # Ignores the bone that doesn't exists in the pose
-            if bone_name not in pose_bones:
+        ticks_per_frame = anim_info['ticks_per_frame']
+
+        bones = dict((bone.name, (np.array(bone.matrix_local, dtype=np.float64),
+                                  bone.parent.name if bone.parent else None,
+                                  bone.use_local_location))
+                     for bone in obj.data.bones)
+        written = set()
+        for (bone_name, pose_times, locations, rotations) in cgf_scene.compute_pose_keys(bones, ctrls):
+            # Ignores duplicated controllers of the same bone
+            if bone_name in written:
                 continue
-
-            for keyframe in keyframes:
-                (time, pos, rot, mat) = keyframe
-                raw_key_index = int(time / anim_info['ticks_per_frame'])
-                bpy.context.scene.frame_set(raw_key_index)
-
-                if pose_bones[bone_name].parent is not None:
-                    trans = pose_bones[bone_name].parent.matrix @ fix_z.transposed() @ mat @ fix_z
-                else:
-                    trans = mat @ fix_z
-
-                pose_bones[bone_name].matrix = trans
-
-                pose_bones[bone_name].keyframe_insert('rotation_quaternion')
-                pose_bones[bone_name].keyframe_insert('location')
+            written.add(bone_name)
+            frames = np.floor(pose_times / ticks_per_frame)
+            # keys on the same frame replace each other, so keep the last one
+            last = len(frames) - 1 - np.unique(frames[::-1], return_index=True)[1]
+            frames, locations, rotations = frames[last], locations[last], rotations[last]
+            data_path = 'pose.bones["%s"]' % bpy.utils.escape_identifier(bone_name)
+            self.write_fcurves(action, data_path + '.location', bone_name, frames, locations)
+            self.write_fcurves(action, data_path + '.rotation_quaternion', bone_name, frames, rotations)
 
         self.animations_loaded.append(blen_action_name)
 
         bpy.context.scene.frame_set(0)
         # bpy.context.scene.update()
 
+    def write_fcurves(self, action, data_path, group_name, frames, values):
+        num_keys = len(frames)
+        co = np.empty((num_keys, 2), dtype=np.float32)
+        co[:, 0] = frames
+        # reduced keys are only valid under linear interpolation
+        linear = 'position_tolerance' in self.animation_options
+        if linear:
+            interpolation = np.full(num_keys, get_keyframe_interpolation('LINEAR'), dtype=np.int32)
+        for index in range(values.shape[1]):
+            fcurve = action.fcurves.new(data_path, index=index, action_group=group_name)
+            fcurve.keyframe_points.add(num_keys)
+            co[:, 1] = values[:, index]
+            fcurve.keyframe_points.foreach_set("co", co.ravel())
+            if linear:
+                fcurve.keyframe_points.foreach_set("interpolation", interpolation)
+            fcurve.update()
+
     def inspect_project_root(self, top_level_dir='Objects'):
         if self._filepath is None:
             return None
@@ -970,6 +998,13 @@ class ImportCGF:
             return os.path.abspath(self._filepath[:obj_path_idx])
         return None
 
+    def inspect_project_root_dir(self):
+        for rd in ['Objects', 'Levels', 'Effects']:
+            project_root = self.inspect_project_root(rd)
+            if project_root is not None:
+                return project_root
+        return None
+
     @property
     def filepath(self):
         return self._filepath
@@ -981,42 +1016,39 @@ class ImportCGF:
         """
         self._filepath = value
 
-        for rd in ['Objects', 'Levels', 'Effects']:
-            project_root = self.inspect_project_root(rd)
-            if project_root is not None:
-                break
-
+        project_root = self.inspect_project_root_dir()
         if project_root is None:
             project_root = os.path.dirname(os.path.abspath(value))
 
         self.project_root = project_root
 
-    def get_global_scale(self, cgf_data):
-        scale = self.scale_factor
-        if cgf_data.game == 'Crysis':
-            scale /= 100.0
-        elif cgf_data.game == 'Aion':
-            scale *= 100.0
-        return scale
-
     def load(self, context: bpy.types.Context,
              filepath: str,
              *,
              convert_dds_to_png=False,
              reuse_materials=False,
              reuse_images=False,
+             reuse_meshes=False,
+             defer_images=False,
              import_skeleton=True,
              skeleton_auto_connect=True,
              import_animations=False,
+             resample_animations=False,
+             reduce_keyframes=False,
+             keyframe_position_tolerance=0.001,
+             keyframe_rotation_tolerance=math.radians(0.5),
              scale_factor=1.0,
              relpath=None,
-             global_matrix: Matrix = None
+             global_matrix: Matrix = None,
+             profile=False
              ):
         """
         Called by the use interface or another script.
         load_cgf(path) - should give acceptable result.
         This function passes the file and sends the data off
             to be split into objects and then converted into mesh objects
+        With profile set, the time and allocations of each phase are
+        recorded (see cgf_scene.ImportProfile) and written as a JSON report.
         """
 
         if bpy.ops.object.mode_set.poll():
@@ -1026,9 +1058,19 @@ class ImportCGF:
         self.armature_auto_connect = skeleton_auto_connect
         self.scale_factor = scale_factor
         self.dds_convert = convert_dds_to_png
+        self.animation_options = {'resample': resample_animations}
+        if reduce_keyframes:
+            self.animation_options['position_tolerance'] = keyframe_position_tolerance
+            self.animation_options['angle_tolerance'] = keyframe_rotation_tolerance
+
+        if profile:
+            self.profile = cgf_scene.ImportProfile(filepath)
+            self.profile.start()
 
         if self.filepath.endswith('.caf'):
-            self.load_animation()
+            with cgf_scene.profile_phase(self.profile, 'animations'):
+                self.load_animation()
+            self.write_profile()
             return {'FINISHED'}
 
         with ProgressReport(context.window_manager) as progress:
@@ -1039,156 +1081,34 @@ class ImportCGF:
                 global_matrix = Matrix()
 
             time_main = time.time()
-            b_mats = []
 
             progress.enter_substeps(1, "Parsing CGF file ...")
-            with open(filepath, 'rb') as f:
-                data = CgfFormat.Data()
-                # check if cgf file is valid
-                try:
-                    data.inspect_version_only(f)
-                except ValueError:
-                    # not a cgf file
-                    raise
-                else:
-                    progress.enter_substeps(2, "Reading CGF %r ..." % filepath)
-                    data.read(f)
-
             print('Project root: %s' % self.project_root)
-
+            scene = cgf_scene.build_scene(filepath, self.scale_factor, self.profile)
             progress.leave_substeps("Done reading.")
-            progress.enter_substeps(3, "Parsing CGF %r ..." % filepath)
-
-            if data.game == 'Crysis':
-                print(
-                    '[WARNING]: Crysis import is very experimental, and is likely to fail')
-
-            print('game:                    %s' % data.game)
-            print('file type:               0x%08X' % data.header.type)
-            print('version:                 0x%08X' % data.version)
-            print('user version:            0x%08X' % data.user_version)
-
-            for i, chunk in enumerate(data.chunks):
-                print('id %i: %s' % (i, chunk.__class__.__name__))
-
-            # TODO: fixed the scale correction
-            scale_factor = self.get_global_scale(data)
-
-            for chunk in data.chunks:
-                chunk.apply_scale(1.0 / scale_factor)
 
             # import data
-            progress.step("Done, making data into blender")
-
-            progress.step("Done, loading materials and images ...")
-            # TODO: create materials
-
-            # Far Cry: iterate over all standard material chunks
-            for chunk in data.chunks:
-                # check chunk type
-                if not isinstance(chunk, CgfFormat.MtlChunk):
-                    continue
-
-                # multi material: skip
-                # if chunk.children or to_str(chunk.name).startswith('s_nouvmap') \
-                #         or chunk.type != CgfFormat.MtlType.STANDARD \
-                #         or self.get_material_name(chunk.name) is None:
-                #     print(f'Ignore MtlChunk: {chunk.name}')
-                #     continue
-                if chunk.type == CgfFormat.MtlType.MULTI:
-                    print(
-                        f'Ignore MtlChunk: {chunk.name}, because of MtlType.MULTI')
-                    continue
-                elif self.get_material_name(chunk.name) is None:
-                    print(
-                        f'Ignore MtlChunk: {chunk.name}, unlegal material name.')
-                    b_mats.append((None, True))
-                    continue
-
-                # single material
-                mat_appended = False
-                found_mat = None
-                if reuse_materials is True:
-                    mat_name = self.get_material_name(chunk.name)
-                    if bpy.data.materials.find(mat_name) != -1:
-                        found_mat = bpy.data.materials.get(mat_name)
-
-                    if found_mat is not None:
-                        b_mats.append(
-                            (found_mat, self.is_material_nodraw(chunk.name)))
-                        mat_appended = True
-
-                if not mat_appended:
-                    b_mats.append((self.create_std_material(chunk, reuse_images),
-                                   self.is_material_nodraw(chunk.name)))
+            progress.enter_substeps(1, "Done, making data into blender")
 
             # Deselect all
             if bpy.ops.object.select_all.poll():
                 bpy.ops.object.select_all(action="DESELECT")
 
-            view_layer = context.view_layer
-            collection = view_layer.active_layer_collection.collection
-            new_objects = {}  # put new objects here
-            armature_chunk = None
-            node_transforms = {}
-
-            # SPLIT_OB_OR_GROUP = bool(use_split_objects or use_split_groups)
-            # Create meshes from the data, warning 'vertex_groups' wont suppot splitting
-            # ~ print(dataname, user_vnor, use_vtex)
-
-            # parse bone list first.
-            for chunk in data.chunks:
-                if isinstance(chunk, CgfFormat.BoneNameListChunk):
-                    self.parse_bone_name_list(chunk)
-
-            # parse bone data
-            for chunk in data.chunks:
-                if isinstance(chunk, CgfFormat.BoneAnimChunk):
-                    self.build_bone_infos(chunk)
-                elif isinstance(chunk, CgfFormat.BoneInitialPosChunk):
-                    self.process_bone_initial_position(chunk)
-
-            for chunk in data.chunks:
-                if isinstance(chunk, CgfFormat.NodeChunk) and isinstance(chunk.object, CgfFormat.MeshChunk):
-                    self.dataname = to_str(chunk.name)
-                    self.create_mesh(new_objects,
-                                     chunk.object,
-                                     b_mats,
-                                     self.dataname,
-                                     )
-                    node_transforms[chunk.object] = Matrix(
-                        chunk.transform.as_tuple()).transposed()
-                    self.mapping_vertex_group_weights(new_objects)
-
-                elif import_skeleton and isinstance(chunk, CgfFormat.BoneAnimChunk):
-                    self.create_armatures(
-                        chunk, new_objects, scale_factor=scale_factor)
-
-            # create new obj
-            for (chk, obj) in new_objects.items():
-                if obj not in collection.objects.values():
-                    collection.objects.link(obj)
-                    obj.select_set(True)
-                    bpy.ops.object.shade_smooth()
-                # we could apply this anywhere before scaling
-                node_transform = node_transforms[chk] if chk in node_transforms else None
-                print('Node transform: %s' % node_transform)
-                obj.matrix_world = global_matrix
-                if node_transform:
-                    obj.matrix_world = obj.matrix_world @ node_transform
-                print('Apply obj %s\' matrix world.' % obj)
-
-            for i in collection.objects:
-                i.select_set(False)  # deselect all objects
-                if i.hide_render is True:
-                    i.hide_set(True)
+            new_objects = self.load_scene(context, scene,
+                                          convert_dds_to_png=convert_dds_to_png,
+                                          reuse_materials=reuse_materials,
+                                          reuse_images=reuse_images,
+                                          reuse_meshes=reuse_meshes,
+                                          defer_images=defer_images,
+                                          import_skeleton=import_skeleton,
+                                          global_matrix=global_matrix)
 
             # Deselect all
             if bpy.ops.object.select_all.poll():
                 bpy.ops.object.select_all(action="DESELECT")
 
             if len(new_objects):
-                for obj in new_objects.values():
+                for obj in new_objects:
                     if obj.type == 'ARMATURE':
                         obj.select_set(True)
                         break
@@ -1198,12 +1118,423 @@ class ImportCGF:
             if import_animations:
                 progress.enter_substeps(
                     4, "Import animations by searching Cry action list file (CAL) ...")
-                self.load_animations()
+                with cgf_scene.profile_phase(self.profile, 'animations'):
+                    self.load_animations()
                 progress.leave_substeps("Done, imported animations ...")
 
             progress.leave_substeps("Finished importing CGF %r ..." % filepath)
 
-        # Clean all
-        bpy.ops.outliner.orphans_purge()
+        # Remove what this import created but left unused, and nothing else
+        with cgf_scene.profile_phase(self.profile, 'cleanup'):
+            num_removed = self.session.release_unused()
+        if num_removed:
+            print('Removed %i unused datablocks.' % num_removed)
+
+        print('Imported in %.2f s' % (time.time() - time_main))
+        self.write_profile()
+
+        return {'FINISHED'}
+
+    def write_profile(self):
+        """
+        Ends the profile of the import, if any, and writes its report to
+        the temporary directory.
+        """
+        if self.profile is None or self.profile.total_time is not None:
+            return
+        self.profile.stop()
+        report_path = cgf_scene.get_profile_report_path(self.profile.filepath)
+        try:
+            self.profile.write(report_path)
+        except OSError as e:
+            print('Failed to write the profile report: %s' % e)
+        print(self.profile.get_summary())
+        print('Profile report: %s' % report_path)
+
+    def load_scene(self, context: bpy.types.Context,
+                   scene: dict,
+                   *,
+                   convert_dds_to_png=False,
+                   reuse_materials=False,
+                   reuse_images=False,
+                   reuse_meshes=False,
+                   defer_images=False,
+                   import_skeleton=True,
+                   global_matrix: Matrix = None
+                   ):
+        """
+        Creates and links the objects of a scene built by
+        cgf_scene.build_scene, and returns them.
+        """
+        steps = self.iter_load_scene(context, scene,
+                                     convert_dds_to_png=convert_dds_to_png,
+                                     reuse_materials=reuse_materials,
+                                     reuse_images=reuse_images,
+                                     reuse_meshes=reuse_meshes,
+                                     defer_images=defer_images,
+                                     import_skeleton=import_skeleton,
+                                     global_matrix=global_matrix)
+        try:
+            while True:
+                next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+    def iter_load_scene(self, context: bpy.types.Context,
+                        scene: dict,
+                        *,
+                        convert_dds_to_png=False,
+                        reuse_materials=False,
+                        reuse_images=False,
+                        reuse_meshes=False,
+                        defer_images=False,
+                        import_skeleton=True,
+                        global_matrix: Matrix = None
+                        ):
+        """
+        Generator doing the work of load_scene in short steps: yields after
+        the materials, each object and the armature, so a caller can spread
+        them over time (see ImportJob), and returns the new objects.
+        """
+        self.filepath = scene['filepath']
+        self.dds_convert = convert_dds_to_png
+        self.reuse_meshes = reuse_meshes
+        self.defer_images = defer_images
+
+        if global_matrix is None:
+            global_matrix = Matrix()
+
+        if convert_dds_to_png:
+            with cgf_scene.profile_phase(self.profile, 'images'):
+                self.convert_textures(scene['materials'])
+        with cgf_scene.profile_phase(self.profile, 'materials'):
+            b_mats = self.create_materials(scene['materials'], reuse_materials, reuse_images)
+        yield
+
+        skeleton = self.skeleton = scene['skeleton']
+        skin_objects = []
+        if skeleton:
+            self.set_bone_name_list(skeleton['names'])
+
+        collection = context.view_layer.active_layer_collection.collection
+        new_objects = []
+        for node in scene['nodes']:
+            self.dataname = node['name']
+            mesh = scene['meshes'][node['mesh']]
+            with cgf_scene.profile_phase(self.profile, 'meshes'):
+                ob = self.create_mesh(mesh, b_mats, self.dataname)
+                self.create_shape_keys(ob, mesh['morph_targets'])
+                collection.objects.link(ob)
+                ob.matrix_world = global_matrix @ Matrix(node['transform'].tolist())
+            if skeleton and node['mesh'] == skeleton['mesh']:
+                with cgf_scene.profile_phase(self.profile, 'weights'):
+                    self.create_vertex_groups(ob, mesh)
+                skin_objects.append(ob)
+            new_objects.append(ob)
+            yield
+
+        if new_objects:
+            # the selection may have changed between the steps
+            if bpy.ops.object.select_all.poll():
+                bpy.ops.object.select_all(action="DESELECT")
+            for ob in new_objects:
+                ob.select_set(True)
+            context.view_layer.objects.active = new_objects[0]
+            with cgf_scene.profile_phase(self.profile, 'meshes'):
+                bpy.ops.object.shade_smooth()
+            for ob in new_objects:
+                ob.select_set(False)
+                if ob.hide_render is True:
+                    ob.hide_set(True)
+
+        if import_skeleton and skeleton and skeleton['parent_ids'] is not None:
+            with cgf_scene.profile_phase(self.profile, 'armature'):
+                new_objects.append(self.create_armature(skeleton, skin_objects, global_matrix))
+
+        return new_objects
+
+    @classmethod
+    def load_batch(cls, context: bpy.types.Context,
+                   filepaths: list[str],
+                   *,
+                   scale_factor=1.0,
+                   skeleton_auto_connect=True,
+                   import_animations=False,
+                   resample_animations=False,
+                   reduce_keyframes=False,
+                   keyframe_position_tolerance=0.001,
+                   keyframe_rotation_tolerance=math.radians(0.5),
+                   max_workers=None,
+                   max_in_flight=None,
+                   **keywords
+                   ):
+        """
+        Imports many CGF files. The files are read and converted to arrays
+        in worker processes (see cgf_scene.iter_scenes), while the objects
+        are created here as each file is done, along with the animations of
+        their armature if import_animations is set (see load_animations).
+        The other keywords are passed on to load_scene.
+        """
+        animation_options = {'resample': resample_animations}
+        if reduce_keyframes:
+            animation_options['position_tolerance'] = keyframe_position_tolerance
+            animation_options['angle_tolerance'] = keyframe_rotation_tolerance
+
+        if bpy.ops.object.mode_set.poll():
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+
+        # Deselect all
+        if bpy.ops.object.select_all.poll():
+            bpy.ops.object.select_all(action="DESELECT")
+
+        num_failed = 0
+        mesh_cache = None
+        material_cache = None
+        texture_indices = {}
+        converted_textures = {}
+        session = ImportSession()
+        with ProgressReport(context.window_manager) as progress:
+            progress.enter_substeps(len(filepaths), "Importing %i CGF files ..." % len(filepaths))
+            for filepath, scene, error in cgf_scene.iter_scenes(filepaths, scale_factor,
+                                                                max_workers, max_in_flight):
+                if error is not None:
+                    print('Failed to import %r: %s' % (filepath, error))
+                    num_failed += 1
+                else:
+                    importer = cls()
+                    importer.armature_auto_connect = skeleton_auto_connect
+                    importer.scale_factor = scale_factor
+                    importer.animation_options = animation_options
+                    # share the indices, so the files reuse each other's meshes and materials,
+                    # and the project textures are scanned and converted once
+                    importer.mesh_cache = mesh_cache
+                    importer.material_cache = material_cache
+                    importer.texture_indices = texture_indices
+                    importer.converted_textures = converted_textures
+                    importer.session = session
+                    new_objects = importer.load_scene(context, scene, **keywords)
+                    mesh_cache = importer.mesh_cache
+                    material_cache = importer.material_cache
+                    armature = None
+                    for obj in new_objects:
+                        if obj.type == 'ARMATURE':
+                            armature = obj
+                    if armature is not None and import_animations:
+                        # the actions are created for the active armature
+                        context.view_layer.objects.active = armature
+                        importer.load_animations()
+                progress.step("Done %r" % filepath)
+            progress.leave_substeps("Finished importing %i CGF files ..." % len(filepaths))
+
+        # only once all files are done, as later files may use what earlier ones created
+        num_removed = session.release_unused()
+        if num_removed:
+            print('Removed %i unused datablocks.' % num_removed)
+
+        if num_failed:
+            print('Failed to import %i of %i CGF files.' % (num_failed, len(filepaths)))
 
         return {'FINISHED'}
+
+
+class ImportJob:
+    """
+    A non-blocking import of CGF files, driven by the timer of a modal
+    operator. The files are read and converted to arrays in worker
+    processes (see cgf_scene.build_scene), as are the animations, while
+    the blender data is created here on the main thread, in steps run for
+    at most a time budget per call of step (see ImportCGF.iter_load_scene).
+    """
+
+    __slots__ = ['filepaths', 'scale_factor', 'skeleton_auto_connect', 'import_animations',
+                 'animation_options', 'keywords', 'max_workers', 'max_in_flight', 'executor',
+                 'in_flight', 'steps', 'progress', 'num_done', 'num_failed', 'session',
+                 'mesh_cache', 'material_cache', 'texture_indices', 'converted_textures']
+
+    def __init__(self, filepaths,
+                 *,
+                 scale_factor=1.0,
+                 skeleton_auto_connect=True,
+                 import_animations=False,
+                 resample_animations=False,
+                 reduce_keyframes=False,
+                 keyframe_position_tolerance=0.001,
+                 keyframe_rotation_tolerance=math.radians(0.5),
+                 max_workers=None,
+                 max_in_flight=None,
+                 relpath=None,
+                 **keywords
+                 ):
+        """
+        The other keywords are passed on to ImportCGF.iter_load_scene.
+        """
+        self.filepaths = list(filepaths)
+        self.filepaths.reverse()
+        self.scale_factor = scale_factor
+        self.skeleton_auto_connect = skeleton_auto_connect
+        self.import_animations = import_animations
+        self.animation_options = {'resample': resample_animations}
+        if reduce_keyframes:
+            self.animation_options['position_tolerance'] = keyframe_position_tolerance
+            self.animation_options['angle_tolerance'] = keyframe_rotation_tolerance
+        self.keywords = keywords
+        if max_workers is None:
+            max_workers = min(os.cpu_count() or 1, max(1, len(self.filepaths)))
+        self.max_workers = max_workers
+        self.max_in_flight = max(1, max_in_flight or 2 * max_workers)
+        self.executor = None
+        # the futures of the scenes, keyed to their file path, and of the
+        # animations, keyed to (importer, armature, action name, animation info)
+        self.in_flight = {}
+        self.steps = None
+        self.progress = None
+        self.num_done = 0
+        self.num_failed = 0
+        # shared by the files, as in ImportCGF.load_batch
+        self.session = ImportSession()
+        self.mesh_cache = None
+        self.material_cache = None
+        self.texture_indices = {}
+        self.converted_textures = {}
+
+    def start(self, context: bpy.types.Context):
+        if bpy.ops.object.mode_set.poll():
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+        if bpy.ops.object.select_all.poll():
+            bpy.ops.object.select_all(action="DESELECT")
+
+        self.progress = ProgressReport(context.window_manager)
+        self.progress.start()
+        self.progress.enter_substeps(len(self.filepaths),
+                                     "Importing %i CGF files ..." % len(self.filepaths))
+        self.executor = cgf_scene.get_pool_executor(self.max_workers)
+        self.submit_scenes()
+
+    def submit_scenes(self):
+        while self.filepaths and len(self.in_flight) < self.max_in_flight:
+            filepath = self.filepaths.pop()
+            future = self.executor.submit(cgf_scene.build_scene, filepath, self.scale_factor)
+            self.in_flight[future] = filepath
+
+    def step(self, context: bpy.types.Context, time_budget=0.05):
+        """
+        Creates blender data for the scenes and animations read so far, for
+        about time_budget seconds. Returns whether the import is done.
+        """
+        end_time = time.perf_counter() + time_budget
+        while time.perf_counter() < end_time:
+            if self.steps is not None:
+                importer, steps = self.steps
+                try:
+                    next(steps)
+                except StopIteration as stop:
+                    self.steps = None
+                    self.finish_scene(context, importer, stop.value)
+                except Exception as e:
+                    # the objects created so far for the scene are kept
+                    print('Failed to import %r: %s' % (importer.filepath, e))
+                    self.steps = None
+                    self.num_failed += 1
+                    self.step_progress(importer.filepath)
+                continue
+
+            done = [future for future in self.in_flight if future.done()]
+            if not done:
+                break
+            for future in done:
+                item = self.in_flight.pop(future)
+                if isinstance(item, str):
+                    self.start_scene(context, item, future)
+                    # one scene at a time
+                    break
+                self.create_action(context, item, future)
+            self.submit_scenes()
+
+        if self.steps is None and not self.in_flight and not self.filepaths:
+            self.finish()
+            return True
+        return False
+
+    def start_scene(self, context, filepath, future):
+        try:
+            scene = future.result()
+        except Exception as e:
+            print('Failed to import %r: %s' % (filepath, e))
+            self.num_failed += 1
+            self.step_progress(filepath)
+            return
+        importer = ImportCGF()
+        importer.armature_auto_connect = self.skeleton_auto_connect
+        importer.scale_factor = self.scale_factor
+        importer.animation_options = self.animation_options
+        importer.mesh_cache = self.mesh_cache
+        importer.material_cache = self.material_cache
+        importer.texture_indices = self.texture_indices
+        importer.converted_textures = self.converted_textures
+        importer.session = self.session
+        self.steps = (importer, importer.iter_load_scene(context, scene, **self.keywords))
+
+    def finish_scene(self, context, importer, new_objects):
+        self.mesh_cache = importer.mesh_cache
+        self.material_cache = importer.material_cache
+        self.step_progress(importer.filepath)
+
+        armature = None
+        for obj in new_objects:
+            if obj.type == 'ARMATURE':
+                armature = obj
+        if armature is None or not self.import_animations:
+            return
+        pending = importer.get_pending_animations()
+        if not pending:
+            print('No action list found.')
+            return
+        for filepath, (action_name, anim_info) in pending.items():
+            future = self.executor.submit(cgf_scene.parse_animation, filepath, self.scale_factor,
+                                          **self.animation_options)
+            self.in_flight[future] = (importer, armature, action_name, anim_info)
+
+    def create_action(self, context, item, future):
+        importer, armature, action_name, anim_info = item
+        try:
+            animation = future.result()
+        except Exception as e:
+            print('Failed to load animation %s: %s' % (anim_info['filepath'], e))
+            return
+        try:
+            # the active object may have changed since
+            context.view_layer.objects.active = armature
+        except ReferenceError:
+            # removed since
+            return
+        importer.create_action(action_name, anim_info, animation)
+
+    def step_progress(self, filepath):
+        self.num_done += 1
+        self.progress.step("Done %r" % filepath)
+
+    def cancel(self):
+        """
+        Stops the import. The objects created so far are kept.
+        """
+        print('Import cancelled after %i files.' % self.num_done)
+        if self.steps is not None:
+            self.steps[1].close()
+            self.steps = None
+        self.filepaths = []
+        self.in_flight = {}
+        self.finish()
+
+    def finish(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        num_removed = self.session.release_unused()
+        if num_removed:
+            print('Removed %i unused datablocks.' % num_removed)
+        if self.num_failed:
+            print('Failed to import %i of %i CGF files.' % (self.num_failed, self.num_done))
+        if self.progress is not None:
+            self.progress.leave_substeps("Finished importing %i CGF files ..." % self.num_done)
+            self.progress.finalize()
+            self.progress = None